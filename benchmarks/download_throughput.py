@@ -0,0 +1,80 @@
+"""Measures the download throughput of CryptshareDownload.download_file for different chunk sizes.
+
+A local HTTP server serves a file of random bytes, so the measurement is not limited by the network.
+
+    python benchmarks/download_throughput.py --size 256
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cryptshare import CryptshareClient
+from cryptshare.download import DOWNLOAD_CHUNK_SIZE, CryptshareDownload
+
+CONTENT_BLOCK = os.urandom(1024 * 1024)
+
+
+class ContentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    size = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(self.size))
+        self.end_headers()
+        remaining = self.size
+        while remaining > 0:
+            block = CONTENT_BLOCK[: min(remaining, len(CONTENT_BLOCK))]
+            self.wfile.write(block)
+            remaining -= len(block)
+
+
+def measure(url: str, chunk_size: int, size: int, directory: str) -> float:
+    client = CryptshareClient("http://benchmark.example.com")
+    download = CryptshareDownload(client, "1234567890", "password", chunk_size=chunk_size)
+    start = time.perf_counter()
+    download.download_file(url, "benchmark.bin", directory, size=size)
+    duration = time.perf_counter() - start
+    if os.path.getsize(os.path.join(directory, "benchmark.bin")) != size:
+        raise RuntimeError("Incomplete download")
+    client.close()
+    return size / duration / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=256, help="Size of the downloaded file in MiB")
+    parser.add_argument(
+        "--byte-size",
+        type=int,
+        default=4,
+        help="Size of the file in MiB for the 1 byte chunk size of the previous implementation",
+    )
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ContentHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/file"
+
+    with tempfile.TemporaryDirectory() as directory:
+        for chunk_size in [1, 64 * 1024, DOWNLOAD_CHUNK_SIZE, 4 * 1024 * 1024]:
+            size = (args.byte_size if chunk_size == 1 else args.size) * 1024 * 1024
+            ContentHandler.size = size
+            throughput = measure(url, chunk_size, size, directory)
+            print(f"chunk size {chunk_size:>8} B: {throughput:8.1f} MiB/s ({size // 1024 // 1024} MiB)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
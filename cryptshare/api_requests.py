@@ -1,12 +1,140 @@
-import json
 import logging
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from cryptshare.json_codec import CryptshareJsonCodec, get_default_json_codec
+from cryptshare.rate_limiter import CryptshareRateLimiter
+from cryptshare.retry import NO_RETRY, CryptshareRetryPolicy
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_POOL_CONNECTIONS = 10
+# Number of per-host connection pools kept by a session
+DEFAULT_POOL_MAXSIZE = 10
+# Number of keep-alive connections kept per host
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+# Size of the blocks streamed request bodies are sent in
+
+
+class CryptshareHTTPAdapter(HTTPAdapter):
+    """HTTP adapter sending file-like request bodies in large blocks instead of the default 16 KiB"""
+
+    __attrs__ = HTTPAdapter.__attrs__ + ["blocksize"]
+
+    def __init__(self, *args, blocksize: int = UPLOAD_BLOCK_SIZE, **kwargs) -> None:
+        self.blocksize = blocksize
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        kwargs.setdefault("blocksize", self.blocksize)
+        super().init_poolmanager(*args, **kwargs)
+
 
 class CryptshareApiRequests:
+    _cryptshare_client = None
+    _session: requests.Session = None
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE
+    pool_block: bool = False
+    keep_alive: bool = True
+    _retry_policy: CryptshareRetryPolicy = None
+    _rate_limiter: CryptshareRateLimiter = None
+    _json_codec: CryptshareJsonCodec = None
+
+    @property
+    def session(self) -> requests.Session:
+        """Pooled HTTP session used for all requests.
+
+        Objects belonging to a Cryptshare client (transfers, files, downloads) share the session of that client,
+        so connections and TLS handshakes are reused across all API calls to the same server.
+        """
+        if self._cryptshare_client is not None and self._cryptshare_client is not self:
+            return self._cryptshare_client.session
+        if self._session is None:
+            self._session = self.create_session()
+        return self._session
+
+    def create_session(self) -> requests.Session:
+        logger.debug(
+            f"Creating HTTP session: pool_connections={self.pool_connections}, pool_maxsize={self.pool_maxsize}, "
+            f"keep_alive={self.keep_alive}"
+        )
+        session = requests.Session()
+        adapter = CryptshareHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    @property
+    def retry_policy(self) -> CryptshareRetryPolicy:
+        """Retry policy used for all requests, shared with the owning Cryptshare client if there is one
+
+        Assign another policy to change the retries of the following calls, e.g. NO_RETRY before a call that
+        should fail fast, and restore the previous policy afterwards.
+        """
+        if self._cryptshare_client is not None and self._cryptshare_client is not self:
+            return self._cryptshare_client.retry_policy
+        if self._retry_policy is None:
+            self._retry_policy = CryptshareRetryPolicy()
+        return self._retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, retry_policy: CryptshareRetryPolicy) -> None:
+        self._retry_policy = retry_policy
+
+    @property
+    def rate_limiter(self) -> [CryptshareRateLimiter, None]:
+        """Rate limiter pacing all requests, shared with the owning Cryptshare client if there is one"""
+        if self._cryptshare_client is not None and self._cryptshare_client is not self:
+            return self._cryptshare_client.rate_limiter
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, rate_limiter: CryptshareRateLimiter) -> None:
+        self._rate_limiter = rate_limiter
+
+    @property
+    def json_codec(self) -> CryptshareJsonCodec:
+        """JSON codec for request and response bodies, shared with the owning Cryptshare client if there is one"""
+        if self._cryptshare_client is not None and self._cryptshare_client is not self:
+            return self._cryptshare_client.json_codec
+        if self._json_codec is None:
+            self._json_codec = get_default_json_codec()
+        return self._json_codec
+
+    @json_codec.setter
+    def json_codec(self, json_codec: CryptshareJsonCodec) -> None:
+        self._json_codec = json_codec
+
+    @staticmethod
+    def _body_position(data) -> [int, None]:
+        """Position of a file-like request body, needed to rewind it for a retry"""
+        if hasattr(data, "seek") and hasattr(data, "tell"):
+            try:
+                return data.tell()
+            except OSError:
+                return None
+        return None
+
+    @staticmethod
+    def _is_repeatable_body(data) -> bool:
+        return data is None or isinstance(data, (bytes, str, dict)) or hasattr(data, "seek")
+
+    def close(self) -> None:
+        """Closes the HTTP session owned by this object and all its pooled connections"""
+        if self._session is not None:
+            logger.debug("Closing HTTP session")
+            self._session.close()
+            self._session = None
+
     def _request(
         self,
         method,
@@ -19,38 +147,79 @@ class CryptshareApiRequests:
         stream=False,
         handle_response=True,
         timeout: int = None,
+        retry_policy: CryptshareRetryPolicy = None,
+        idempotent: bool = None,
     ):
+        """Sends a request to the Cryptshare server
+
+        :param retry_policy: Retry policy for this request, defaults to the retry policy of the client
+        :param idempotent: Overrides whether the request may be repeated, defaults to the idempotency of the method
+        """
         logger.info(f"Sending API request\n {method} {url}")
-        logger.debug(f"\n Data: {data}\n Json: {json}\n Headers: {headers}\n Params: {params}")
-        resp = requests.request(
-            method,
-            url,
-            json=json,
-            data=data,
-            headers=headers,
-            params=params,
-            verify=verify,
-            stream=stream,
-            timeout=timeout,
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"\n Data: {data}\n Json: {json}\n Headers: {headers}\n Params: {params}")
+        if json is not None:
+            data = self.json_codec.dumps(json)
+            headers = (headers if headers else {}) | {"Content-Type": "application/json"}
+        retry_policy = retry_policy if retry_policy else self.retry_policy
+        if not self._is_repeatable_body(data):
+            retry_policy = NO_RETRY
+        body_position = self._body_position(data)
+        rate_limiter = self.rate_limiter
+        attempt = 0
+        waited = 0.0
+        while True:
+            if attempt > 0 and body_position is not None:
+                data.seek(body_position)
+            if rate_limiter is not None:
+                rate_limiter.acquire(rate_limiter.get_bucket(method, stream))
+            try:
+                resp = self.session.request(
+                    method,
+                    url,
+                    data=data,
+                    headers=headers,
+                    params=params,
+                    verify=verify,
+                    stream=stream,
+                    timeout=timeout,
+                )
+            except requests.RequestException as e:
+                if not retry_policy.is_retryable_exception(method, e, idempotent):
+                    raise
+                delay = retry_policy.get_delay(attempt, waited)
+                if delay is None:
+                    raise
+                logger.warning(f"{method} {url} failed: {e}. Retrying in {delay:.2f}s")
+            else:
+                if not retry_policy.is_retryable_status(method, resp.status_code, idempotent):
+                    break
+                delay = retry_policy.get_delay(attempt, waited, resp.headers.get("Retry-After"))
+                if delay is None:
+                    break
+                logger.warning(f"{method} {url} returned {resp.status_code}. Retrying in {delay:.2f}s")
+                resp.close()
+            time.sleep(delay)
+            waited += delay
+            attempt += 1
         if stream or not handle_response:
             return resp
         return self._handle_response(resp)
 
-    @staticmethod
-    def _handle_response(resp):
+    def _handle_response(self, resp):
         logger.info(f"\nResponse Status code: {resp.status_code}")
-        logger.debug(f" Headers: {resp.headers}\n Content: {resp.content}\n")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f" Headers: {resp.headers}\n Content: {resp.content}\n")
         if resp.status_code == 200:  # or requests.code.ok
             if len(resp.content) == 0:
                 return
-            return json.loads(resp.content).get("data")
+            return self.json_codec.loads(resp.content).get("data")
         if resp.status_code == 201:  # or requests.code.ok
             return resp.headers.get("Location")
         if resp.status_code == 204:  # or requests.code.ok
             return
         if resp.status_code == 403:
-            content = json.loads(resp.content)
+            content = self.json_codec.loads(resp.content)
             if content.get("errorCode") == 3001:
                 logger.warning("403 Error: 3001")
                 err_msg = f"403 Error \n{content.get('errorCode')}\n{content.get('errorMessage')}\nPlease install a valid Cryptshare license on this Cryptshare server where the REST API is licensed."
@@ -60,6 +229,6 @@ class CryptshareApiRequests:
             raise requests.HTTPError(err_msg)
         if resp.status_code in [400, 401, 404, 406, 409, 410, 429, 500, 501]:
             logger.warning(f"{resp.status_code} Error")
-            content = json.loads(resp.content)
+            content = self.json_codec.loads(resp.content)
             err_msg = f"{resp.status_code} Error \n{content.get('errorCode')}\n{content.get('errorMessage')}"
             raise requests.HTTPError(err_msg)
@@ -0,0 +1,826 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import os
+import time
+from datetime import datetime
+
+import httpx
+
+from cryptshare.checksum import get_hashlib_algorithm, update_file_digest
+from cryptshare.client import DEFAULT_STATUS_WORKERS, CryptshareClient
+from cryptshare.download import (
+    PART_STATE_INTERVAL,
+    PART_SUFFIX,
+    CryptshareDownload,
+    CryptshareDownloadResult,
+    parse_content_range,
+    read_part_offset,
+    remove_part_state,
+    safe_file_path,
+    write_part_state,
+)
+from cryptshare.notification_message import CryptshareNotificationMessage
+from cryptshare.password_policy import MAX_SERVER_CHECKS, CryptsharePasswordPolicy
+from cryptshare.retry import NO_RETRY, CryptshareRetryPolicy
+from cryptshare.transfer import (
+    DEFAULT_UPLOAD_WORKERS,
+    CryptshareTransfer,
+    CryptshareUploadError,
+    TransferFile,
+)
+from cryptshare.transfer_policy import (
+    DEFAULT_POLICY_CHUNK_SIZE,
+    CryptshareTransferPolicy,
+    group_recipients,
+)
+from cryptshare.transfer_security_mode import (
+    CryptshareTransferSecurityMode,
+    OneTimePaswordSecurityModes,
+)
+from cryptshare.transfer_settings import CryptshareTransferSettings
+from cryptshare.validators import CryptshareValidators
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Size of the chunks file contents are streamed with
+
+
+def sync_only(name: str):
+    """Returns a method raising a TypeError, to hide an inherited blocking method that has no coroutine version"""
+
+    def method(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__}.{name} is only available on the synchronous client")
+
+    method.__name__ = name
+    return method
+
+
+class AsyncCryptshareApiRequests:
+    """Asynchronous counterpart of CryptshareApiRequests, based on httpx"""
+
+    _async_session: httpx.AsyncClient = None
+
+    @property
+    def async_session(self) -> httpx.AsyncClient:
+        """Pooled asynchronous HTTP session, shared with the owning Cryptshare client if there is one"""
+        if self._cryptshare_client is not None and self._cryptshare_client is not self:
+            return self._cryptshare_client.async_session
+        if self._async_session is None:
+            self._async_session = self.create_async_session()
+        return self._async_session
+
+    def create_async_session(self) -> httpx.AsyncClient:
+        logger.debug(f"Creating async HTTP session: pool_maxsize={self.pool_maxsize}, keep_alive={self.keep_alive}")
+        limits = httpx.Limits(
+            max_connections=self.pool_connections * self.pool_maxsize,
+            max_keepalive_connections=self.pool_maxsize if self.keep_alive else 0,
+        )
+        return httpx.AsyncClient(verify=self.ssl_verify, limits=limits, timeout=None)
+
+    async def aclose(self) -> None:
+        """Closes the async HTTP session owned by this object and all its pooled connections"""
+        if self._async_session is not None:
+            logger.debug("Closing async HTTP session")
+            await self._async_session.aclose()
+            self._async_session = None
+
+    async def _request(
+        self,
+        method,
+        url,
+        data=None,
+        json=None,
+        headers=None,
+        verify=None,
+        params=None,
+        stream=False,
+        handle_response=True,
+        timeout: int = None,
+        retry_policy: CryptshareRetryPolicy = None,
+        idempotent: bool = None,
+    ):
+        logger.info(f"Sending async API request\n {method} {url}")
+        logger.debug(f"\n Json: {json}\n Headers: {headers}\n Params: {params}")
+        if json is not None:
+            data = self.json_codec.dumps(json)
+            headers = (headers if headers else {}) | {"Content-Type": "application/json"}
+        retry_policy = retry_policy if retry_policy else self.retry_policy
+        if not isinstance(data, (bytes, str, type(None))):
+            retry_policy = NO_RETRY
+            # Streamed bodies can't be sent twice
+        rate_limiter = self.rate_limiter
+        attempt = 0
+        waited = 0.0
+        while True:
+            if rate_limiter is not None:
+                await asyncio.sleep(rate_limiter.reserve(rate_limiter.get_bucket(method, stream)))
+            request = self.async_session.build_request(
+                method,
+                url,
+                content=data,
+                headers=headers,
+                params=params,
+                timeout=timeout,
+            )
+            try:
+                resp = await self.async_session.send(request, stream=stream)
+            except httpx.TransportError as e:
+                retryable = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) or retry_policy.is_idempotent(
+                    method, idempotent
+                )
+                delay = retry_policy.get_delay(attempt, waited) if retryable else None
+                if delay is None:
+                    raise
+                logger.warning(f"{method} {url} failed: {e}. Retrying in {delay:.2f}s")
+            else:
+                if not retry_policy.is_retryable_status(method, resp.status_code, idempotent):
+                    break
+                delay = retry_policy.get_delay(attempt, waited, resp.headers.get("Retry-After"))
+                if delay is None:
+                    break
+                logger.warning(f"{method} {url} returned {resp.status_code}. Retrying in {delay:.2f}s")
+                await resp.aclose()
+            await asyncio.sleep(delay)
+            waited += delay
+            attempt += 1
+        if stream or not handle_response:
+            return resp
+        return self._handle_response(resp)
+
+
+async def iter_file_chunks(path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Reads a file in chunks in a worker thread, so the event loop is never blocked by disk I/O"""
+    with open(path, "rb") as handle:
+        while True:
+            chunk = await asyncio.to_thread(handle.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class AsyncTransferFile(AsyncCryptshareApiRequests, TransferFile):
+    @classmethod
+    async def create(
+        cls, path: str, session_tracking_id: str, cryptshare_client, checksum_algorithm: str = None
+    ) -> "AsyncTransferFile":
+        """Creates the file object, calculating its checksum in a worker thread"""
+        return await asyncio.to_thread(cls, path, session_tracking_id, cryptshare_client, checksum_algorithm)
+
+    async def announce_upload(self) -> None:
+        url = f"{self.transfer_session_url}/files"
+        logger.info(f"Announcing file {self.name} upload POST {url}")
+        r = await self._request(
+            "POST",
+            url,
+            headers=self._cryptshare_client.header.request_header,
+            json=self.data(),
+        )
+        logger.debug(f"File upload announced at {r}")
+        self._file_id = self.get_file_id_from_returned_url(r)
+        logger.debug(f"File ID: {self._file_id}")
+
+    async def upload_file_content(self) -> bool:
+        url = f"{self.transfer_session_url}/files/{self._file_id}/content"
+        logger.info(f"Uploading file {self.name} content to PUT {url}")
+        await self._request(
+            "PUT",
+            url,
+            data=iter_file_chunks(self.path),
+            headers=self._cryptshare_client.header.extra_header({"Content-Length": str(self.size)}),
+        )
+        return True
+
+    async def delete_upload(self) -> bool:
+        url = f"{self.transfer_session_url}/files/{self._file_id}"
+        logger.debug(f"Deleting uploaded file {self.name}  DELETE {url}")
+        await self._request("DELETE", url, headers=self._cryptshare_client.header.request_header)
+        return True
+
+
+class AsyncCryptshareTransfer(AsyncCryptshareApiRequests, CryptshareTransfer):
+    async def start_transfer_session(self, cryptshare_client=None) -> [dict, None]:
+        """Starts a new transfer session"""
+        if self._session_is_open:
+            logger.error("Cryptshare Transfer Session is open, can't restart it")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        path = f"{self._cryptshare_client.api_path('users')}{self._settings.sender.email}/transfer-sessions"
+        logger.info(f"Starting transfer for {self._settings.sender.email}  POST {path}")
+        r = await self._request(
+            "POST",
+            path,
+            headers=self._cryptshare_client.header.extra_header({"Content-Type": "application/json"}),
+            json=self.get_sender_and_recipients(),
+        )
+        logger.debug(f"Transfer session started at {r}")
+        self.tracking_id = self.get_transfer_id_from_returned_url(r)
+        self._session_is_open = True
+        return r
+
+    async def upload_file(self, path: str, cryptshare_client=None) -> [AsyncTransferFile, None]:
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't upload file")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        return await self._upload_transfer_file(path)
+
+    async def upload_files(
+        self, paths: list[str], max_workers: int = DEFAULT_UPLOAD_WORKERS, cryptshare_client=None
+    ) -> [list[AsyncTransferFile], None]:
+        """Uploads several files concurrently, see CryptshareTransfer.upload_files"""
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't upload files")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        semaphore = asyncio.Semaphore(max(1, min(max_workers, self._cryptshare_client.pool_maxsize)))
+
+        async def upload(path: str) -> AsyncTransferFile:
+            async with semaphore:
+                return await self._upload_transfer_file(path)
+
+        results = await asyncio.gather(*[upload(path) for path in paths], return_exceptions=True)
+        files = [result for result in results if not isinstance(result, BaseException)]
+        errors = {path: result for path, result in zip(paths, results) if isinstance(result, BaseException)}
+        if errors:
+            raise CryptshareUploadError(errors, files)
+        return files
+
+    async def _upload_transfer_file(self, path: str) -> AsyncTransferFile:
+        file = await AsyncTransferFile.create(path, self.tracking_id, self._cryptshare_client, self.checksum_algorithm)
+        await file.announce_upload()
+        try:
+            await file.upload_file_content()
+        except Exception:
+            logger.debug(f"Removing partially uploaded file {file.name} from transfer session")
+            try:
+                await file.delete_upload()
+            except Exception as e:
+                logger.warning(f"Failed to remove partially uploaded file {file.name}: {e}")
+            raise
+        self.files.append(file)
+        return file
+
+    async def delete_file(self, file: AsyncTransferFile, cryptshare_client=None) -> None:
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't upload file")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        logger.debug(f"Deleting file {file.name}")
+        await file.delete_upload()
+        self.files.remove(file)
+
+    async def delete_transfer_session(self) -> None:
+        if self._session_is_open:
+            path = self.get_transfer_session_url()
+            logger.debug(f"Deleting transfer session DELETE {path}")
+            await self._request("DELETE", path, headers=self._cryptshare_client.header.request_header)
+            self._session_is_open = False
+
+    def __del__(self) -> None:
+        if self._session_is_open:
+            logger.warning(f"Async Cryptshare Transfer {self.tracking_id} deleted with an open transfer session")
+
+    async def get_transfer_settings(self, cryptshare_client=None) -> [dict, None]:
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't upload file")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        path = self.get_transfer_session_url()
+        logger.info(f"Getting transfer settings from GET {path}")
+        return await self._request("GET", path, headers=self._cryptshare_client.header.request_header)
+
+    async def update_transfer_settings(
+        self, transfer_settings: CryptshareTransferSettings = None, cryptshare_client=None
+    ) -> [dict, None]:
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't change Transfer Settings")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+        self._settings = transfer_settings if transfer_settings else self._settings
+        # Update transfer's settings, if provided
+
+        path = self.get_transfer_session_url()
+        logger.debug(f"Editing transfer settings PATCH {path}")
+        return await self._request(
+            "PATCH",
+            path,
+            json=self._settings.data(),
+            headers=self._cryptshare_client.header.request_header,
+            idempotent=True,
+        )
+
+    async def send_transfer(self, cryptshare_client=None) -> [dict, None]:
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't change Transfer Settings")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        path = self.get_transfer_session_url()
+        logger.debug(f"Sending transfer POST {path}")
+        r = await self._request("POST", path, headers=self._cryptshare_client.header.request_header)
+        self._session_is_open = False
+        return r
+
+    async def get_transfer_status(self, cryptshare_client=None) -> [dict, None]:
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        path = self.get_transfer_status_url()
+        logger.debug(f"Getting transfer status GET {path}")
+        return await self._request("GET", path, headers=self._cryptshare_client.header.request_header)
+
+
+class AsyncCryptshareDownload(AsyncCryptshareApiRequests, CryptshareDownload):
+    # Inherited methods built on the blocking requests, calling them would send no request or fail obscurely
+    download_file_segmented = sync_only("download_file_segmented")
+    sync = sync_only("sync")
+    iter_file_content = sync_only("iter_file_content")
+    iter_files = sync_only("iter_files")
+    download_to_sink = sync_only("download_to_sink")
+    download_all_to_sinks = sync_only("download_all_to_sinks")
+    extract_zip_file = sync_only("extract_zip_file")
+
+    async def download_transfer_information(self):
+        path = f"{self.server}/api/transfers/{self.transfer_id}?password={self.password}"
+        logger.info(f"Downloading transfer information for transfer: {self.transfer_id} from {path}")
+        return await self._request("GET", path, headers=self._cryptshare_client.header.request_header)
+
+    async def download_eml_info(self):
+        path = f"{self.server}/api/transfers/{self.transfer_id}/eml?password={self.password}"
+        logger.info(f"Downloading eml for transfer: {self.transfer_id} from {path}")
+        return await self._request("GET", path, headers=self._cryptshare_client.header.request_header)
+
+    async def download_files_info(self):
+        path = f"{self.server}/api/transfers/{self.transfer_id}/files?password={self.password}"
+        logger.info(f"Downloading files info for transfer: {self.transfer_id} from {path}")
+        return await self._request("GET", path, headers=self._cryptshare_client.header.request_header)
+
+    async def _download_part(
+        self, url: str, part_path: str, offset: int, size: int = None, callback=None, algorithm: str = None
+    ) -> tuple:
+        """Downloads a file into its .part file, see CryptshareDownload._download_part"""
+        headers = self._cryptshare_client.header.request_header
+        if offset:
+            headers = headers | {"Range": f"bytes={offset}-"}
+        response = await self._request("GET", url, stream=True, headers=headers)
+        try:
+            if response.status_code not in (200, 206):
+                await response.aread()
+                self._handle_response(response)
+                raise httpx.HTTPStatusError(
+                    f"{response.status_code} Error", request=response.request, response=response
+                )
+            if offset:
+                content_range = parse_content_range(response.headers.get("Content-Range"))
+                if response.status_code == 206 and content_range is not None and content_range[0] == offset:
+                    logger.info(f"Resuming download of {part_path} at {offset} bytes")
+                else:
+                    logger.info(f"Server can't resume the download of {part_path}, starting from the beginning")
+                    offset = 0
+            digest = None
+            if algorithm is not None:
+                digest = hashlib.new(algorithm)
+                if offset:
+                    await asyncio.to_thread(update_file_digest, digest, part_path, offset)
+            recorded = offset
+            try:
+                with open(part_path, "r+b" if offset else "wb") as handle:
+                    handle.seek(offset)
+                    handle.truncate()
+                    async for data in response.aiter_bytes(self.chunk_size):
+                        offset += handle.write(data)
+                        if digest is not None:
+                            digest.update(data)
+                        if size is not None and offset > size:
+                            raise httpx.HTTPError(f"Received more than the expected {size} bytes for {part_path}")
+                        if offset - recorded >= PART_STATE_INTERVAL:
+                            handle.flush()
+                            write_part_state(part_path, offset, size)
+                            recorded = offset
+                        if callback is not None:
+                            callback(offset)
+            finally:
+                write_part_state(part_path, offset, size)
+        finally:
+            await response.aclose()
+        return offset, digest
+
+    async def download_file(
+        self,
+        url: str,
+        filename: str,
+        directory: str,
+        size: int = None,
+        callback=None,
+        checksum: str = None,
+        checksum_algorithm: str = None,
+    ) -> CryptshareDownloadResult:
+        """Download a file from an URL to the given directory, see CryptshareDownload.download_file
+
+        Like the synchronous download, the content is written to a .part file that is continued after an
+        interruption and renamed once size and checksum are verified. Size errors raise an httpx.HTTPError
+        instead of a requests.HTTPError.
+        """
+        start = time.monotonic()
+        full_path = os.path.join(directory, filename)
+        part_path = full_path + PART_SUFFIX
+        os.makedirs(directory, exist_ok=True)
+        size = int(size) if size is not None else None
+        offset = read_part_offset(part_path, size)
+        algorithm = get_hashlib_algorithm(checksum_algorithm) if checksum or checksum_algorithm else None
+        digest = None
+        attempt = 0
+        waited = 0.0
+        # Empty files are complete without a request, their .part file has to exist for the rename
+        open(part_path, "ab").close()
+        while size is None or offset < size:
+            try:
+                offset, digest = await self._download_part(url, part_path, offset, size, callback, algorithm)
+                break
+            except httpx.TransportError as e:
+                offset = read_part_offset(part_path, size)
+                delay = self.retry_policy.get_delay(attempt, waited)
+                if delay is None:
+                    raise
+                logger.warning(f"Download of {filename} interrupted at {offset} bytes: {e}. Resuming in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
+        if size is not None and offset != size:
+            raise httpx.HTTPError(f"Incomplete download of {filename}: received {offset} of {size} bytes")
+        if algorithm is not None and digest is None:
+            # The .part file was complete already, only the rename was missing
+            digest = await asyncio.to_thread(update_file_digest, hashlib.new(algorithm), part_path)
+        actual = self._verify_checksum(filename, digest, checksum, part_path)
+        os.replace(part_path, full_path)
+        remove_part_state(part_path)
+        return CryptshareDownloadResult(
+            filename, full_path, offset, time.monotonic() - start, checksum=actual, verified=bool(checksum)
+        )
+
+    async def download_transfer_file(self, file, directory: str) -> CryptshareDownloadResult:
+        """Download a file of a Transfer to the given directory, see CryptshareDownload.download_transfer_file"""
+        path = safe_file_path(directory, file["fileName"])
+        return await self.download_file(
+            self.server + file["href"],
+            os.path.basename(path),
+            os.path.dirname(path),
+            size=file["size"],
+            checksum=file.get("checksum"),
+            checksum_algorithm=file.get("checksumAlgorithm"),
+        )
+
+    async def download_all_files(self, directory: str, max_workers: int = 1) -> list[CryptshareDownloadResult]:
+        """Downloads the files concurrently, see CryptshareDownload.download_all_files"""
+        files_info = await self.download_files_info()
+        semaphore = asyncio.Semaphore(max(1, min(max_workers, self._cryptshare_client.pool_maxsize)))
+
+        async def download(file) -> CryptshareDownloadResult:
+            async with semaphore:
+                try:
+                    return await self.download_transfer_file(file, directory)
+                except Exception as e:
+                    logger.error(f"Failed to download file {file['fileName']}: {e}")
+                    return CryptshareDownloadResult(
+                        file["fileName"], os.path.join(directory, file["fileName"]), error=e
+                    )
+
+        return [await result for result in asyncio.as_completed([download(file) for file in files_info])]
+
+    async def download_zip_file(self, directory) -> CryptshareDownloadResult:
+        """Download the Transfer as ZIP archive to <transfer_id>.zip in the given directory"""
+        return await self.download_file(self.download_zip_info(), f"{self.transfer_id}.zip", directory)
+
+    async def download_eml_file(self, directory) -> CryptshareDownloadResult:
+        return await self.download_file(await self.download_eml_info(), f"{self.transfer_id}.eml", directory)
+
+
+class AsyncCryptshareClient(AsyncCryptshareApiRequests, CryptshareClient):
+    """Cryptshare client for asyncio applications.
+
+    Mirrors CryptshareClient, but every method talking to the Cryptshare server is a coroutine. File contents
+    are streamed in both directions, so many transfers can run concurrently in a single event loop.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
+        self.close()
+
+    async def cors(self, origin: str) -> None:
+        path = f"{self.api_path('products')}api.rest/cors"
+        logger.info(f"Checking CORS for origin {origin} and {path}")
+        r = await self._request("GET", path, headers=self.header.extra_header({"Origin": origin}))
+        logger.info(f"CORS is active for origin {origin}: {r.get('active')}")
+
+    async def _get_metadata(self, endpoint: str, path: str, key: str = ""):
+        if self.metadata_cache is not None:
+            value = self.metadata_cache.get(endpoint, key)
+            if value is not None:
+                return value
+        logger.info(f"Getting {endpoint.replace('_', ' ')} from {path}")
+        value = await self._request("GET", path, headers=self.header.request_header)
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(endpoint, value, key)
+        return value
+
+    async def get_language_packs(self, product_key: str = "api.rest") -> list:
+        path = self.api_path("products") + f"{product_key}/language-packs"
+        return await self._get_metadata("language_packs", path, product_key)
+
+    async def get_available_languages(self, product_key: str = "api.rest") -> list:
+        data = await self.get_language_packs(product_key)
+        return list(set([lp["locale"] for lp in data]))
+
+    async def get_terms_of_use(self) -> dict:
+        path = self.api_path("products") + "api.rest/legal/terms-of-use"
+        return await self._get_metadata("terms_of_use", path)
+
+    async def get_imprint(self) -> dict:
+        path = self.api_path("products") + "api.rest/legal/imprint"
+        return await self._get_metadata("imprint", path)
+
+    async def request_client_id(self):
+        path = self.api_path("clients")
+        logger.info(f"Requesting client ID from {path}")
+        r = await self._request("GET", path, headers=self.header.request_header)
+        self.header.client_id = r.get("clientId")
+        self._client_store.update({"X-CS-ClientId": r.get("clientId")})
+
+    async def get_password_rules(self):
+        return await self._get_metadata("password_rules", self.api_path("password_requirements"))
+
+    async def get_human_readable_password_rules(self, password_rules: list = None) -> list:
+        if password_rules is None:
+            password_rules = await self.get_password_rules()
+        return super().get_human_readable_password_rules(password_rules)
+
+    async def validate_password(self, password: str) -> dict:
+        path = self.api_path("password")
+        logger.info(f"Validating password for from {path}")
+        return await self._request(
+            "POST",
+            path,
+            headers=self.header.extra_header({"Content-Type": "application/json"}),
+            json={"password": password},
+            idempotent=True,
+        )
+
+    async def get_password_policy(self) -> CryptsharePasswordPolicy:
+        return CryptsharePasswordPolicy(await self.get_password_rules())
+
+    async def check_password(self, password: str) -> dict:
+        result = (await self.get_password_policy()).validate(password)
+        if not result["valid"] or result["complete"]:
+            return result
+        return result | await self.validate_password(password)
+
+    async def is_valid_password(self, password: str) -> bool:
+        return (await self.check_password(password)).get("valid", False)
+
+    async def generate_password(self, length: int = None) -> str:
+        password_policy = await self.get_password_policy()
+        if not password_policy.can_generate:
+            return await self.get_password()
+        if not password_policy.requires_server:
+            return password_policy.generate(length)
+        for _ in range(MAX_SERVER_CHECKS):
+            password = password_policy.generate(length)
+            if (await self.validate_password(password)).get("valid", False):
+                return password
+            logger.debug("Generated password was rejected by the server, generating another one")
+        return await self.get_password()
+
+    async def get_password(self) -> str:
+        path = self.api_path("password")
+        logger.info(f"Getting generated password from {path}")
+        r = await self._request("GET", path, headers=self.header.request_header)
+        return r.get("password", None)
+
+    async def request_code(self) -> None:
+        path = self.api_path("users") + self.sender_email + "/verification/code/email"
+        logger.info(f"Requesting verification code for {self.sender_email} from {path}")
+        await self._request("POST", path, headers=self.header.request_header)
+
+    async def verify_code(self, code: str) -> bool:
+        url = f"{self.api_path('users')}{self.sender_email}/verification/token"
+        logger.info(f"Verifying code {code} for {self.sender_email} from {url} to obtain verification token")
+        r = await self._request("POST", url, json={"verificationCode": code}, headers=self.header.request_header)
+        verification_token = r.get("token")
+        self.set_verification_in_store(self.sender_email, verification_token)
+        self.header.verification_token = verification_token
+        return True
+
+    async def is_verified(self) -> bool:
+        return (await self.get_verification()).get("verified", False)
+
+    async def get_verification(self) -> dict:
+        path = f"{self.api_path('users')}{self.sender_email}/verification"
+        logger.info(f"Getting verification status for {self.sender_email} from {path}")
+        return await self._request("GET", path, headers=self.header.request_header)
+
+    async def start_transfer(self, recipients, settings: CryptshareTransferSettings) -> AsyncCryptshareTransfer:
+        logger.debug(f"Starting transfer for {self.sender_email} to {recipients} with settings {settings}")
+        transfer = AsyncCryptshareTransfer(
+            settings,
+            to=recipients.get("to"),
+            cc=recipients.get("cc"),
+            bcc=recipients.get("bcc"),
+            cryptshare_client=self,
+        )
+        await transfer.start_transfer_session()
+        await transfer.update_transfer_settings(settings)
+        return transfer
+
+    def download_transfer(self, transfer_id, password) -> AsyncCryptshareDownload:
+        logger.debug(f"Downloading transfer {transfer_id} from {self._server}")
+        return AsyncCryptshareDownload(self, transfer_id, password)
+
+    async def get_transfers(self) -> dict:
+        path = self.api_path("users") + self.sender_email + "/transfers"
+        logger.info(f"Getting transfers for {self.sender_email} from {path}")
+        return await self._request("GET", path, headers=self.header.request_header)
+
+    async def _setup_sender(self, sender_email: str, sender_name: str, sender_phone: str) -> bool:
+        """Sets up an already verified sender, email verification requires user input and is not done here"""
+        if self._sender is not None:
+            return True
+        if sender_email is None:
+            logger.error("Sender email is required.")
+            return False
+        if self.exists_client_id() is False:
+            await self.request_client_id()
+        self.set_sender(sender_email, sender_name, sender_phone)
+        verification = await self.get_verification()
+        if verification.get("verified") is not True:
+            logger.error(f"Sender {sender_email} is not verified.")
+            self._sender = None
+            return False
+        return True
+
+    async def get_transfer_status(self, tracking_id: str) -> dict:
+        if not CryptshareValidators.is_valid_tracking_id_or_blank(tracking_id):
+            raise ValueError("Invalid tracking ID")
+        path = self.api_path("users") + self.sender_email + "/transfers/" + tracking_id
+        logger.debug(f"Getting transfer status GET {path}")
+        return await self._request("GET", path, headers=self.header.request_header)
+
+    async def iter_transfer_status(self, max_workers: int = DEFAULT_STATUS_WORKERS, transfers: list = None):
+        """Yields the status of all transfers of the sender, see CryptshareClient.iter_transfer_status"""
+        transfers = transfers if transfers is not None else await self.get_transfers()
+        missing = []
+        for list_transfer in transfers:
+            if list_transfer.get("status") is not None:
+                yield {"trackingID": list_transfer["trackingId"], "status": list_transfer["status"]}
+            else:
+                missing.append(list_transfer["trackingId"])
+        semaphore = asyncio.Semaphore(max(1, min(max_workers, self.pool_maxsize)))
+
+        async def get_status(tracking_id: str) -> dict:
+            async with semaphore:
+                return {"trackingID": tracking_id, "status": (await self.get_transfer_status(tracking_id))["status"]}
+
+        for status in asyncio.as_completed([get_status(tracking_id) for tracking_id in missing]):
+            yield await status
+
+    async def transfer_status(
+        self,
+        transfer_tracking_id: str = None,
+        sender_name: str = None,
+        sender_phone: str = None,
+        sender_email: str = None,
+        max_workers: int = DEFAULT_STATUS_WORKERS,
+    ):
+        self.read_client_store()
+        if self.exists_client_id() is False:
+            await self.request_client_id()
+        if not await self._setup_sender(sender_email, sender_name, sender_phone):
+            return
+
+        if transfer_tracking_id is None:
+            return [status async for status in self.iter_transfer_status(max_workers=max_workers)]
+        return await self.get_transfer_status(transfer_tracking_id)
+
+    async def request_policy(self, recipients: list[str]) -> dict:
+        key = None
+        if self.policy_cache is not None:
+            key = self.policy_cache.key(self._server, self.sender_email, recipients)
+            cached = self.policy_cache.get(key)
+            if cached is not None:
+                return cached
+        path = self.api_path("users") + self.sender_email + "/transfer-policy"
+        logger.info(f"Getting policy for {self.sender_email} and  {recipients} from {path}")
+        r = await self._request(
+            "POST",
+            path,
+            headers=self.header.extra_header({"Content-Type": "application/json"}),
+            json={"recipients": recipients},
+            idempotent=True,
+        )
+        if key is not None:
+            self.policy_cache.set(key, r)
+        return r
+
+    async def get_policy(
+        self, recipients, resolve: str = None, chunk_size: int = DEFAULT_POLICY_CHUNK_SIZE
+    ) -> CryptshareTransferPolicy:
+        groups = group_recipients(recipients, resolve, chunk_size)
+        policies = await asyncio.gather(*[self.request_policy(query) for query, _ in groups])
+        return CryptshareTransferPolicy.merge([CryptshareTransferPolicy(policy) for policy in policies], groups)
+
+    async def send_transfer(
+        self,
+        transfer_password: str,
+        expiration_date: datetime,
+        files: str,
+        recipients: list[str] = None,
+        cc: list[str] = None,
+        bcc: list[str] = None,
+        subject: str = "",
+        message: str = "",
+        sender_email: str = None,
+        sender_name: str = "",
+        sender_phone: str = "",
+        max_upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+        **kwargs,  # Additional Transfer settings, CryptshareTransferSettings documentation
+    ) -> [AsyncCryptshareTransfer, None]:
+        """Send a transfer using the Cryptshare server."""
+        recipients = recipients if recipients else []
+        cc = cc if cc else []
+        bcc = bcc if bcc else []
+        all_recipients = list(itertools.chain(recipients, cc, bcc))
+
+        if not await self._setup_sender(sender_email, sender_name, sender_phone):
+            return
+
+        transfer_security_mode = CryptshareTransferSecurityMode(
+            password=transfer_password, mode=OneTimePaswordSecurityModes.MANUAL
+        )
+        if transfer_password == "" or transfer_password is None:
+            transfer_password = await self.generate_password()
+            transfer_security_mode = CryptshareTransferSecurityMode(password=transfer_password)
+        else:
+            passwort_validated_response = await self.check_password(transfer_password)
+            if not passwort_validated_response.get("valid"):
+                logger.error("Passwort is not valid.")
+                return
+
+        transfer_policy = await self.get_policy(all_recipients)
+        if not transfer_policy.is_allowed:
+            logger.error(f"Policy not valid: {transfer_policy}")
+            return
+
+        subject = subject if subject != "" else None
+        notification = CryptshareNotificationMessage(message, subject)
+        settings = CryptshareTransferSettings(
+            self._sender,
+            notification_message=notification,
+            send_download_notifications=True,
+            security_mode=transfer_security_mode,
+            expiration_date=expiration_date,
+            recipientLanguage=notification.language,
+            senderLanguage=self._sender.language,
+            **kwargs,
+        )
+
+        transfer = AsyncCryptshareTransfer(
+            settings,
+            to=[{"mail": recipient} for recipient in recipients],
+            cc=[{"mail": recipient} for recipient in cc],
+            bcc=[{"mail": recipient} for recipient in bcc],
+            cryptshare_client=self,
+        )
+        transfer.set_generated_password(transfer_password)
+        await transfer.start_transfer_session()
+        try:
+            await transfer.upload_files(files, max_workers=max_upload_workers)
+            await transfer.send_transfer()
+        except Exception:
+            await transfer.delete_transfer_session()
+            raise
+        logger.info(f"Transfer {transfer.tracking_id} uploaded successfully.")
+        return transfer
@@ -3,8 +3,19 @@ import json
 import logging
 import os
 
-from cryptshare.api_requests import CryptshareApiRequests
+from cryptshare.api_requests import (
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+    CryptshareApiRequests,
+)
+from cryptshare.checksum import CryptshareChecksumCache
 from cryptshare.header import CryptshareHeader
+from cryptshare.json_codec import CryptshareJsonCodec, get_default_json_codec
+from cryptshare.metadata_cache import CryptshareMetadataCache
+from cryptshare.password_policy import MAX_SERVER_CHECKS, CryptsharePasswordPolicy
+from cryptshare.rate_limiter import CryptshareRateLimiter
+from cryptshare.retry import CryptshareRetryPolicy
+from cryptshare.transfer_policy import CryptshareTransferPolicyCache
 from cryptshare.validators import CryptshareValidators
 
 logger = logging.getLogger(__name__)
@@ -14,7 +25,10 @@ CURRENT_MAXIMUM_TARGET_API_VERSION = "1.9"
 
 class CryptshareBaseClient(CryptshareApiRequests):
     _target_api_version = CURRENT_MAXIMUM_TARGET_API_VERSION
+    checksum_cache: CryptshareChecksumCache = None
     header: CryptshareHeader = None
+    metadata_cache: CryptshareMetadataCache = None
+    policy_cache: CryptshareTransferPolicyCache = None
     _server = ""
     _api_paths = {
         "users": "/api/users/",
@@ -25,18 +39,90 @@ class CryptshareBaseClient(CryptshareApiRequests):
     }
     _client_store = {}
 
-    def __init__(self, server, client_store_path="client_store.json", target_api_version: str = None, ssl_verify=True):
+    def __init__(
+        self,
+        server,
+        client_store_path="client_store.json",
+        target_api_version: str = None,
+        ssl_verify=True,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        retry_policy: CryptshareRetryPolicy = None,
+        rate_limiter: [CryptshareRateLimiter, bool] = None,
+        json_codec: CryptshareJsonCodec = None,
+        checksum_cache: [CryptshareChecksumCache, bool] = None,
+        metadata_cache: [CryptshareMetadataCache, bool] = True,
+        persist_metadata: bool = False,
+        policy_cache: [CryptshareTransferPolicyCache, bool] = True,
+    ):
+        """Initialises the Cryptshare client
+
+        :param server: The URL of the Cryptshare server
+        :param client_store_path: Path of the JSON file storing client id and verifications
+        :param target_api_version: The targeted REST API version
+        :param ssl_verify: Verify the TLS certificate of the server
+        :param pool_connections: Number of per-host connection pools to keep
+        :param pool_maxsize: Maximum number of keep-alive connections kept per host
+        :param pool_block: Block when all connections of a host are in use instead of opening extra connections
+        :param keep_alive: Keep connections (and their TLS sessions) open between requests
+        :param retry_policy: Retry policy for failed requests, defaults to CryptshareRetryPolicy(), can be
+            replaced between calls by assigning `client.retry_policy`
+        :param rate_limiter: Rate limiter pacing the requests, True to use the limiter shared for this server
+        :param json_codec: JSON codec for request and response bodies, defaults to orjson if it is installed
+        :param checksum_cache: Cache for file checksums, True to use a cache stored next to the client store
+        :param metadata_cache: Cache for password rules, language packs and legal texts, True to use the
+            cache shared for this server, False to request them on every call
+        :param persist_metadata: Persist the shared metadata cache next to the client store
+        :param policy_cache: Cache for transfer policies, True to use the cache shared by all clients, False to
+            request the policy for every transfer
+        """
         logger.info(f"Initialising Cryptshare Client for server: {server}")
         if not CryptshareValidators.is_valid_server_url(server):
             raise ValueError("Invalid Cryptshare server URL")
         self._server = server
         self.client_store_path = client_store_path
         self.ssl_verify = ssl_verify
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.retry_policy = retry_policy if retry_policy else CryptshareRetryPolicy()
+        if rate_limiter is True:
+            rate_limiter = CryptshareRateLimiter.for_server(self.server_hash)
+        self.rate_limiter = rate_limiter if rate_limiter else None
+        self.json_codec = json_codec if json_codec else get_default_json_codec()
+        # Only a cache created by the client is closed with it, a given cache may be shared with other clients
+        self._owns_checksum_cache = checksum_cache is True
+        if checksum_cache is True:
+            checksum_cache = CryptshareChecksumCache(self.checksum_cache_path)
+        self.checksum_cache = checksum_cache if checksum_cache not in (None, False) else None
+        self.persist_metadata = persist_metadata
+        self._shared_metadata_cache = metadata_cache is True
+        if metadata_cache is True:
+            metadata_cache = self.get_shared_metadata_cache()
+        # Caches define __len__, an empty cache must not be mistaken for no cache
+        self.metadata_cache = metadata_cache if metadata_cache not in (None, False) else None
+        if policy_cache is True:
+            policy_cache = CryptshareTransferPolicyCache.shared()
+        self.policy_cache = policy_cache if policy_cache not in (None, False) else None
         self._target_api_version = os.getenv("CRYPTSHARE_API_VERSION", self._target_api_version)
         if target_api_version:
             self._target_api_version = target_api_version
         self.header = CryptshareHeader(target_api_version=self._target_api_version)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        super().close()
+        if self.checksum_cache is not None and self._owns_checksum_cache:
+            self.checksum_cache.close()
+
     @property
     def server(self):
         return self._server
@@ -49,6 +135,31 @@ class CryptshareBaseClient(CryptshareApiRequests):
     def server(self, server: str):
         logger.info(f"Setting server to {server}")
         self._server = server
+        if self._shared_metadata_cache:
+            self.metadata_cache = self.get_shared_metadata_cache()
+
+    def get_shared_metadata_cache(self) -> CryptshareMetadataCache:
+        path = self.metadata_cache_path if self.persist_metadata else None
+        return CryptshareMetadataCache.for_server(self.server_hash, path=path)
+
+    def invalidate_metadata(self, endpoint: str = None) -> None:
+        """Drops cached metadata, e.g. after the server configuration changed
+
+        :param endpoint: The endpoint to invalidate, like "password_rules", all endpoints if not given
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(endpoint)
+
+    def _get_metadata(self, endpoint: str, path: str, key: str = ""):
+        """GETs a slow-changing metadata endpoint, answered from the metadata cache while the response is fresh"""
+
+        def fetch():
+            logger.info(f"Getting {endpoint.replace('_', ' ')} from {path}")
+            return self._request("GET", path, verify=self.ssl_verify, headers=self.header.request_header)
+
+        if self.metadata_cache is None:
+            return fetch()
+        return self.metadata_cache.get_or_fetch(endpoint, fetch, key)
 
     def api_path(self, path: str):
         return f"{self._server}{self._api_paths.get(path, '')}"
@@ -101,14 +212,7 @@ class CryptshareBaseClient(CryptshareApiRequests):
     def get_language_packs(self, product_key: str = "api.rest") -> list:
         # "GET https://<your-url>/api/products/<product-key>/language-packs"
         path = self.api_path("products") + f"{product_key}/language-packs"
-        logger.info(f"Getting language packs from {path}")
-        r = self._request(
-            "GET",
-            path,
-            verify=self.ssl_verify,
-            headers=self.header.request_header,
-        )
-        return r
+        return self._get_metadata("language_packs", path, product_key)
 
     def get_available_languages(self, product_key: str = "api.rest") -> list:
         data = self.get_language_packs(product_key)
@@ -117,26 +221,12 @@ class CryptshareBaseClient(CryptshareApiRequests):
     def get_terms_of_use(self) -> dict:
         # "GET https://<your-url>/api/products/<product-key>/terms-of-use"
         path = self.api_path("products") + "api.rest/legal/terms-of-use"
-        logger.info(f"Getting terms of use from {path}")
-        r = self._request(
-            "GET",
-            path,
-            verify=self.ssl_verify,
-            headers=self.header.request_header,
-        )
-        return r
+        return self._get_metadata("terms_of_use", path)
 
     def get_imprint(self) -> dict:
         # "GET https://<your-url>/api/products/<product-key>/imprint"
         path = self.api_path("products") + "api.rest/legal/imprint"
-        logger.info(f"Getting imprint from {path}")
-        r = self._request(
-            "GET",
-            path,
-            verify=self.ssl_verify,
-            headers=self.header.request_header,
-        )
-        return r
+        return self._get_metadata("imprint", path)
 
     def request_client_id(self):
         path = self.api_path("clients")
@@ -163,6 +253,14 @@ class CryptshareBaseClient(CryptshareApiRequests):
         client_store = f"{path[0]}_{self.server_hash}{path[1]}"
         return client_store
 
+    @property
+    def metadata_cache_path(self):
+        return f"{os.path.splitext(self.client_store_path)[0]}_{self.server_hash}_metadata.json"
+
+    @property
+    def checksum_cache_path(self):
+        return f"{os.path.splitext(self.client_store_path)[0]}_checksums.sqlite"
+
     def read_client_store(self):
         logger.debug(f"Reading client store from {self.server_client_store_path}")
         try:
@@ -186,15 +284,7 @@ class CryptshareBaseClient(CryptshareApiRequests):
             logger.warning(f"Failed to write client store to {self.server_client_store_path}")
 
     def get_password_rules(self):
-        path = self.api_path("password_requirements")
-        logger.info(f"Getting password rules from {path}")
-        r = self._request(
-            "GET",
-            path,
-            verify=self.ssl_verify,
-            headers=self.header.request_header,
-        )
-        return r
+        return self._get_metadata("password_rules", self.api_path("password_requirements"))
 
     def get_human_readable_password_rules(self, password_rules: list = None) -> list:
         """Returning human-readable password rules from password rules list
@@ -260,11 +350,52 @@ class CryptshareBaseClient(CryptshareApiRequests):
             verify=self.ssl_verify,
             headers=self.header.extra_header({"Content-Type": "application/json"}),
             json={"password": password},
+            idempotent=True,
         )
         return r
 
+    def get_password_policy(self) -> CryptsharePasswordPolicy:
+        """Returns the local evaluator of the password rules, compiled from the cached rules"""
+        return CryptsharePasswordPolicy(self.get_password_rules())
+
+    def check_password(self, password: str) -> dict:
+        """Validates a password locally, asking the server only for rules that can't be evaluated locally
+
+        A password violating a local rule is rejected without a request to the server.
+
+        :return: Dict with "valid" and the "violations" found locally
+        """
+        result = self.get_password_policy().validate(password)
+        if not result["valid"]:
+            logger.debug(f"Password violates the password rules {result['violations']}")
+            return result
+        if result["complete"]:
+            return result
+        return result | self.validate_password(password)
+
     def is_valid_password(self, password: str) -> bool:
-        return self.validate_password(password).get("valid", False)
+        return self.check_password(password).get("valid", False)
+
+    def generate_password(self, length: int = None) -> str:
+        """Generates a password satisfying the password rules locally
+
+        If rules can only be evaluated by the server, like declined dictionary words, the generated password is
+        validated by the server and drawn again if it is rejected. Falls back to a password generated by the
+        server if the rules can't be evaluated locally, or if MAX_SERVER_CHECKS passwords were rejected.
+
+        :param length: Length of the password, defaults to the server's rules
+        """
+        password_policy = self.get_password_policy()
+        if not password_policy.can_generate:
+            return self.get_password()
+        if not password_policy.requires_server:
+            return password_policy.generate(length)
+        for _ in range(MAX_SERVER_CHECKS):
+            password = password_policy.generate(length)
+            if self.validate_password(password).get("valid", False):
+                return password
+            logger.debug("Generated password was rejected by the server, generating another one")
+        return self.get_password()
 
     def get_password(self) -> str:
         path = self.api_path("password")
@@ -0,0 +1,222 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urlsplit
+
+from cryptshare.client import CryptshareClient
+from cryptshare.download import CryptshareDownload, CryptshareDownloadResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WORKERS = 8
+# Number of files downloaded at the same time over all transfers of a batch
+DEFAULT_TRANSFER_WORKERS = 2
+# Number of files of a single transfer downloaded at the same time
+
+
+def parse_download_url(download_url: str) -> tuple[str, str, str]:
+    """Splits the download URL of a Transfer, as sent to its recipients, into server, transfer ID and password
+
+    :param download_url: URL like https://cryptshare.example.com/download?id=abc&password=secret
+    :return: Tuple of server URL, transfer ID and password
+    """
+    parts = urlsplit(download_url)
+    params = parse_qs(parts.query) | parse_qs(parts.fragment.partition("?")[2])
+    if not parts.scheme or not parts.netloc or "id" not in params or "password" not in params:
+        raise ValueError("Invalid download URL. Must contain id and password parameters.")
+    return f"{parts.scheme}://{parts.netloc}", params["id"][0], params["password"][0]
+
+
+class CryptshareTransferResult:
+    """Outcome of receiving a whole Transfer"""
+
+    def __init__(
+        self,
+        server: str,
+        transfer_id: str,
+        directory: str,
+        files: list[CryptshareDownloadResult] = None,
+        duration: float = 0.0,
+        error: Exception = None,
+    ) -> None:
+        """
+        :param server: URL of the Cryptshare server
+        :param transfer_id: ID of the Transfer
+        :param directory: Directory the files were written to
+        :param files: The result of every file
+        :param duration: Duration of the receive in seconds
+        :param error: The exception, if the Transfer could not be received at all
+        """
+        self.server = server
+        self.transfer_id = transfer_id
+        self.directory = directory
+        self.files = files if files else []
+        self.duration = duration
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and all(file.success for file in self.files)
+
+    @property
+    def size(self) -> int:
+        return sum(file.size for file in self.files if file.success)
+
+    def __repr__(self):
+        failed = len([file for file in self.files if not file.success])
+        status = "OK" if self.success else f"FAILED ({self.error if self.error else f'{failed} files failed'})"
+        return (
+            f"<CryptshareTransferResult {self.transfer_id}: {status}, {len(self.files)} files, "
+            f"{self.size} bytes in {self.duration:.2f}s>"
+        )
+
+
+class CryptshareBatchReceiver:
+    """Receives many Transfers over a shared pool of connections and worker threads.
+
+    The files of all Transfers are downloaded by one worker pool, so `max_workers` limits the concurrent
+    downloads of the whole batch, while `max_workers_per_transfer` keeps a single large Transfer from occupying
+    all workers. One client, and so one connection pool, is used per server.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        server: str = None,
+        max_workers: int = DEFAULT_BATCH_WORKERS,
+        max_workers_per_transfer: int = DEFAULT_TRANSFER_WORKERS,
+        max_transfers: int = None,
+        segments: int = 1,
+        client_store_path: str = "client_store.json",
+    ) -> None:
+        """Initialises the batch receiver
+
+        :param directory: Directory the Transfers are received into, one subdirectory per transfer ID
+        :param server: URL of the Cryptshare server of Transfers given by transfer ID and password
+        :param max_workers: Maximum number of files downloaded at the same time
+        :param max_workers_per_transfer: Maximum number of files of a single Transfer downloaded at the same time
+        :param max_transfers: Maximum number of Transfers received at the same time, defaults to max_workers
+        :param segments: Download large files in this many parallel byte ranges
+        :param client_store_path: Path of the client store of the clients created per server
+        """
+        self.directory = directory
+        self.server = server
+        self.max_workers = max_workers
+        self.max_workers_per_transfer = max_workers_per_transfer
+        self.max_transfers = max_transfers if max_transfers else max_workers
+        self.segments = segments
+        self.client_store_path = client_store_path
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def create_client(self, server: str) -> CryptshareClient:
+        """Creates the client used for all Transfers of a server, with a connection pool sized for the batch
+
+        Every file worker may hold a connection per segment, and every Transfer one for its files info.
+        """
+        cryptshare_client = CryptshareClient(
+            server,
+            client_store_path=self.client_store_path,
+            pool_maxsize=self.max_workers * max(1, self.segments) + self.max_transfers,
+        )
+        cryptshare_client.read_client_store()
+        if cryptshare_client.exists_client_id() is False:
+            cryptshare_client.request_client_id()
+        return cryptshare_client
+
+    def get_client(self, server: str) -> CryptshareClient:
+        with self._clients_lock:
+            if server not in self._clients:
+                logger.debug(f"Creating client for {server}")
+                self._clients[server] = self.create_client(server)
+            return self._clients[server]
+
+    def parse_item(self, item) -> tuple[str, str, str]:
+        """Returns server, transfer ID and password of a download URL or a (transfer ID, password) tuple"""
+        if isinstance(item, str):
+            return parse_download_url(item)
+        if len(item) == 3:
+            return tuple(item)
+        if self.server is None:
+            raise ValueError("A server is needed to receive Transfers by transfer ID and password")
+        transfer_id, password = item
+        return self.server, transfer_id, password
+
+    def receive_transfer(self, item, file_executor: ThreadPoolExecutor) -> CryptshareTransferResult:
+        """Receives a single Transfer, downloading its files on the shared file executor"""
+        start = time.monotonic()
+        server, transfer_id, password = self.parse_item(item)
+        directory = os.path.join(self.directory, transfer_id)
+        logger.info(f"Receiving Transfer {transfer_id} from {server}")
+        download = CryptshareDownload(self.get_client(server), transfer_id, password)
+        files_info = download.download_files_info()
+        slots = threading.BoundedSemaphore(self.max_workers_per_transfer)
+        futures = {}
+        for file in files_info:
+            slots.acquire()
+            future = file_executor.submit(download.download_transfer_file, file, directory, self.segments)
+            future.add_done_callback(lambda _: slots.release())
+            futures[future] = file
+        results = []
+        for future, file in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Failed to download file {file['fileName']} of Transfer {transfer_id}: {e}")
+                results.append(
+                    CryptshareDownloadResult(file["fileName"], os.path.join(directory, file["fileName"]), error=e)
+                )
+        return CryptshareTransferResult(server, transfer_id, directory, results, time.monotonic() - start)
+
+    def receive(self, items):
+        """Receives the given Transfers, yielding a result as soon as a Transfer is complete
+
+        The items are consumed lazily, so they can come from a queue or a generator. Transfers that can't be
+        received at all (e.g. because of a wrong password) are reported with their error instead of aborting the
+        batch.
+
+        :param items: Iterable of download URLs, (transfer ID, password) or (server, transfer ID, password) tuples
+        :return: Iterator of a CryptshareTransferResult per Transfer, in order of completion
+        """
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as file_executor, ThreadPoolExecutor(
+            max_workers=self.max_transfers
+        ) as transfer_executor:
+            pending = {}
+            while True:
+                while len(pending) < self.max_transfers:
+                    item = next(items, None)
+                    if item is None:
+                        break
+                    pending[transfer_executor.submit(self.receive_transfer, item, file_executor)] = item
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    exception = future.exception()
+                    if exception is None:
+                        yield future.result()
+                        continue
+                    try:
+                        server, transfer_id, _ = self.parse_item(item)
+                    except (ValueError, TypeError):
+                        server, transfer_id = None, None
+                    logger.error(f"Failed to receive Transfer {transfer_id}: {exception}")
+                    directory = os.path.join(self.directory, transfer_id) if transfer_id else None
+                    yield CryptshareTransferResult(server, transfer_id, directory, error=exception)
+
+    def close(self) -> None:
+        """Closes the clients and their connection pools"""
+        with self._clients_lock:
+            for cryptshare_client in self._clients.values():
+                cryptshare_client.close()
+            self._clients = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
@@ -0,0 +1,301 @@
+import contextlib
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKSUM_ALGORITHM = "sha256"
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+# Files are hashed in chunks of this size, so memory usage does not depend on the file size
+SAMPLE_SIZE = 64 * 1024
+# Size of the head and tail blocks used to verify checksum cache hits
+CACHE_COMMIT_INTERVAL = 100
+# Number of changes of the checksum cache committed at once inside CryptshareChecksumCache.batch
+
+
+def get_hashlib_algorithm(algorithm: str = None) -> str:
+    """Translates a checksum algorithm name like "SHA-256" (as used by fileChecksumAlgorithm) to its hashlib name
+
+    :param algorithm: The checksum algorithm, defaults to SHA-256
+    :return: The hashlib name of the algorithm
+    """
+    if not algorithm:
+        return DEFAULT_CHECKSUM_ALGORITHM
+    name = algorithm.lower()
+    # "SHA-256" is called sha256 by hashlib, but "SHA3-256" is called sha3_256
+    for candidate in (name, name.replace("-", "_"), name.replace("-", "").replace("_", "")):
+        if candidate in hashlib.algorithms_available:
+            return candidate
+    raise ValueError(f"Unsupported checksum algorithm: {algorithm}")
+
+
+def update_file_digest(digest, path: str, length: int = None, chunk_size: int = CHECKSUM_CHUNK_SIZE):
+    """Feeds the content of a file, or only its first `length` bytes, into a hashlib digest
+
+    The file is read into a reused buffer chunk by chunk. hashlib releases the GIL while hashing large chunks,
+    so several files can be hashed in parallel threads.
+
+    :return: The updated digest
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    remaining = length
+    with open(path, "rb", buffering=0) as handle:
+        while remaining is None or remaining > 0:
+            size = handle.readinto(view if remaining is None or remaining >= chunk_size else view[:remaining])
+            if not size:
+                break
+            digest.update(view[:size])
+            if remaining is not None:
+                remaining -= size
+    return digest
+
+
+def calculate_file_checksum(path: str, algorithm: str = None, chunk_size: int = CHECKSUM_CHUNK_SIZE) -> str:
+    """Calculates the hex digest of a file with constant memory usage
+
+    :param path: Path of the file
+    :param algorithm: The checksum algorithm, defaults to SHA-256
+    :param chunk_size: Size of the chunks the file is read in
+    :return: The hex digest of the file content
+    """
+    digest = hashlib.new(get_hashlib_algorithm(algorithm))
+    return update_file_digest(digest, path, chunk_size=chunk_size).hexdigest()
+
+
+def calculate_sample_digest(path: str, size: int) -> str:
+    """Calculates a cheap digest over the first and last block of a file, used to verify checksum cache hits"""
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+    with open(path, "rb") as handle:
+        digest.update(handle.read(SAMPLE_SIZE))
+        if size > SAMPLE_SIZE:
+            handle.seek(max(SAMPLE_SIZE, size - SAMPLE_SIZE))
+            digest.update(handle.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+class CryptshareChecksumCache:
+    """Persistent cache of file checksums, stored in a SQLite database.
+
+    Entries are keyed by device, inode, size, modification time and algorithm of a file, so any change to the file
+    invalidates its entry. Hits are additionally verified with a digest of the first and last block of the file.
+    The least recently used entries are evicted when the cache grows beyond `max_entries`.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, verify: bool = True) -> None:
+        """Initialises the checksum cache
+
+        :param path: Path of the SQLite database file
+        :param max_entries: Maximum number of cached checksums
+        :param verify: Verify hits by hashing the first and last block of the file
+        """
+        logger.debug(f"Opening checksum cache {path}")
+        self.path = path
+        self.max_entries = max_entries
+        self.verify = verify
+        self._lock = threading.Lock()
+        self._batch_depth = 0
+        self._pending = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS checksums ("
+            "device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, algorithm TEXT, "
+            "checksum TEXT, sample TEXT, last_used REAL, "
+            "PRIMARY KEY (device, inode, size, mtime_ns, algorithm))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS checksums_last_used ON checksums (last_used)")
+        self._connection.commit()
+        (self._count,) = self._connection.execute("SELECT COUNT(*) FROM checksums").fetchone()
+
+    def _commit(self) -> None:
+        """Commits the changes, inside a batch only every CACHE_COMMIT_INTERVAL changes"""
+        self._pending += 1
+        if not self._batch_depth or self._pending >= CACHE_COMMIT_INTERVAL:
+            self._connection.commit()
+            self._pending = 0
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Groups the changes made inside the block into few transactions, instead of committing every change"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._pending:
+                    self._connection.commit()
+                    self._pending = 0
+
+    @staticmethod
+    def _key(stat: os.stat_result, algorithm: str) -> tuple:
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, get_hashlib_algorithm(algorithm)
+
+    def get(self, path: str, algorithm: str = None) -> [str, None]:
+        """Returns the cached checksum of an unchanged file, None if the file is not cached"""
+        stat = os.stat(path)
+        key = self._key(stat, algorithm)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT checksum, sample FROM checksums "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                key,
+            ).fetchone()
+        if row is None:
+            return None
+        checksum, sample = row
+        if self.verify and sample != calculate_sample_digest(path, stat.st_size):
+            logger.debug(f"Cached checksum of {path} is outdated")
+            self.delete(key)
+            return None
+        with self._lock:
+            self._connection.execute(
+                "UPDATE checksums SET last_used = ? "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                (time.time(), *key),
+            )
+            self._commit()
+        logger.debug(f"Checksum of {path} found in cache")
+        return checksum
+
+    def set(self, path: str, checksum: str, algorithm: str = None, stat: os.stat_result = None) -> None:
+        """Stores the checksum of a file
+
+        :param stat: Result of os.stat, taken before the file was hashed
+        """
+        stat = stat if stat else os.stat(path)
+        key = self._key(stat, algorithm)
+        sample = calculate_sample_digest(path, stat.st_size)
+        with self._lock:
+            exists = self._connection.execute(
+                "SELECT 1 FROM checksums "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                key,
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, checksum, sample, time.time()),
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+            self._commit()
+
+    def delete(self, key: tuple) -> None:
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM checksums WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?",
+                key,
+            )
+            self._count -= cursor.rowcount
+            self._commit()
+
+    def _evict(self) -> None:
+        """Deletes the least recently used entries exceeding max_entries
+
+        Only called when the tracked number of entries exceeds max_entries. The entries are counted again here,
+        because other processes may have changed the database.
+        """
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM checksums").fetchone()
+        self._count = count
+        if count > self.max_entries:
+            logger.debug(f"Evicting {count - self.max_entries} entries from checksum cache")
+            self._connection.execute(
+                "DELETE FROM checksums WHERE rowid IN (SELECT rowid FROM checksums ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self._count = self.max_entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM checksums")
+            self._connection.commit()
+            self._count = 0
+            self._pending = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM checksums").fetchone()[0]
+
+    def calculate_file_checksum(self, path: str, algorithm: str = None) -> str:
+        """Returns the cached checksum of a file, calculating and caching it if needed"""
+        checksum = self.get(path, algorithm)
+        if checksum is None:
+            stat = os.stat(path)
+            checksum = calculate_file_checksum(path, algorithm)
+            self.set(path, checksum, algorithm, stat=stat)
+        return checksum
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._connection.commit()
+            self._connection.close()
+
+
+def iter_file_checksums(
+    paths: list[str],
+    algorithm: str = None,
+    max_workers: int = None,
+    return_exceptions: bool = False,
+    cache: CryptshareChecksumCache = None,
+):
+    """Calculates the checksums of many files on all CPU cores
+
+    The files are hashed in a process pool, results are yielded as soon as they are ready, in order of completion.
+    Checksums found in the `cache` are yielded first, without hashing the files.
+
+    :param paths: Paths of the files
+    :param algorithm: The checksum algorithm, defaults to SHA-256
+    :param max_workers: Number of worker processes, defaults to the number of CPUs
+    :param return_exceptions: Yield the exception instead of the checksum for files that can't be hashed
+    :param cache: Checksum cache to read from and store the calculated checksums in
+    :return: Iterator of (path, checksum) tuples
+    """
+    with cache.batch() if cache is not None else contextlib.nullcontext():
+        yield from _iter_file_checksums(paths, algorithm, max_workers, return_exceptions, cache)
+
+
+def _iter_file_checksums(
+    paths: list[str], algorithm: str, max_workers: int, return_exceptions: bool, cache: CryptshareChecksumCache
+):
+    stats = {}
+    if cache is not None:
+        missing = []
+        for path in paths:
+            try:
+                stats[path] = os.stat(path)
+                checksum = cache.get(path, algorithm)
+            except OSError as e:
+                if not return_exceptions:
+                    raise
+                yield path, e
+                continue
+            if checksum is None:
+                missing.append(path)
+            else:
+                yield path, checksum
+        paths = missing
+    if not paths:
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(calculate_file_checksum, path, algorithm): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            exception = future.exception()
+            if exception is not None:
+                if not return_exceptions:
+                    raise exception
+                yield path, exception
+                continue
+            if cache is not None:
+                cache.set(path, future.result(), algorithm, stat=stats[path])
+            yield path, future.result()
@@ -3,24 +3,32 @@ import itertools
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from cryptshare.base_client import CryptshareBaseClient
 from cryptshare.download import CryptshareDownload
 from cryptshare.notification_message import CryptshareNotificationMessage
 from cryptshare.sender import CryptshareSender
-from cryptshare.transfer import CryptshareTransfer
-from cryptshare.transfer_policy import CryptshareTransferPolicy
+from cryptshare.transfer import DEFAULT_UPLOAD_WORKERS, CryptshareTransfer
+from cryptshare.transfer_policy import (
+    DEFAULT_POLICY_CHUNK_SIZE,
+    CryptshareTransferPolicy,
+    group_recipients,
+)
 from cryptshare.transfer_security_mode import (
     CryptshareTransferSecurityMode,
     OneTimePaswordSecurityModes,
 )
 from cryptshare.transfer_settings import CryptshareTransferSettings
+from cryptshare.validators import CryptshareValidators
 
 logger = logging.getLogger(__name__)
 
 TARGET_API_VERSION = "1.9"
 # Default API Version to use with Cryptshare REST-API
+DEFAULT_STATUS_WORKERS = 8
+# Number of transfer status requests sent at the same time by CryptshareClient.iter_transfer_status
 
 
 class CryptshareClient(CryptshareBaseClient):
@@ -119,12 +127,51 @@ class CryptshareClient(CryptshareBaseClient):
         )
         return r
 
+    def get_transfer_status(self, tracking_id: str) -> dict:
+        """Returns the status of a transfer of the sender"""
+        if not CryptshareValidators.is_valid_tracking_id_or_blank(tracking_id):
+            raise ValueError("Invalid tracking ID")
+        path = self.api_path("users") + self.sender_email + "/transfers/" + tracking_id
+        logger.debug(f"Getting transfer status GET {path}")
+        return self._request("GET", path, verify=self.ssl_verify, headers=self.header.request_header)
+
+    def iter_transfer_status(self, max_workers: int = DEFAULT_STATUS_WORKERS, transfers: list = None):
+        """Yields the status of all transfers of the sender as soon as it is known
+
+        Transfers listed with their status by get_transfers are yielded without another request. The status of
+        the others is requested concurrently, by at most `max_workers` threads (capped by the connection pool
+        size).
+
+        :param max_workers: Maximum number of status requests sent at the same time
+        :param transfers: The transfers as returned by get_transfers, requested if not given
+        :return: Iterator of {"trackingID": ..., "status": ...} dicts, in order of completion
+        """
+        transfers = transfers if transfers is not None else self.get_transfers()
+        missing = []
+        for list_transfer in transfers:
+            if list_transfer.get("status") is not None:
+                yield {"trackingID": list_transfer["trackingId"], "status": list_transfer["status"]}
+            else:
+                missing.append(list_transfer["trackingId"])
+        if not missing:
+            return
+        logger.debug(f"Requesting the status of {len(missing)} of {len(transfers)} transfers")
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, self.pool_maxsize)))
+        try:
+            futures = {executor.submit(self.get_transfer_status, tracking_id): tracking_id for tracking_id in missing}
+            for future in as_completed(futures):
+                yield {"trackingID": futures[future], "status": future.result()["status"]}
+        finally:
+            # Don't send the remaining requests if the iterator is abandoned
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def transfer_status(
         self,
         transfer_tracking_id: str = None,
         sender_name: str = None,
         sender_phone: str = None,
         sender_email: str = None,
+        max_workers: int = DEFAULT_STATUS_WORKERS,
     ):
         #  Reads existing verifications from the 'store' file if any
         self.read_client_store()
@@ -143,22 +190,20 @@ class CryptshareClient(CryptshareBaseClient):
             self._sender = sender
 
         if transfer_tracking_id is None:
-            all_transfers = self.get_transfers()
             logger.debug("Transfer status for all transfers\n")
-            transfer_status_list = []
-            for list_transfer in all_transfers:
-                tracking_id = list_transfer["trackingId"]
-                transfer = CryptshareTransfer(CryptshareTransferSettings(self._sender), tracking_id=tracking_id)
-                transfer = transfer.get_transfer_status(self)
-                transfer_status_list.append({"trackingID": tracking_id, "status": transfer["status"]})
-            return transfer_status_list
+            return list(self.iter_transfer_status(max_workers=max_workers))
 
         logger.debug(f"Transfer status for transfer {transfer_tracking_id}\n")
-        transfer = CryptshareTransfer(CryptshareTransferSettings(self._sender), tracking_id=transfer_tracking_id)
-        transfer_status = transfer.get_transfer_status(self)
-        return transfer_status
-
-    def get_policy(self, recipients) -> CryptshareTransferPolicy:
+        return self.get_transfer_status(transfer_tracking_id)
+
+    def request_policy(self, recipients: list[str]) -> dict:
+        """Requests the transfer policy for the sender and the recipients, answered from the policy cache if possible"""
+        key = None
+        if self.policy_cache is not None:
+            key = self.policy_cache.key(self._server, self.sender_email, recipients)
+            cached = self.policy_cache.get(key)
+            if cached is not None:
+                return cached
         path = self.api_path("users") + self.sender_email + "/transfer-policy"
         logger.info(f"Getting policy for {self.sender_email} and  {recipients} from {path}")
         r = self._request(
@@ -167,8 +212,34 @@ class CryptshareClient(CryptshareBaseClient):
             verify=self.ssl_verify,
             headers=self.header.extra_header({"Content-Type": "application/json"}),
             json={"recipients": recipients},
+            idempotent=True,
         )
-        return CryptshareTransferPolicy(r)
+        if key is not None:
+            self.policy_cache.set(key, r)
+        return r
+
+    def get_policy(
+        self, recipients, resolve: str = None, chunk_size: int = DEFAULT_POLICY_CHUNK_SIZE
+    ) -> CryptshareTransferPolicy:
+        """Returns the transfer policy for the sender and the recipients
+
+        Large recipient lists can be resolved in several requests whose policies are merged: POLICY_RESOLVE_CHUNKS
+        requests the policy for chunks of `chunk_size` recipients, POLICY_RESOLVE_DOMAINS for one recipient per
+        domain, which is only correct if the policy rules of the server do not distinguish addresses of a domain.
+
+        :param recipients: The recipient addresses
+        :param resolve: None to request the policy for all recipients at once, POLICY_RESOLVE_CHUNKS or
+            POLICY_RESOLVE_DOMAINS
+        :param chunk_size: Number of recipients per request for POLICY_RESOLVE_CHUNKS
+        """
+        groups = group_recipients(recipients, resolve, chunk_size)
+        if len(groups) == 1:
+            policies = [self.request_policy(groups[0][0])]
+        else:
+            logger.debug(f"Resolving the policy for {len(recipients)} recipients in {len(groups)} requests")
+            with ThreadPoolExecutor(max_workers=max(1, min(len(groups), self.pool_maxsize))) as executor:
+                policies = list(executor.map(self.request_policy, [query for query, _ in groups]))
+        return CryptshareTransferPolicy.merge([CryptshareTransferPolicy(policy) for policy in policies], groups)
 
     def send_transfer(
         self,
@@ -183,9 +254,15 @@ class CryptshareClient(CryptshareBaseClient):
         sender_email: str = None,
         sender_name: str = "",
         sender_phone: str = "",
+        max_upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+        precompute_checksums: bool = False,
         **kwargs,  # Additional Transfer settings, CryptshareTransferSettings documentation
     ) -> [CryptshareTransfer, None]:
-        """Send a transfer using the Cryptshare server."""
+        """Send a transfer using the Cryptshare server.
+
+        :param max_upload_workers: Maximum number of files uploaded in parallel
+        :param precompute_checksums: Calculate the file checksums in a process pool on all CPU cores
+        """
 
         if not recipients:
             recipients = []
@@ -213,11 +290,11 @@ class CryptshareClient(CryptshareBaseClient):
             password=transfer_password, mode=OneTimePaswordSecurityModes.MANUAL
         )
         if transfer_password == "" or transfer_password is None:
-            transfer_password = self.get_password()
+            transfer_password = self.generate_password()
             print(f"Generated Password to receive Files: {transfer_password}")
             transfer_security_mode = CryptshareTransferSecurityMode(password=transfer_password)
         else:
-            passwort_validated_response = self.validate_password(transfer_password)
+            passwort_validated_response = self.check_password(transfer_password)
             valid_password = passwort_validated_response.get("valid")
             if not valid_password:
                 print("Passwort is not valid.")
@@ -256,8 +333,7 @@ class CryptshareClient(CryptshareBaseClient):
         )
         transfer.set_generated_password(transfer_password)
         transfer.start_transfer_session()
-        for file in files:
-            transfer.upload_file(file)
+        transfer.upload_files(files, max_workers=max_upload_workers, precompute_checksums=precompute_checksums)
 
         pre_transfer_info = transfer.get_transfer_settings(self)
         logger.debug(f"Pre-Transfer info: \n{pre_transfer_info}")
@@ -1,20 +1,194 @@
+import hashlib
+import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
 
 from cryptshare.api_requests import CryptshareApiRequests
 from cryptshare.base_client import CryptshareBaseClient
+from cryptshare.checksum import (
+    calculate_file_checksum,
+    get_hashlib_algorithm,
+    update_file_digest,
+)
+from cryptshare.zip_stream import (
+    CryptshareZipError,
+    CryptshareZipStream,
+    safe_entry_path,
+)
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Size of the chunks downloaded files are read from the network and written to disk in
+DOWNLOAD_SEGMENTS = 4
+# Default number of byte ranges a large file is downloaded in by a segmented download
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+# Minimum size of a segment, smaller files are downloaded in a single stream
+PART_SUFFIX = ".part"
+# Suffix of files being downloaded, they are renamed once they are complete
+PART_STATE_SUFFIX = ".part.json"
+# Suffix of the sidecar files recording the progress of a download
+PART_STATE_INTERVAL = 16 * 1024 * 1024
+# Number of bytes after which the progress of a download is recorded in its sidecar file
+MANIFEST_FILE_NAME = ".cryptshare-manifest.json"
+# Name of the file recording the files synchronised into a directory
+
+
+def parse_content_range(value: str) -> [tuple[int, int, int], None]:
+    """Parses a Content-Range header like "bytes 0-99/1000"
+
+    :return: Tuple of first byte, last byte and total size (None if unknown), None if the value can't be parsed
+    """
+    if not value:
+        return None
+    try:
+        unit, _, content_range = value.strip().partition(" ")
+        byte_range, _, total = content_range.partition("/")
+        start, _, end = byte_range.partition("-")
+        if unit != "bytes":
+            return None
+        return int(start), int(end), None if total == "*" else int(total)
+    except ValueError:
+        logger.debug(f"Invalid Content-Range header: {value}")
+        return None
+
+
+def read_part_offset(part_path: str, size: int = None) -> int:
+    """Returns the offset an interrupted download can be continued from, 0 if it has to start from scratch
+
+    :param part_path: Path of the .part file
+    :param size: Expected size of the file, a download recorded for a different size is not continued
+    """
+    try:
+        with open(part_path[: -len(PART_SUFFIX)] + PART_STATE_SUFFIX, "r") as handle:
+            state = json.load(handle)
+        offset = int(state["offset"])
+        if state.get("size") != size or (size is not None and offset > size):
+            return 0
+        return min(offset, os.path.getsize(part_path))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return 0
+
+
+def write_part_state(part_path: str, offset: int, size: int = None) -> None:
+    """Records the progress of a download in the sidecar file of its .part file"""
+    state_path = part_path[: -len(PART_SUFFIX)] + PART_STATE_SUFFIX
+    with open(state_path + ".tmp", "w") as handle:
+        json.dump({"offset": offset, "size": size}, handle)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def remove_part_state(part_path: str) -> None:
+    try:
+        os.remove(part_path[: -len(PART_SUFFIX)] + PART_STATE_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def read_manifest(directory: str) -> dict:
+    """Returns the manifest of the files synchronised into a directory, an empty manifest if there is none"""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE_NAME), "r") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+
+def write_manifest(directory: str, manifest: dict) -> None:
+    path = os.path.join(directory, MANIFEST_FILE_NAME)
+    with open(path + ".tmp", "w") as handle:
+        json.dump(manifest, handle, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def safe_file_path(directory: str, name: str) -> str:
+    """Returns the path a file of a Transfer is written to, rejecting names that would escape the directory
+
+    File names are chosen by the sender of a Transfer, so they are checked like the entry names of a ZIP archive.
+
+    :raises ValueError: If the name is absolute, contains .. or does not name a file inside the directory
+    """
+    try:
+        path = safe_entry_path(directory, name)
+    except CryptshareZipError:
+        path = None
+    base = os.path.realpath(directory)
+    if path is None or name.endswith(("/", "\\")) or path in (base, os.path.join(base, MANIFEST_FILE_NAME)):
+        raise ValueError(f"Unsafe file name: {name!r}")
+    return path
+
+
+class CryptshareChecksumError(Exception):
+    """Raised when the checksum of a downloaded file does not match the checksum announced by the sender"""
+
+    def __init__(self, file_name: str, expected: str, actual: str) -> None:
+        self.file_name = file_name
+        self.expected = expected
+        self.actual = actual
+        super().__init__(f"Checksum mismatch for {file_name}: expected {expected}, got {actual}")
+
+
+class CryptshareDownloadResult:
+    """Outcome of the download of a single file"""
+
+    def __init__(
+        self,
+        file_name: str,
+        path: str,
+        size: int = 0,
+        duration: float = 0.0,
+        error: Exception = None,
+        checksum: str = None,
+        verified: bool = False,
+        skipped: bool = False,
+    ) -> None:
+        """
+        :param file_name: Name of the file in the transfer
+        :param path: Local path the file was written to
+        :param size: Number of bytes written
+        :param duration: Duration of the download in seconds
+        :param error: The exception, if the download failed
+        :param checksum: Hex digest of the downloaded content, if it was calculated
+        :param verified: Whether the checksum matched the checksum announced by the sender
+        :param skipped: Whether the download was skipped, because the file was up to date
+        """
+        self.file_name = file_name
+        self.path = path
+        self.size = size
+        self.duration = duration
+        self.error = error
+        self.checksum = checksum
+        self.verified = verified
+        self.skipped = skipped
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = "OK" if self.success else f"FAILED ({self.error})"
+        if self.skipped:
+            status += ", up to date"
+        if self.verified:
+            status += ", checksum verified"
+        return f"<CryptshareDownloadResult {self.file_name}: {status}, {self.size} bytes in {self.duration:.2f}s>"
+
 
 class CryptshareDownload(CryptshareApiRequests):
     _cryptshare_client: CryptshareBaseClient = None
 
-    def __init__(self, cryptshare_client: CryptshareBaseClient, transfer_id, password):
+    def __init__(
+        self, cryptshare_client: CryptshareBaseClient, transfer_id, password, chunk_size: int = DOWNLOAD_CHUNK_SIZE
+    ):
         logger.debug(f"Initialising Cryptshare Download for transfer: {transfer_id}")
         self._cryptshare_client = cryptshare_client
         self.transfer_id = transfer_id
         self.password = password
+        self.chunk_size = chunk_size
 
     @property
     def server(self):
@@ -58,34 +232,588 @@ class CryptshareDownload(CryptshareApiRequests):
         )
         return r
 
-    def download_file(self, url: str, filename: str, directory: str, size: int = None) -> None:
-        """Download a file from an URL to the given directory"""
-        response = self._request(
+    def check_stream_response(self, response) -> None:
+        """Raises an HTTPError if a streamed response does not deliver content"""
+        if response.status_code in (200, 206):
+            return
+        self._handle_response(response)
+        raise requests.HTTPError(f"{response.status_code} Error")
+
+    def _write_stream(self, response, handle, digest=None) -> int:
+        """Writes the content of a streamed response to an open file, returns the number of bytes written"""
+        written = 0
+        for data in response.iter_content(chunk_size=self.chunk_size):
+            written += handle.write(data)
+            if digest is not None:
+                digest.update(data)
+        return written
+
+    @staticmethod
+    def _verify_checksum(filename: str, digest, checksum: str = None, part_path: str = None) -> [str, None]:
+        """Compares the digest of a downloaded file with the announced checksum, removing the .part file on mismatch
+
+        :return: The hex digest, None if no digest was calculated
+        """
+        if digest is None:
+            return None
+        actual = digest.hexdigest()
+        if checksum and actual.lower() != checksum.lower():
+            logger.error(f"Checksum mismatch for {filename}")
+            if part_path is not None:
+                os.remove(part_path)
+                remove_part_state(part_path)
+            raise CryptshareChecksumError(filename, checksum, actual)
+        return actual
+
+    def _download_part(
+        self, url: str, part_path: str, offset: int, size: int = None, callback=None, algorithm: str = None
+    ) -> tuple:
+        """Downloads a file into its .part file, continuing at offset if the server supports Range requests
+
+        With an `algorithm` the content is hashed while it is written. When a download is continued, the part
+        already on disk is hashed first.
+
+        :return: Tuple of the size of the .part file and the digest of its content (None without algorithm)
+        """
+        headers = self._cryptshare_client.header.request_header
+        if offset:
+            headers = headers | {"Range": f"bytes={offset}-"}
+        response = self._request("GET", url, stream=True, verify=self._cryptshare_client.ssl_verify, headers=headers)
+        with response:
+            self.check_stream_response(response)
+            if offset:
+                content_range = parse_content_range(response.headers.get("Content-Range"))
+                if response.status_code == 206 and content_range is not None and content_range[0] == offset:
+                    logger.info(f"Resuming download of {part_path} at {offset} bytes")
+                else:
+                    logger.info(f"Server can't resume the download of {part_path}, starting from the beginning")
+                    offset = 0
+            digest = None
+            if algorithm is not None:
+                digest = hashlib.new(algorithm)
+                if offset:
+                    update_file_digest(digest, part_path, offset)
+            recorded = offset
+            try:
+                with open(part_path, "r+b" if offset else "wb") as handle:
+                    handle.seek(offset)
+                    handle.truncate()
+                    for data in response.iter_content(chunk_size=self.chunk_size):
+                        offset += handle.write(data)
+                        if digest is not None:
+                            digest.update(data)
+                        if size is not None and offset > size:
+                            raise requests.HTTPError(f"Received more than the expected {size} bytes for {part_path}")
+                        if offset - recorded >= PART_STATE_INTERVAL:
+                            handle.flush()
+                            write_part_state(part_path, offset, size)
+                            recorded = offset
+                        if callback is not None:
+                            callback(offset)
+            finally:
+                write_part_state(part_path, offset, size)
+        return offset, digest
+
+    def download_file(
+        self,
+        url: str,
+        filename: str,
+        directory: str,
+        size: int = None,
+        callback=None,
+        checksum: str = None,
+        checksum_algorithm: str = None,
+    ) -> CryptshareDownloadResult:
+        """Download a file from an URL to the given directory
+
+        The content is written to a .part file next to the target, a sidecar file records how much of it is on
+        disk. An interrupted download is continued with a Range request, both when the connection breaks (as
+        often as the retry policy allows) and when the download is started again later. Once the size and checksum
+        are verified the .part file is renamed to the target atomically, so the target never contains a truncated
+        or corrupted file.
+
+        The checksum is calculated from the chunks as they are written, so verifying it needs no second pass over
+        the file. On a mismatch the .part file is removed and a CryptshareChecksumError is raised.
+
+        :param size: Expected size of the file in bytes
+        :param callback: Called with the number of bytes downloaded so far after every chunk
+        :param checksum: Expected hex digest of the file content
+        :param checksum_algorithm: Algorithm of the checksum, defaults to SHA-256. Without a checksum, the digest
+            is only calculated if an algorithm is given
+        :return: The result of the download
+        """
+        start = time.monotonic()
+        full_path = os.path.join(directory, filename)
+        part_path = full_path + PART_SUFFIX
+        os.makedirs(directory, exist_ok=True)
+        size = int(size) if size is not None else None
+        offset = read_part_offset(part_path, size)
+        algorithm = get_hashlib_algorithm(checksum_algorithm) if checksum or checksum_algorithm else None
+        digest = None
+        attempt = 0
+        waited = 0.0
+        # Empty files are complete without a request, their .part file has to exist for the rename
+        open(part_path, "ab").close()
+        while size is None or offset < size:
+            try:
+                offset, digest = self._download_part(url, part_path, offset, size, callback, algorithm)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                offset = read_part_offset(part_path, size)
+                delay = self.retry_policy.get_delay(attempt, waited)
+                if delay is None:
+                    raise
+                logger.warning(f"Download of {filename} interrupted at {offset} bytes: {e}. Resuming in {delay:.2f}s")
+                time.sleep(delay)
+                waited += delay
+                attempt += 1
+        if size is not None and offset != size:
+            raise requests.HTTPError(f"Incomplete download of {filename}: received {offset} of {size} bytes")
+        if algorithm is not None and digest is None:
+            # The .part file was complete already, only the rename was missing
+            digest = update_file_digest(hashlib.new(algorithm), part_path)
+        actual = self._verify_checksum(filename, digest, checksum, part_path)
+        os.replace(part_path, full_path)
+        remove_part_state(part_path)
+        return CryptshareDownloadResult(
+            filename, full_path, offset, time.monotonic() - start, checksum=actual, verified=bool(checksum)
+        )
+
+    def _request_range(self, url: str, start: int, end: int):
+        return self._request(
             "GET",
             url,
             stream=True,
             verify=self._cryptshare_client.ssl_verify,
-            headers=self._cryptshare_client.header.request_header,
+            headers=self._cryptshare_client.header.request_header | {"Range": f"bytes={start}-{end}"},
         )
+
+    def _download_segment(self, url: str, full_path: str, start: int, end: int, response=None) -> int:
+        """Downloads the byte range start-end of a file and writes it at its offset into the preallocated file"""
+        if response is None:
+            response = self._request_range(url, start, end)
+        with response:
+            self.check_stream_response(response)
+            content_range = parse_content_range(response.headers.get("Content-Range"))
+            if response.status_code != 206 or content_range is None or content_range[:2] != (start, end):
+                raise requests.HTTPError(f"Server did not return the requested range {start}-{end}")
+            with open(full_path, "r+b") as handle:
+                handle.seek(start)
+                written = self._write_stream(response, handle)
+        if written != end - start + 1:
+            raise requests.HTTPError(f"Incomplete range {start}-{end}: received {written} bytes")
+        return written
+
+    def download_file_segmented(
+        self,
+        url: str,
+        filename: str,
+        directory: str,
+        size: int,
+        segments: int = DOWNLOAD_SEGMENTS,
+        checksum: str = None,
+        checksum_algorithm: str = None,
+    ) -> CryptshareDownloadResult:
+        """Download a large file in several byte ranges over parallel connections
+
+        The request for the first range doubles as probe for Range support: if the server answers with the whole
+        file instead, it is downloaded in a single stream. Otherwise a .part file is preallocated and every range
+        is written at its offset as soon as it arrives. The number of segments is capped by the connection pool
+        size of the client and by SEGMENT_MIN_SIZE.
+
+        As the ranges arrive out of order, the checksum is calculated from the complete .part file.
+
+        :param size: Size of the file in bytes
+        :param segments: Maximum number of ranges downloaded at the same time
+        :param checksum: Expected hex digest of the file content, see download_file
+        :param checksum_algorithm: Algorithm of the checksum, defaults to SHA-256
+        :return: The result of the download
+        """
+        start = time.monotonic()
+        size = int(size)
+        segments = min(segments, self._cryptshare_client.pool_maxsize, size // SEGMENT_MIN_SIZE)
+        if segments < 2:
+            return self.download_file(
+                url, filename, directory, size=size, checksum=checksum, checksum_algorithm=checksum_algorithm
+            )
+        algorithm = get_hashlib_algorithm(checksum_algorithm) if checksum or checksum_algorithm else None
+
+        bounds = [(i * size // segments, (i + 1) * size // segments - 1) for i in range(segments)]
         full_path = os.path.join(directory, filename)
+        part_path = full_path + PART_SUFFIX
         os.makedirs(directory, exist_ok=True)
-        with open(full_path, "wb") as handle:
-            for data in response.iter_content():
-                handle.write(data)
+        response = self._request_range(url, *bounds[0])
+        if response.status_code != 206:
+            with response:
+                self.check_stream_response(response)
+                logger.info(f"Server does not support range requests, downloading {filename} in a single stream")
+                digest = hashlib.new(algorithm) if algorithm is not None else None
+                with open(part_path, "wb") as handle:
+                    written = self._write_stream(response, handle, digest)
+            if written != size:
+                raise requests.HTTPError(f"Incomplete download of {filename}: received {written} of {size} bytes")
+        else:
+            written = self._download_segments(url, part_path, size, bounds, response)
+            digest = update_file_digest(hashlib.new(algorithm), part_path) if algorithm is not None else None
+        actual = self._verify_checksum(filename, digest, checksum, part_path)
+        os.replace(part_path, full_path)
+        remove_part_state(part_path)
+        return CryptshareDownloadResult(
+            filename, full_path, written, time.monotonic() - start, checksum=actual, verified=bool(checksum)
+        )
+
+    def _download_segments(self, url: str, part_path: str, size: int, bounds: list, response) -> int:
+        """Downloads the byte ranges of a file in parallel into its preallocated .part file"""
+        segments = len(bounds)
+        logger.debug(f"Downloading {part_path} ({size} bytes) in {segments} segments")
+        with open(part_path, "wb") as handle:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(handle.fileno(), 0, size)
+            else:
+                handle.truncate(size)
+        try:
+            with ThreadPoolExecutor(max_workers=segments - 1) as executor:
+                futures = [
+                    executor.submit(self._download_segment, url, part_path, start, end) for start, end in bounds[1:]
+                ]
+                written = self._download_segment(url, part_path, *bounds[0], response=response)
+                written += sum(future.result() for future in futures)
+        except BaseException:
+            logger.debug(f"Removing incomplete file {part_path}")
+            os.remove(part_path)
+            raise
+        return written
+
+    def download_transfer_file(self, file, directory: str, segments: int = 1) -> CryptshareDownloadResult:
+        """Download a file of a Transfer to the given directory, verifying the checksum listed in the files info
+
+        :param segments: Download large files in this many parallel byte ranges, see download_file_segmented
+        """
+        url = self.server + file["href"]
+        checksum = file.get("checksum")
+        checksum_algorithm = file.get("checksumAlgorithm")
+        directory, filename = os.path.split(safe_file_path(directory, file["fileName"]))
+        if segments > 1:
+            return self.download_file_segmented(
+                url,
+                filename,
+                directory,
+                file["size"],
+                segments=segments,
+                checksum=checksum,
+                checksum_algorithm=checksum_algorithm,
+            )
+        return self.download_file(
+            url,
+            filename,
+            directory,
+            size=file["size"],
+            checksum=checksum,
+            checksum_algorithm=checksum_algorithm,
+        )
+
+    def download_all_files(
+        self, directory: str, max_workers: int = 1, segments: int = 1
+    ) -> list[CryptshareDownloadResult]:
+        """Download all files of a Transfer to the given directory
+
+        With `max_workers` > 1 the files are downloaded concurrently. The number of parallel downloads times the
+        number of segments is capped by the connection pool size of the client, so every download reuses a pooled
+        connection.
+
+        :param directory: The directory to write the files to
+        :param max_workers: Maximum number of files downloaded at the same time
+        :param segments: Download large files in this many parallel byte ranges, see download_file_segmented
+        :return: A result per file, in order of completion
+        """
+        return self._download_files(
+            lambda file: self.download_transfer_file(file, directory, segments),
+            max_workers,
+            directory=directory,
+            segments=segments,
+        )
+
+    def _download_files(
+        self, download, max_workers: int = 1, files_info: list = None, directory: str = None, segments: int = 1
+    ) -> list[CryptshareDownloadResult]:
+        """Runs `download` for every file of the Transfer in a thread pool, collecting a result per file
+
+        :param segments: Number of connections each download may use, the workers share the connection pool
+        """
+        files_info = files_info if files_info is not None else self.download_files_info()
+        max_workers = max(1, min(max_workers, self._cryptshare_client.pool_maxsize // max(1, segments)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download, file): file for file in files_info}
+            results = []
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Failed to download file {file['fileName']}: {e}")
+                    path = os.path.join(directory, file["fileName"]) if directory else None
+                    results.append(CryptshareDownloadResult(file["fileName"], path, error=e))
+        return results
+
+    @staticmethod
+    def _file_digest(file):
+        """Returns a new digest for the checksum listed in the file info, None if it lists no checksum"""
+        if not file.get("checksum"):
+            return None
+        return hashlib.new(get_hashlib_algorithm(file.get("checksumAlgorithm")))
 
-    def download_transfer_file(self, file, directory: str) -> None:
-        """Download a file of a Transfer to the given directory"""
-        self.download_file(self.server + file["href"], file["fileName"], directory, size=file["size"])
+    def _stream_file(self, file, digest=None):
+        """Streams the content of a file of a Transfer, updating the digest and verifying the size"""
+        response = self._request(
+            "GET",
+            self.server + file["href"],
+            stream=True,
+            verify=self._cryptshare_client.ssl_verify,
+            headers=self._cryptshare_client.header.request_header,
+        )
+        size = 0
+        with response:
+            self.check_stream_response(response)
+            for data in response.iter_content(chunk_size=self.chunk_size):
+                size += len(data)
+                if digest is not None:
+                    digest.update(data)
+                yield data
+        if file.get("size") is not None and size != int(file["size"]):
+            raise requests.HTTPError(
+                f"Incomplete download of {file['fileName']}: received {size} of {file['size']} bytes"
+            )
+
+    def _is_up_to_date(self, file, path: str, entry: dict = None) -> bool:
+        """Checks whether a local file matches a file of the Transfer by size and checksum
 
-    def download_all_files(self, directory: str) -> None:
+        The checksum recorded in the manifest entry is trusted as long as size and modification time of the file
+        did not change. Otherwise the checksum is calculated, through the checksum cache of the client if it has
+        one. Without a checksum in the files info, name and size decide.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != int(file["size"]):
+            return False
+        checksum = file.get("checksum")
+        if not checksum:
+            return True
+        algorithm = file.get("checksumAlgorithm")
+        entry = entry if entry else {}
+        recorded = (entry.get("size"), entry.get("mtime_ns"), entry.get("checksumAlgorithm"))
+        if entry.get("checksum") and recorded == (stat.st_size, stat.st_mtime_ns, algorithm):
+            return entry["checksum"].lower() == checksum.lower()
+        checksum_cache = self._cryptshare_client.checksum_cache
+        if checksum_cache is not None:
+            local_checksum = checksum_cache.calculate_file_checksum(path, algorithm)
+        else:
+            local_checksum = calculate_file_checksum(path, algorithm)
+        return local_checksum.lower() == checksum.lower()
+
+    def sync(
+        self, directory: str, max_workers: int = 1, segments: int = 1, delete: bool = False
+    ) -> list[CryptshareDownloadResult]:
+        """Synchronise the files of the Transfer into a directory, downloading only missing and changed files
+
+        The local files are compared with the files info of the Transfer by name, size and checksum. The state of
+        the synchronised files is recorded in a manifest in the directory, so a repeated sync of an unchanged
+        Transfer needs a single API call and no hashing. Files whose names would escape the directory are neither
+        downloaded nor deleted, they are reported as failed.
+
+        :param directory: The directory to synchronise the files into
+        :param max_workers: Maximum number of files downloaded at the same time
+        :param segments: Download large files in this many parallel byte ranges, see download_file_segmented
+        :param delete: Delete files recorded in the manifest, which are no longer part of the Transfer
+        :return: A result per file, up to date files are reported as skipped
+        """
         files_info = self.download_files_info()
+        manifest = read_manifest(directory)
+        entries = manifest.get("files", {})
+        results = []
+        missing = []
         for file in files_info:
-            self.download_transfer_file(file, directory)
+            try:
+                path = safe_file_path(directory, file["fileName"])
+            except ValueError as e:
+                logger.error(f"Not downloading {file['fileName']!r}: {e}")
+                results.append(CryptshareDownloadResult(file["fileName"], None, error=e))
+                continue
+            if self._is_up_to_date(file, path, entries.get(file["fileName"])):
+                logger.debug(f"{file['fileName']} is up to date")
+                results.append(
+                    CryptshareDownloadResult(
+                        file["fileName"], path, int(file["size"]), checksum=file.get("checksum"), skipped=True
+                    )
+                )
+            else:
+                missing.append(file)
+        logger.info(f"Synchronising {len(missing)} of {len(files_info)} files into {directory}")
+        if missing:
+            results += self._download_files(
+                lambda file: self.download_transfer_file(file, directory, segments),
+                max_workers,
+                missing,
+                directory,
+                segments,
+            )
+
+        files = {file["fileName"]: file for file in files_info}
+        if delete:
+            for name in set(entries) - set(files):
+                try:
+                    path = safe_file_path(directory, name)
+                except ValueError as e:
+                    logger.warning(f"Not deleting {name!r} recorded in the manifest: {e}")
+                    continue
+                logger.info(f"Deleting {name}, it is no longer part of the Transfer")
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        for result in results:
+            if not result.success:
+                entries.pop(result.file_name, None)
+                continue
+            stat = os.stat(result.path)
+            entries[result.file_name] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "checksum": result.checksum if result.checksum else files[result.file_name].get("checksum"),
+                "checksumAlgorithm": files[result.file_name].get("checksumAlgorithm"),
+            }
+        manifest["transferId"] = self.transfer_id
+        manifest["files"] = {name: entry for name, entry in entries.items() if name in files or not delete}
+        os.makedirs(directory, exist_ok=True)
+        write_manifest(directory, manifest)
+        return results
+
+    def iter_file_content(self, file):
+        """Streams the content of a file of a Transfer, without writing it anywhere
+
+        The request is sent when the first chunk is requested and the response is only read as fast as the chunks
+        are consumed, so a slow consumer throttles the download instead of filling memory. The size and the
+        checksum listed in the files info are verified after the last chunk, a mismatch raises an exception.
+
+        :param file: The file info, as returned by download_files_info
+        :return: Iterator of chunks of up to chunk_size bytes
+        """
+        digest = self._file_digest(file)
+        yield from self._stream_file(file, digest)
+        self._verify_checksum(file["fileName"], digest, file.get("checksum"))
+
+    def iter_files(self, files_info: list = None):
+        """Streams all files of a Transfer one after the other
+
+        Each chunk iterator has to be consumed before the next file is requested; the rest of a file that is not
+        read completely is skipped.
+
+        :param files_info: The files to stream, defaults to all files of the Transfer
+        :return: Iterator of (file info, chunk iterator) tuples, see iter_file_content
+        """
+        files_info = files_info if files_info is not None else self.download_files_info()
+        for file in files_info:
+            chunks = self.iter_file_content(file)
+            yield file, chunks
+            chunks.close()
+
+    def download_to_sink(self, file, sink) -> CryptshareDownloadResult:
+        """Download a file of a Transfer into a file-like object or a callback
+
+        The sink is neither closed nor rewound. As the next chunk is only received after the sink accepted the
+        previous one, a slow sink applies backpressure to the download.
+
+        :param file: The file info, as returned by download_files_info
+        :param sink: Object with a write method (like an open file or an object store writer) or a callable, both
+            called with every chunk
+        :return: The result of the download, with the verified checksum if the files info lists one
+        """
+        start = time.monotonic()
+        write = sink.write if hasattr(sink, "write") else sink
+        digest = self._file_digest(file)
+        size = 0
+        for data in self._stream_file(file, digest):
+            write(data)
+            size += len(data)
+        actual = self._verify_checksum(file["fileName"], digest, file.get("checksum"))
+        return CryptshareDownloadResult(
+            file["fileName"], None, size, time.monotonic() - start, checksum=actual, verified=actual is not None
+        )
+
+    def download_all_to_sinks(self, sink_factory, max_workers: int = 1) -> list[CryptshareDownloadResult]:
+        """Download all files of a Transfer into sinks created per file, see download_to_sink
+
+        After a successful download the sink is closed, if it has a close method. After a failed download its
+        abort method is called instead, if it has one, so object store writers can discard incomplete objects.
+
+        :param sink_factory: Called with the file info of every file, returns the sink for that file
+        :param max_workers: Maximum number of files downloaded at the same time
+        :return: A result per file, in order of completion
+        """
+
+        def download(file) -> CryptshareDownloadResult:
+            sink = sink_factory(file)
+            try:
+                result = self.download_to_sink(file, sink)
+            except BaseException:
+                if hasattr(sink, "abort"):
+                    sink.abort()
+                elif hasattr(sink, "close"):
+                    sink.close()
+                raise
+            if hasattr(sink, "close"):
+                sink.close()
+            return result
+
+        return self._download_files(download, max_workers)
+
+    def extract_zip_file(self, directory: str):
+        """Download the Transfer as ZIP archive and extract it into the given directory while it is received
+
+        The archive is never stored: its entries are decompressed from the response stream and written straight
+        to their files, so only one chunk of it is held in memory. Entry names that would escape the directory are
+        rejected with a CryptshareZipError. Each file is written to a .part file first and renamed once its CRC-32
+        is verified.
+
+        :return: Iterator of a CryptshareDownloadResult per extracted file, as soon as it is complete
+        """
+        response = self._request(
+            "GET",
+            self.download_zip_info(),
+            stream=True,
+            verify=self._cryptshare_client.ssl_verify,
+            headers=self._cryptshare_client.header.request_header,
+        )
+        with response:
+            self.check_stream_response(response)
+            os.makedirs(directory, exist_ok=True)
+            for name, chunks in CryptshareZipStream(response.iter_content(chunk_size=self.chunk_size), self.chunk_size):
+                path = safe_entry_path(directory, name)
+                if name.endswith("/"):
+                    os.makedirs(path, exist_ok=True)
+                    continue
+                start = time.monotonic()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                part_path = path + PART_SUFFIX
+                written = 0
+                try:
+                    with open(part_path, "wb") as handle:
+                        for data in chunks:
+                            written += handle.write(data)
+                except BaseException:
+                    logger.debug(f"Removing incomplete file {part_path}")
+                    os.remove(part_path)
+                    raise
+                os.replace(part_path, path)
+                yield CryptshareDownloadResult(name, path, written, time.monotonic() - start)
+
+    def download_zip_file(self, directory) -> CryptshareDownloadResult:
+        """Download the Transfer as ZIP archive to <transfer_id>.zip in the given directory
 
-    def download_zip_file(self, directory):
-        url = self.download_zip_info()
-        print(f"url: {self.download_zip_info()}")
-        self.download_file(url, f"{self.transfer_id}.zip", directory)
+        Use extract_zip_file to extract the archive while it is received instead of storing it.
+        """
+        return self.download_file(self.download_zip_info(), f"{self.transfer_id}.zip", directory)
 
-    def download_eml_file(self, directory):
-        self.download_file(self.download_eml_info(), f"{self.transfer_id}.eml", directory)
+    def download_eml_file(self, directory) -> CryptshareDownloadResult:
+        return self.download_file(self.download_eml_info(), f"{self.transfer_id}.eml", directory)
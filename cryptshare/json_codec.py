@@ -0,0 +1,44 @@
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class CryptshareJsonCodec:
+    """Encodes request bodies and decodes response bodies using the json module of the standard library"""
+
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+class CryptshareOrjsonCodec(CryptshareJsonCodec):
+    """Encodes and decodes JSON using orjson, which works on bytes directly and is considerably faster"""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes):
+        return orjson.loads(data)
+
+
+def get_default_json_codec() -> CryptshareJsonCodec:
+    """Returns the fastest available JSON codec"""
+    if orjson is not None:
+        return CryptshareOrjsonCodec()
+    return CryptshareJsonCodec()
@@ -0,0 +1,156 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METADATA_TTL = 3600.0
+# Seconds a metadata response is cached, if its endpoint has no TTL of its own
+DEFAULT_METADATA_TTLS = {
+    "password_rules": 3600.0,
+    "language_packs": 24 * 3600.0,
+    "terms_of_use": 24 * 3600.0,
+    "imprint": 24 * 3600.0,
+}
+# Seconds the responses of the metadata endpoints are cached, a TTL of 0 disables caching of an endpoint
+
+
+class CryptshareMetadataCache:
+    """TTL cache for the responses of the slow-changing metadata endpoints of a Cryptshare server.
+
+    Caches obtained with `for_server` are shared by all clients of a process. With a `path` the entries are also
+    persisted to a JSON file, so a fresh process starts with the metadata fetched by its predecessors. Expiry uses
+    wall clock time, which is comparable between processes.
+    """
+
+    _caches: dict = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, ttls: dict = None, path: str = None) -> None:
+        """Initialises the metadata cache
+
+        :param ttls: Seconds the responses are cached per endpoint, merged into DEFAULT_METADATA_TTLS
+        :param path: Path of a JSON file to persist the entries in
+        """
+        self.ttls = DEFAULT_METADATA_TTLS | (ttls if ttls else {})
+        self.path = None
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        if path:
+            self.attach(path)
+
+    @classmethod
+    def for_server(cls, server_hash: str, path: str = None, **kwargs) -> "CryptshareMetadataCache":
+        """Returns the metadata cache shared by all clients of this process for the given server
+
+        :param path: Path to persist the entries in, attached to an existing cache that is not persisted yet
+        """
+        with cls._caches_lock:
+            if server_hash not in cls._caches:
+                logger.debug(f"Creating metadata cache for server {server_hash}")
+                cls._caches[server_hash] = cls(path=path, **kwargs)
+            elif path and cls._caches[server_hash].path is None:
+                cls._caches[server_hash].attach(path)
+            return cls._caches[server_hash]
+
+    @staticmethod
+    def entry_name(endpoint: str, key: str = "") -> str:
+        return f"{endpoint}/{key}" if key else endpoint
+
+    def attach(self, path: str) -> None:
+        """Persists the entries in the given file, loading the entries stored there"""
+        self.path = path
+        self.load()
+
+    def load(self) -> None:
+        """Reads the persisted entries, keeping the fresher entry of both if an entry is already cached"""
+        try:
+            with open(self.path, "r") as handle:
+                entries = json.load(handle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read metadata cache from {self.path}: {e}")
+            return
+        with self._lock:
+            for name, (expires, value) in entries.items():
+                if name not in self._entries or self._entries[name][0] < expires:
+                    self._entries[name] = (expires, value)
+        logger.debug(f"Read {len(entries)} entries from metadata cache {self.path}")
+
+    def save(self) -> None:
+        """Writes the unexpired entries to the persisted file, replacing it atomically"""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = {name: entry for name, entry in self._entries.items() if entry[0] > now}
+        temporary_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary_path, "w") as handle:
+                json.dump(entries, handle)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write metadata cache to {self.path}: {e}")
+
+    def get_ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, DEFAULT_METADATA_TTL)
+
+    def get(self, endpoint: str, key: str = ""):
+        """Returns a copy of the cached response of an endpoint, None if it is not cached or expired"""
+        name = self.entry_name(endpoint, key)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.time():
+                logger.debug(f"Cached {name} expired")
+                del self._entries[name]
+                return None
+        logger.debug(f"Using cached {name}")
+        return copy.deepcopy(value)
+
+    def set(self, endpoint: str, value, key: str = "") -> None:
+        """Caches the response of an endpoint for the TTL of the endpoint"""
+        ttl = self.get_ttl(endpoint)
+        if not ttl or value is None:
+            return
+        with self._lock:
+            self._entries[self.entry_name(endpoint, key)] = (time.time() + ttl, copy.deepcopy(value))
+        self.save()
+
+    def get_or_fetch(self, endpoint: str, fetch, key: str = ""):
+        """Returns the cached response of an endpoint, calling `fetch` to request it if it is not cached
+
+        Concurrent callers missing the same entry wait for a single request instead of sending their own.
+        """
+        value = self.get(endpoint, key)
+        if value is not None:
+            return value
+        name = self.entry_name(endpoint, key)
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(name, threading.Lock())
+        with fetch_lock:
+            value = self.get(endpoint, key)
+            if value is None:
+                value = fetch()
+                self.set(endpoint, value, key)
+        return value
+
+    def invalidate(self, endpoint: str = None) -> None:
+        """Removes the cached responses of an endpoint, all cached responses if no endpoint is given"""
+        logger.debug(f"Invalidating cached {endpoint if endpoint else 'metadata'}")
+        with self._lock:
+            for name in list(self._entries):
+                if endpoint is None or name == endpoint or name.startswith(f"{endpoint}/"):
+                    del self._entries[name]
+        self.save()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
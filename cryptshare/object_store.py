@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger(__name__)
+
+METADATA_SUFFIX = ".metadata.json"
+# Suffix of the files storing the metadata of an object
+
+
+class CryptshareObjectWriter:
+    """Writer of a single object of a CryptshareLocalObjectStore.
+
+    Like a multipart upload to an object store, the object only becomes visible when the writer is closed.
+    Aborting the writer discards everything written so far.
+    """
+
+    def __init__(self, store: "CryptshareLocalObjectStore", key: str, metadata: dict = None) -> None:
+        self.store = store
+        self.key = key
+        self.metadata = metadata if metadata else {}
+        self.size = 0
+        self.closed = False
+        self._temporary_path = os.path.join(store.temporary_directory, uuid.uuid4().hex)
+        self._handle = open(self._temporary_path, "wb")
+
+    def write(self, data: bytes) -> int:
+        written = self._handle.write(data)
+        self.size += written
+        return written
+
+    def close(self) -> None:
+        """Completes the object, replacing an existing object with the same key"""
+        if self.closed:
+            return
+        self._handle.close()
+        self.store.commit(self.key, self._temporary_path, self.metadata | {"size": self.size})
+        self.closed = True
+
+    def abort(self) -> None:
+        """Discards the object"""
+        if self.closed:
+            return
+        logger.debug(f"Aborting object {self.key}")
+        self._handle.close()
+        os.remove(self._temporary_path)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class CryptshareLocalObjectStore:
+    """Local stand-in for an object store like S3 or Azure Blob Storage, usable as download sink.
+
+    Objects are stored as files in `root`, their keys are percent-encoded into the file names, so keys can't
+    address files outside of the store.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.temporary_directory = os.path.join(root, ".incomplete")
+        os.makedirs(self.temporary_directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def object_path(self, key: str) -> str:
+        return os.path.join(self.root, quote(key, safe=""))
+
+    def open_writer(self, key: str, metadata: dict = None) -> CryptshareObjectWriter:
+        """Starts writing the object with the given key"""
+        logger.debug(f"Writing object {key}")
+        return CryptshareObjectWriter(self, key, metadata)
+
+    def commit(self, key: str, temporary_path: str, metadata: dict) -> None:
+        path = self.object_path(key)
+        with self._lock:
+            with open(path + METADATA_SUFFIX, "w") as handle:
+                json.dump(metadata, handle)
+            os.replace(temporary_path, path)
+
+    def sink_factory(self, prefix: str = ""):
+        """Returns a sink factory for CryptshareDownload.download_all_to_sinks, storing the files under their names
+
+        :param prefix: Prefix of the object keys, e.g. the transfer ID followed by "/"
+        """
+
+        def open_sink(file) -> CryptshareObjectWriter:
+            metadata = {name: file[name] for name in ("fileName", "checksum", "checksumAlgorithm") if name in file}
+            return self.open_writer(prefix + file["fileName"], metadata)
+
+        return open_sink
+
+    def keys(self) -> list[str]:
+        return sorted(
+            unquote(name)
+            for name in os.listdir(self.root)
+            if not name.endswith(METADATA_SUFFIX) and os.path.isfile(os.path.join(self.root, name))
+        )
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.object_path(key))
+
+    def get(self, key: str) -> bytes:
+        with open(self.object_path(key), "rb") as handle:
+            return handle.read()
+
+    def metadata(self, key: str) -> dict:
+        with open(self.object_path(key) + METADATA_SUFFIX, "r") as handle:
+            return json.load(handle)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            os.remove(self.object_path(key))
+            os.remove(self.object_path(key) + METADATA_SUFFIX)
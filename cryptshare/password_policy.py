@@ -0,0 +1,210 @@
+import logging
+import secrets
+import string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEQUENCE_LENGTH = 3
+# Length of alphabetical, numeric and keyboard sequences that are declined, like "abc", "123" or "qwe"
+DEFAULT_REPEAT_LENGTH = 3
+# Number of directly repeated characters that are declined, like "sss" in "Flussschifffahrt"
+KEYBOARD_ROWS = ["1234567890", "qwertyuiop", "qwertzuiop", "asdfghjkl", "zxcvbnm", "yxcvbnm"]
+# Rows of QWERTY and QWERTZ keyboards, sequences are checked in both directions
+SERVER_RULES = {"dictionaryWordsDeclined"}
+# Rules that can only be evaluated by the Cryptshare server
+DEFAULT_PASSWORD_LENGTH = 16
+# Length of generated passwords, if the rules allow it
+SPECIAL_CHARACTERS = "!#$%&()*+,-./:;=?@[]^_{|}~"
+# Special characters used in generated passwords
+MAX_LETTER_RUN = 2
+# Maximum number of consecutive letters in generated passwords if dictionary words are declined
+MAX_GENERATE_ATTEMPTS = 1000
+MAX_SERVER_CHECKS = 3
+# Generated passwords validated by the server before falling back to a password generated by the server
+
+
+def rule_details(rule: dict) -> dict:
+    return rule.get("details") or {}
+
+
+def find_sequence(password: str, alphabets: list[str], length: int) -> [str, None]:
+    """Returns the first part of the password of `length` characters that is a sequence of one of the alphabets"""
+    password = password.lower()
+    for alphabet in alphabets:
+        for sequence in (alphabet, alphabet[::-1]):
+            for start in range(len(sequence) - length + 1):
+                if sequence[start : start + length] in password:
+                    return sequence[start : start + length]
+    return None
+
+
+def find_repetition(password: str, length: int) -> [str, None]:
+    """Returns the first character repeated `length` times in a row"""
+    count = 0
+    for index, character in enumerate(password):
+        count = count + 1 if index and password[index - 1] == character else 1
+        if count >= length:
+            return character * length
+    return None
+
+
+class CryptsharePasswordPolicy:
+    """Local evaluator of the password rules of a Cryptshare server, compiled from `get_password_rules()`.
+
+    Everything except dictionary words is checked locally. `requires_server` tells whether a password passing
+    the local checks still has to be validated by the server, because of rules that can only be evaluated there.
+    """
+
+    def __init__(self, password_rules: list) -> None:
+        """
+        :param password_rules: The password rules as returned by get_password_rules
+        """
+        self.password_rules = password_rules if password_rules else []
+        self.rules = {rule["name"]: rule_details(rule) for rule in self.password_rules}
+        self._checks = {
+            "whitespacesDeclined": self._check_whitespaces_declined,
+            "minimumLengthRequired": self._check_minimum_length_required,
+            "maximumLengthRequired": self._check_maximum_length_required,
+            "lettersRequired": self._check_letters_required,
+            "upperCaseRequired": self._check_upper_case_required,
+            "lowerCaseRequired": self._check_lower_case_required,
+            "digitsRequired": self._check_digits_required,
+            "specialCharactersRequired": self._check_special_characters_required,
+            "alphabeticalSequenceDeclined": self._check_alphabetical_sequence_declined,
+            "numericSequenceDeclined": self._check_numeric_sequence_declined,
+            "keyboardSequenceDeclined": self._check_keyboard_sequence_declined,
+            "repeatedCharactersDeclined": self._check_repeated_characters_declined,
+            "blacklistedCharactersDeclined": self._check_blacklisted_characters_declined,
+        }
+        self.local_rules = [name for name in self.rules if self.is_local_rule(name)]
+        self.server_rules = [name for name in self.rules if not self.is_local_rule(name)]
+        if self.server_rules:
+            logger.debug(f"Password rules evaluated by the server: {self.server_rules}")
+
+    def is_local_rule(self, name: str) -> bool:
+        if name == "blacklistedCharactersDeclined":
+            return self.blacklisted_characters is not None
+        return name not in SERVER_RULES and name in self._checks
+
+    @property
+    def requires_server(self) -> bool:
+        return len(self.server_rules) > 0
+
+    @property
+    def minimum_length(self) -> int:
+        return self.rules.get("minimumLengthRequired", {}).get("length", 0)
+
+    @property
+    def maximum_length(self) -> [int, None]:
+        return self.rules.get("maximumLengthRequired", {}).get("length")
+
+    @property
+    def blacklisted_characters(self) -> [str, None]:
+        """The declined characters, None if the rules do not list them"""
+        details = self.rules.get("blacklistedCharactersDeclined", {})
+        for name in ("characters", "blacklistedCharacters", "blocklistedCharacters"):
+            if name in details:
+                return "".join(details[name])
+        return None
+
+    def sequence_length(self, name: str) -> int:
+        return self.rules.get(name, {}).get("length", DEFAULT_SEQUENCE_LENGTH)
+
+    @property
+    def repeat_length(self) -> int:
+        return self.rules.get("repeatedCharactersDeclined", {}).get("length", DEFAULT_REPEAT_LENGTH)
+
+    def _check_whitespaces_declined(self, password: str) -> bool:
+        return not any(character.isspace() for character in password)
+
+    def _check_minimum_length_required(self, password: str) -> bool:
+        return len(password) >= self.minimum_length
+
+    def _check_maximum_length_required(self, password: str) -> bool:
+        return self.maximum_length is None or len(password) <= self.maximum_length
+
+    def _check_letters_required(self, password: str) -> bool:
+        return any(character.isalpha() for character in password)
+
+    def _check_upper_case_required(self, password: str) -> bool:
+        return any(character.isupper() for character in password)
+
+    def _check_lower_case_required(self, password: str) -> bool:
+        return any(character.islower() for character in password)
+
+    def _check_digits_required(self, password: str) -> bool:
+        return any(character.isdigit() for character in password)
+
+    def _check_special_characters_required(self, password: str) -> bool:
+        return any(not character.isalnum() and not character.isspace() for character in password)
+
+    def _check_alphabetical_sequence_declined(self, password: str) -> bool:
+        alphabet = "abcdefghijklmnopqrstuvwxyz"
+        return find_sequence(password, [alphabet], self.sequence_length("alphabeticalSequenceDeclined")) is None
+
+    def _check_numeric_sequence_declined(self, password: str) -> bool:
+        return find_sequence(password, ["0123456789"], self.sequence_length("numericSequenceDeclined")) is None
+
+    def _check_keyboard_sequence_declined(self, password: str) -> bool:
+        return find_sequence(password, KEYBOARD_ROWS, self.sequence_length("keyboardSequenceDeclined")) is None
+
+    def _check_repeated_characters_declined(self, password: str) -> bool:
+        return find_repetition(password, self.repeat_length) is None
+
+    def _check_blacklisted_characters_declined(self, password: str) -> bool:
+        return not any(character in self.blacklisted_characters for character in password)
+
+    def violations(self, password: str) -> list[str]:
+        """Returns the names of the locally evaluated rules the password violates"""
+        password = password if password else ""
+        return [name for name in self.local_rules if not self._checks[name](password)]
+
+    @property
+    def can_generate(self) -> bool:
+        """True if passwords satisfying all rules can be generated locally"""
+        return all(name in SERVER_RULES for name in self.server_rules)
+
+    def generated_length(self, length: int = None) -> int:
+        length = length if length else max(DEFAULT_PASSWORD_LENGTH, self.minimum_length)
+        return min(length, self.maximum_length) if self.maximum_length else length
+
+    def generate(self, length: int = None) -> str:
+        """Generates a random password satisfying the rules, without a request to the server
+
+        Characters are drawn with the secrets module, candidates violating a rule are drawn again. If dictionary
+        words are declined, letters are interrupted by a digit or special character after MAX_LETTER_RUN letters.
+        This rules out almost every dictionary word, but not all of them: the dictionary of the server is unknown
+        and may contain short words, or words with digits and special characters. So the rule is still not
+        evaluated locally, and `requires_server` stays True; the client's generate_password validates generated
+        passwords with the server.
+
+        :param length: Length of the password, defaults to DEFAULT_PASSWORD_LENGTH within the length rules
+        :return: The password
+        """
+        if not self.can_generate:
+            raise ValueError(f"Password rules can't be evaluated locally: {self.server_rules}")
+        length = self.generated_length(length)
+        excluded = self.blacklisted_characters if "blacklistedCharactersDeclined" in self.rules else ""
+        letters = "".join(character for character in string.ascii_letters if character not in excluded)
+        others = "".join(character for character in string.digits + SPECIAL_CHARACTERS if character not in excluded)
+        limit_letters = "dictionaryWordsDeclined" in self.rules
+        for _ in range(MAX_GENERATE_ATTEMPTS):
+            characters = []
+            for _ in range(length):
+                letter_run = len(characters) >= MAX_LETTER_RUN and all(
+                    character.isalpha() for character in characters[-MAX_LETTER_RUN:]
+                )
+                characters.append(secrets.choice(others if limit_letters and letter_run else letters + others))
+            password = "".join(characters)
+            if not self.violations(password):
+                return password
+        raise ValueError("Failed to generate a password satisfying the password rules")
+
+    def validate(self, password: str) -> dict:
+        """Evaluates the password locally
+
+        :return: Dict with "valid", "violations" (names of the violated rules) and "complete", which is False if
+            rules that can only be evaluated by the server were not checked
+        """
+        violations = self.violations(password)
+        return {"valid": not violations, "violations": violations, "complete": not self.requires_server}
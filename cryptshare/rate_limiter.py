@@ -0,0 +1,154 @@
+import json
+import logging
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METADATA_BUCKET = "metadata"
+# Bucket for small API calls, like policy, verification and password requests
+BULK_BUCKET = "bulk"
+# Bucket for file content uploads and downloads
+
+
+class CryptshareTokenBucket:
+    """Token bucket refilling `rate` tokens per second up to `capacity` tokens"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def reserve(self, now: float, tokens: float = 1) -> float:
+        """Takes tokens from the bucket and returns the seconds to wait until they are available"""
+        self.refill(now)
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class CryptshareRateLimiter:
+    """Client side rate limiter for the requests sent to a Cryptshare server.
+
+    Metadata calls and bulk file transfers are paced by separate token buckets. Limiters obtained with
+    `for_server` are shared by all clients of a process; with a `lock_file` the bucket state is also shared
+    with other processes.
+    """
+
+    _limiters: dict = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(
+        self,
+        metadata_rate: float = 10.0,
+        metadata_burst: float = 20.0,
+        bulk_rate: float = 2.0,
+        bulk_burst: float = 4.0,
+        lock_file: str = None,
+    ) -> None:
+        """Initialises the rate limiter
+
+        :param metadata_rate: Metadata requests per second
+        :param metadata_burst: Metadata requests that can be sent at once
+        :param bulk_rate: File content requests per second
+        :param bulk_burst: File content requests that can be sent at once
+        :param lock_file: Path of a file to share the bucket state with other processes
+        """
+        self._buckets = {
+            METADATA_BUCKET: CryptshareTokenBucket(metadata_rate, metadata_burst),
+            BULK_BUCKET: CryptshareTokenBucket(bulk_rate, bulk_burst),
+        }
+        self._lock = threading.Lock()
+        self._statistics = {
+            name: {"requests": 0, "waited_requests": 0, "total_wait": 0.0, "max_wait": 0.0} for name in self._buckets
+        }
+        self.lock_file = lock_file
+        if lock_file and fcntl is None:
+            logger.warning("File locking is not supported on this platform, rate limit is not shared between processes")
+            self.lock_file = None
+
+    @classmethod
+    def for_server(cls, server_hash: str, **kwargs) -> "CryptshareRateLimiter":
+        """Returns the rate limiter shared by all clients of this process for the given server"""
+        with cls._limiters_lock:
+            if server_hash not in cls._limiters:
+                logger.debug(f"Creating rate limiter for server {server_hash}")
+                cls._limiters[server_hash] = cls(**kwargs)
+            return cls._limiters[server_hash]
+
+    @staticmethod
+    def get_bucket(method: str, stream: bool = False) -> str:
+        """Returns the bucket a request is paced by: file contents are uploaded by PUT and downloaded as stream"""
+        if stream or method.upper() == "PUT":
+            return BULK_BUCKET
+        return METADATA_BUCKET
+
+    def _reserve_shared(self, bucket: str, now: float) -> float:
+        """Reserves a token from the bucket state stored in the lock file"""
+        with open(self.lock_file, "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                content = handle.read()
+                state = json.loads(content) if content else {}
+                token_bucket = self._buckets[bucket]
+                tokens, timestamp = state.get(bucket, (token_bucket.capacity, now))
+                token_bucket.tokens, token_bucket.timestamp = tokens, timestamp
+                wait = token_bucket.reserve(now)
+                state[bucket] = (token_bucket.tokens, token_bucket.timestamp)
+                handle.seek(0)
+                handle.truncate()
+                handle.write(json.dumps(state))
+                handle.flush()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        return wait
+
+    def reserve(self, bucket: str = METADATA_BUCKET) -> float:
+        """Reserves a request slot and returns the seconds to wait before sending the request"""
+        with self._lock:
+            if self.lock_file:
+                # Wall clock time, monotonic clocks are not comparable between processes
+                wait = self._reserve_shared(bucket, time.time())
+            else:
+                wait = self._buckets[bucket].reserve(time.monotonic())
+            statistics = self._statistics[bucket]
+            statistics["requests"] += 1
+            if wait > 0:
+                statistics["waited_requests"] += 1
+                statistics["total_wait"] += wait
+                statistics["max_wait"] = max(statistics["max_wait"], wait)
+        return wait
+
+    def acquire(self, bucket: str = METADATA_BUCKET) -> float:
+        """Blocks until a request may be sent, returns the time waited"""
+        wait = self.reserve(bucket)
+        if wait > 0:
+            logger.debug(f"Rate limit reached for {bucket} requests, waiting {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+
+    def statistics(self) -> dict:
+        """Wait time statistics per bucket"""
+        with self._lock:
+            return {
+                bucket: statistics
+                | {"mean_wait": statistics["total_wait"] / statistics["requests"] if statistics["requests"] else 0.0}
+                for bucket, statistics in self._statistics.items()
+            }
+
+    def reset_statistics(self) -> None:
+        with self._lock:
+            for statistics in self._statistics.values():
+                statistics.update({"requests": 0, "waited_requests": 0, "total_wait": 0.0, "max_wait": 0.0})
@@ -0,0 +1,116 @@
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Status codes of responses that are worth retrying
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# HTTP methods that can be repeated without changing the result
+
+
+def parse_retry_after(value: str, now: datetime = None) -> [float, None]:
+    """Parses the value of a Retry-After header
+
+    :param value: Either a number of seconds or an HTTP date
+    :param now: The current time, used to convert an HTTP date into seconds
+    :return: The number of seconds to wait, None if the value can't be parsed
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        logger.debug(f"Invalid Retry-After header: {value}")
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    now = now if now else datetime.now(timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class CryptshareRetryPolicy:
+    """Decides if and when a failed API request is repeated.
+
+    Idempotent requests are retried on the configured status codes and on connection errors. Non-idempotent
+    requests (like starting a transfer session or sending a transfer) are only retried, when the server
+    provably did not process them: on 429 Too Many Requests and when no connection could be established.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30.0,
+        retry_budget: float = 60.0,
+        status_codes: frozenset = RETRY_STATUS_CODES,
+        idempotent_methods: frozenset = IDEMPOTENT_METHODS,
+        respect_retry_after: bool = True,
+    ) -> None:
+        """Initialises the retry policy
+
+        :param max_retries: Maximum number of retries per request, 0 disables retries
+        :param backoff_factor: Base delay in seconds, doubled with every retry
+        :param max_backoff: Maximum delay in seconds between two attempts
+        :param retry_budget: Maximum total time in seconds spent waiting for retries of a single request
+        :param status_codes: Status codes of responses that are retried
+        :param idempotent_methods: HTTP methods that are retried on every retryable error
+        :param respect_retry_after: Wait as long as the Retry-After header of the response asks for
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_budget = retry_budget
+        self.status_codes = status_codes
+        self.idempotent_methods = idempotent_methods
+        self.respect_retry_after = respect_retry_after
+
+    def is_idempotent(self, method: str, idempotent: bool = None) -> bool:
+        if idempotent is not None:
+            return idempotent
+        return method.upper() in self.idempotent_methods
+
+    def is_retryable_status(self, method: str, status_code: int, idempotent: bool = None) -> bool:
+        if status_code not in self.status_codes:
+            return False
+        return status_code == 429 or self.is_idempotent(method, idempotent)
+
+    def is_retryable_exception(self, method: str, exception: Exception, idempotent: bool = None) -> bool:
+        if isinstance(exception, requests.ConnectTimeout):
+            return True
+        if isinstance(exception, (requests.ConnectionError, requests.Timeout)):
+            return self.is_idempotent(method, idempotent)
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter for the given (zero based) retry attempt"""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2**attempt)))
+
+    def get_delay(self, attempt: int, waited: float, retry_after: str = None) -> [float, None]:
+        """Returns the delay before the next attempt, or None if the request must not be retried anymore
+
+        :param attempt: Number of retries already done for this request
+        :param waited: Seconds already spent waiting for retries of this request
+        :param retry_after: Value of the Retry-After header of the last response
+        """
+        if attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt)
+        if self.respect_retry_after:
+            retry_after_delay = parse_retry_after(retry_after)
+            if retry_after_delay is not None:
+                delay = retry_after_delay
+        if waited + delay > self.retry_budget:
+            logger.debug(f"Retry budget of {self.retry_budget}s exhausted")
+            return None
+        return delay
+
+
+NO_RETRY = CryptshareRetryPolicy(max_retries=0)
@@ -0,0 +1,253 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from cryptshare.client import DEFAULT_STATUS_WORKERS
+
+logger = logging.getLogger(__name__)
+
+EVENT_DOWNLOAD = "download"
+# A recipient downloaded files of the transfer
+EVENT_STATUS_CHANGED = "status_changed"
+# The status of the transfer changed in any other way
+EVENT_EXPIRED = "expired"
+# The transfer expired or was retracted, it is not polled anymore
+RECIPIENT_KEYS = ("email", "emailAddress", "recipient")
+# Keys identifying a recipient in the lists of a transfer status, independent of its position
+
+
+def parse_date(value: str) -> [datetime, None]:
+    """Parses an ISO 8601 date of the REST API, None if the value can't be parsed"""
+    try:
+        date = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+
+class CryptshareTransferEvent:
+    """A change of the status of a transfer, detected by CryptshareStatusWatcher"""
+
+    def __init__(self, tracking_id: str, kind: str, status, previous=None, downloads: int = 0) -> None:
+        """
+        :param tracking_id: Tracking ID of the transfer
+        :param kind: EVENT_DOWNLOAD, EVENT_STATUS_CHANGED or EVENT_EXPIRED
+        :param status: The new status of the transfer
+        :param previous: The last known status of the transfer
+        :param downloads: Number of new downloads, for EVENT_DOWNLOAD
+        """
+        self.tracking_id = tracking_id
+        self.kind = kind
+        self.status = status
+        self.previous = previous
+        self.downloads = downloads
+
+    def __repr__(self):
+        return f"<CryptshareTransferEvent {self.tracking_id}: {self.kind}>"
+
+
+class CryptshareTransferState:
+    """Last known status of a watched transfer and its polling schedule"""
+
+    def __init__(self, tracking_id: str, interval: float) -> None:
+        self.tracking_id = tracking_id
+        self.status = None
+        self.interval = interval
+        self.next_poll = 0.0
+        self.terminal = False
+
+
+class CryptshareStatusWatcher:
+    """Watches the status of the transfers of a sender and reports changes as events.
+
+    Every transfer is polled on its own schedule: after a change its interval drops to `min_interval`, while
+    it is quiet the interval grows by `backoff_factor` up to `max_interval`. Expired transfers are not polled
+    anymore. Statuses included in the transfer list are used without requesting them separately.
+    """
+
+    def __init__(
+        self,
+        cryptshare_client,
+        tracking_ids: list[str] = None,
+        min_interval: float = 10.0,
+        max_interval: float = 600.0,
+        backoff_factor: float = 2.0,
+        max_workers: int = DEFAULT_STATUS_WORKERS,
+        emit_initial: bool = False,
+    ) -> None:
+        """Initialises the watcher
+
+        :param cryptshare_client: Cryptshare client with a verified sender
+        :param tracking_ids: Tracking IDs of the transfers to watch, all transfers of the sender by default
+        :param min_interval: Seconds between two polls of an active transfer
+        :param max_interval: Maximum seconds between two polls of a quiet transfer
+        :param backoff_factor: Factor the interval of a transfer grows by with every poll without change
+        :param max_workers: Maximum number of status requests sent at the same time
+        :param emit_initial: Emit a status change event for the first status of every transfer
+        """
+        self._cryptshare_client = cryptshare_client
+        self.tracking_ids = tracking_ids
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.max_workers = max_workers
+        self.emit_initial = emit_initial
+        self.states: dict[str, CryptshareTransferState] = {}
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _item_name(item, index: int) -> str:
+        if isinstance(item, dict):
+            for key in RECIPIENT_KEYS:
+                if isinstance(item.get(key), str):
+                    return item[key]
+        return str(index)
+
+    @classmethod
+    def download_entries(cls, status, path: str = "") -> dict:
+        """Returns the downloads listed anywhere in a transfer status, keyed by the path they are listed at
+
+        Lists of downloads map to a Counter of their entries, download counts to the count and download dates to
+        the date. List items with an email address are keyed by it, so reordered recipients keep their path.
+        """
+        if isinstance(status, list):
+            entries = {}
+            for index, item in enumerate(status):
+                entries |= cls.download_entries(item, f"{path}/{cls._item_name(item, index)}")
+            return entries
+        if not isinstance(status, dict):
+            return {}
+        entries = {}
+        for key, value in status.items():
+            key_path = f"{path}/{key}"
+            if "download" in key.lower():
+                if isinstance(value, list):
+                    entries[key_path] = Counter(json.dumps(item, sort_keys=True, default=str) for item in value)
+                    continue
+                if isinstance(value, int) and not isinstance(value, bool):
+                    entries[key_path] = value
+                    continue
+                if parse_date(value) is not None:
+                    entries[key_path] = parse_date(value)
+                    continue
+            entries |= cls.download_entries(value, key_path)
+        return entries
+
+    @classmethod
+    def count_new_downloads(cls, previous, status) -> int:
+        """Counts the downloads of a transfer status that are not listed in the previous status
+
+        Every recipient and download list is compared on its own: new list entries, increased counts and later
+        download dates count as downloads. Entries that disappeared, e.g. because the server shortened a history,
+        are ignored, so the result is never negative and a download is not hidden by a removed entry.
+        """
+        known = cls.download_entries(previous)
+        count = 0
+        for path, value in cls.download_entries(status).items():
+            before = known.get(path)
+            if isinstance(value, Counter):
+                count += sum((value - (before if isinstance(before, Counter) else Counter())).values())
+            elif isinstance(value, datetime):
+                count += int(not isinstance(before, datetime) or value > before)
+            else:
+                count += max(0, value - (before if isinstance(before, int) else 0))
+        return count
+
+    @staticmethod
+    def is_expired(status, now: datetime = None) -> bool:
+        """Checks whether a transfer status is terminal: expired, retracted or past its expiration date"""
+        if not isinstance(status, dict):
+            return False
+        if status.get("expired") or status.get("expiredByRetraction") or status.get("retracted"):
+            return True
+        expiration_date = parse_date(status.get("expirationDate"))
+        now = now if now else datetime.now(timezone.utc)
+        return expiration_date is not None and expiration_date <= now
+
+    def compare(self, state: CryptshareTransferState, status) -> list[CryptshareTransferEvent]:
+        """Returns the events for a new status of a transfer"""
+        previous = state.status
+        if previous is None:
+            if self.emit_initial:
+                return [CryptshareTransferEvent(state.tracking_id, EVENT_STATUS_CHANGED, status)]
+            return []
+        if status == previous:
+            return []
+        events = []
+        downloads = self.count_new_downloads(previous, status)
+        if downloads > 0:
+            events.append(CryptshareTransferEvent(state.tracking_id, EVENT_DOWNLOAD, status, previous, downloads))
+        if self.is_expired(status) and not self.is_expired(previous):
+            events.append(CryptshareTransferEvent(state.tracking_id, EVENT_EXPIRED, status, previous))
+        if not events:
+            events.append(CryptshareTransferEvent(state.tracking_id, EVENT_STATUS_CHANGED, status, previous))
+        return events
+
+    def update(self, tracking_id: str, status, now: float) -> list[CryptshareTransferEvent]:
+        """Records a new status of a transfer, reschedules its next poll and returns the events"""
+        state = self.states[tracking_id]
+        events = self.compare(state, status)
+        if events:
+            state.interval = self.min_interval
+        else:
+            state.interval = min(self.max_interval, state.interval * self.backoff_factor)
+        state.status = status
+        state.next_poll = now + state.interval
+        if self.is_expired(status):
+            logger.debug(f"Transfer {tracking_id} expired, it is not polled anymore")
+            state.terminal = True
+        return events
+
+    def _list_transfers(self) -> list[dict]:
+        if self.tracking_ids is not None:
+            return [{"trackingId": tracking_id} for tracking_id in self.tracking_ids]
+        return self._cryptshare_client.get_transfers()
+
+    def poll(self) -> list[CryptshareTransferEvent]:
+        """Polls the transfers that are due and returns the detected events"""
+        now = time.monotonic()
+        transfers = self._list_transfers()
+        due = []
+        for list_transfer in transfers:
+            tracking_id = list_transfer["trackingId"]
+            if tracking_id not in self.states:
+                self.states[tracking_id] = CryptshareTransferState(tracking_id, self.min_interval)
+            state = self.states[tracking_id]
+            if not state.terminal and state.next_poll <= now:
+                due.append(list_transfer)
+        logger.debug(f"Polling the status of {len(due)} of {len(transfers)} transfers")
+        events = []
+        if due:
+            for transfer_status in self._cryptshare_client.iter_transfer_status(self.max_workers, transfers=due):
+                events += self.update(transfer_status["trackingID"], transfer_status["status"], now)
+        return events
+
+    @property
+    def finished(self) -> bool:
+        """True if all explicitly watched transfers reached a terminal state"""
+        return (
+            self.tracking_ids is not None
+            and all(tracking_id in self.states for tracking_id in self.tracking_ids)
+            and all(self.states[tracking_id].terminal for tracking_id in self.tracking_ids)
+        )
+
+    def watch(self):
+        """Polls until stop is called, or until all explicitly watched transfers expired
+
+        :return: Iterator of CryptshareTransferEvent
+        """
+        self._stop.clear()
+        while not self._stop.is_set():
+            yield from self.poll()
+            if self.finished:
+                return
+            active = [state.next_poll for state in self.states.values() if not state.terminal]
+            delay = min(active) - time.monotonic() if active else self.max_interval
+            self._stop.wait(max(0.0, min(delay, self.max_interval)))
+
+    def stop(self) -> None:
+        """Stops watch after the current poll, can be called from another thread"""
+        self._stop.set()
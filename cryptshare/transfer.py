@@ -1,15 +1,33 @@
-import hashlib
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from cryptshare.api_requests import CryptshareApiRequests
 from cryptshare.base_client import CryptshareBaseClient
+from cryptshare.checksum import calculate_file_checksum, iter_file_checksums
 from cryptshare.sender import CryptshareSender
 from cryptshare.transfer_settings import CryptshareTransferSettings
 from cryptshare.validators import CryptshareValidators
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_UPLOAD_WORKERS = 4
+# Number of files uploaded in parallel by CryptshareTransfer.upload_files
+
+
+class CryptshareUploadError(Exception):
+    """Raised when files of a transfer could not be uploaded"""
+
+    def __init__(self, errors: dict, files: list = None) -> None:
+        """
+        :param errors: Exceptions of the failed uploads by file path
+        :param files: The successfully uploaded files
+        """
+        self.errors = errors
+        self.files = files if files else []
+        super().__init__(f"Failed to upload {len(errors)} file(s): {', '.join(errors)}")
+
 
 class TransferFile(CryptshareApiRequests):
     _cryptshare_client: CryptshareBaseClient = None
@@ -20,21 +38,36 @@ class TransferFile(CryptshareApiRequests):
     name: str
     path: str
     checksum: str
+    checksum_algorithm: str = None
 
-    def __init__(self, path: str, session_tracking_id: str, cryptshare_client: CryptshareBaseClient) -> None:
+    def __init__(
+        self,
+        path: str,
+        session_tracking_id: str,
+        cryptshare_client: CryptshareBaseClient,
+        checksum_algorithm: str = None,
+        checksum: str = None,
+    ) -> None:
+        """Initialises the file, calculating its checksum unless a precomputed `checksum` is given"""
         logger.debug(f"Initialising Cryptshare TransferFile object for file: {path}")
         self.size = os.stat(path).st_size
         self.name = os.path.basename(path)
         self.path = path
         self._cryptshare_client = cryptshare_client
         self._tracking_id = session_tracking_id
-        self.calculate_checksum()
+        self.checksum_algorithm = checksum_algorithm
+        if checksum:
+            self.checksum = checksum
+        else:
+            self.calculate_checksum()
 
     def calculate_checksum(self) -> None:
-        logger.debug("Calculating checksum")  # Calculate file hashsum
-        with open(self.path, "rb") as data:
-            file_content = data.read()
-            self.checksum = hashlib.sha256(file_content).hexdigest()
+        logger.debug(f"Calculating {self.checksum_algorithm or 'default'} checksum")  # Calculate file hashsum
+        checksum_cache = self._cryptshare_client.checksum_cache if self._cryptshare_client else None
+        if checksum_cache is not None:
+            self.checksum = checksum_cache.calculate_file_checksum(self.path, self.checksum_algorithm)
+        else:
+            self.checksum = calculate_file_checksum(self.path, self.checksum_algorithm)
 
     @staticmethod
     def get_file_id_from_returned_url(url: str) -> [str, None]:
@@ -72,16 +105,21 @@ class TransferFile(CryptshareApiRequests):
     def upload_file_content(self) -> bool:
         url = f"{self.transfer_session_url}/files/{self._file_id}/content"
         logger.info(f"Uploading file {self.name} content to PUT {url}")
-        data = open(self.path, "rb").read()
-        self._request(
-            "PUT",
-            url,
-            data=data,
-            verify=self._cryptshare_client.ssl_verify,
-            headers=self._cryptshare_client.header.request_header,
-        )
+        with open(self.path, "rb") as handle:
+            # The file is streamed from disk, in chunks of the session's upload block size
+            self._request(
+                "PUT",
+                url,
+                data=self.content_reader(handle),
+                verify=self._cryptshare_client.ssl_verify,
+                headers=self._cryptshare_client.header.request_header,
+            )
         return True
 
+    def content_reader(self, handle):
+        """Returns the file-like object the content is uploaded from, override to observe the upload progress"""
+        return handle
+
     def delete_upload(self) -> bool:
         url = f"{self.transfer_session_url}/files/{self._file_id}"
         logger.debug(f"Deleting uploaded file {self.name}  DELETE {url}")
@@ -96,7 +134,8 @@ class TransferFile(CryptshareApiRequests):
 
 class CryptshareTransfer(CryptshareApiRequests):
     _cryptshare_client: CryptshareBaseClient = None
-    files = []
+    transfer_file_class = TransferFile
+    files: list[TransferFile]
     tracking_id: str = ""
     _settings: CryptshareTransferSettings
     sender: CryptshareSender = None
@@ -123,6 +162,8 @@ class CryptshareTransfer(CryptshareApiRequests):
         self._cryptshare_client = cryptshare_client if cryptshare_client else None
         self._settings = settings
         self.send = False
+        self.files = []
+        self._files_lock = threading.Lock()
 
     def get_transfer_session_url(self, cryptshare_client: CryptshareBaseClient = None) -> str:
         self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
@@ -136,6 +177,11 @@ class CryptshareTransfer(CryptshareApiRequests):
 
         return f"{self._cryptshare_client.api_path('users')}{self._settings.sender.email}/transfers/{self.tracking_id}"
 
+    @property
+    def checksum_algorithm(self) -> [str, None]:
+        """The file checksum algorithm configured in the transfer settings"""
+        return self._settings.other_settings.get("fileChecksumAlgorithm")
+
     def set_generated_password(self, password: str) -> None:
         """
         Set the generated password for the transfer session if the security mode is set to GENERATED
@@ -217,10 +263,88 @@ class CryptshareTransfer(CryptshareApiRequests):
         self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
         # Update transfer's cryptshare client, if provided
 
-        file = TransferFile(path, self.tracking_id, self._cryptshare_client)
+        return self._upload_transfer_file(path)
+
+    def upload_files(
+        self,
+        paths: list[str],
+        max_workers: int = DEFAULT_UPLOAD_WORKERS,
+        cryptshare_client: CryptshareBaseClient = None,
+        precompute_checksums: bool = False,
+        checksum_workers: int = None,
+    ) -> [list[TransferFile], None]:
+        """Uploads several files in parallel
+
+        Hashing, announcing and uploading of the files overlap in a pool of `max_workers` threads, capped by the
+        connection pool size of the client so every upload reuses a pooled connection.
+        With `precompute_checksums` the files are hashed in a process pool using all CPU cores instead, and each
+        file is announced as soon as its checksum is ready.
+        Files that were announced, but could not be uploaded completely, are removed from the transfer session.
+
+        :param paths: Paths of the files to upload
+        :param max_workers: Maximum number of files uploaded at the same time
+        :param cryptshare_client: Update transfer's cryptshare client, if provided
+        :param precompute_checksums: Calculate the checksums in a process pool
+        :param checksum_workers: Number of checksum worker processes, defaults to the number of CPUs
+        :return: The uploaded files, in the order of the given paths
+        :raises CryptshareUploadError: If any file could not be uploaded, after all other uploads are finished
+        """
+        if not self._session_is_open:
+            logger.error("Cryptshare Transfer Session is not open, can't upload files")
+            return None
+
+        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
+        # Update transfer's cryptshare client, if provided
+
+        uploaded = {}
+        errors = {}
+        max_workers = max(1, min(max_workers, self._cryptshare_client.pool_maxsize))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if precompute_checksums:
+                futures = {}
+                checksums = iter_file_checksums(
+                    paths,
+                    self.checksum_algorithm,
+                    max_workers=checksum_workers,
+                    return_exceptions=True,
+                    cache=self._cryptshare_client.checksum_cache,
+                )
+                for path, checksum in checksums:
+                    if isinstance(checksum, Exception):
+                        logger.error(f"Failed to calculate checksum of {path}: {checksum}")
+                        errors[path] = checksum
+                        continue
+                    futures[executor.submit(self._upload_transfer_file, path, checksum)] = path
+            else:
+                futures = {executor.submit(self._upload_transfer_file, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    uploaded[path] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to upload file {path}: {e}")
+                    errors[path] = e
+        files = [uploaded[path] for path in paths if path in uploaded]
+        if errors:
+            raise CryptshareUploadError(errors, files)
+        return files
+
+    def _upload_transfer_file(self, path: str, checksum: str = None) -> TransferFile:
+        file = self.transfer_file_class(
+            path, self.tracking_id, self._cryptshare_client, self.checksum_algorithm, checksum=checksum
+        )
         file.announce_upload()
-        file.upload_file_content()
-        self.files.append(file)
+        try:
+            file.upload_file_content()
+        except Exception:
+            logger.debug(f"Removing partially uploaded file {file.name} from transfer session")
+            try:
+                file.delete_upload()
+            except Exception as e:
+                logger.warning(f"Failed to remove partially uploaded file {file.name}: {e}")
+            raise
+        with self._files_lock:
+            self.files.append(file)
         return file
 
     def delete_file(self, file: TransferFile, cryptshare_client: CryptshareBaseClient = None) -> None:
@@ -233,7 +357,8 @@ class CryptshareTransfer(CryptshareApiRequests):
 
         logger.debug(f"Deleting file {file.name}")
         file.delete_upload()
-        self.files.remove(file)
+        with self._files_lock:
+            self.files.remove(file)
 
     def delete_transfer_session(self) -> None:
         if self._session_is_open:
@@ -300,6 +425,7 @@ class CryptshareTransfer(CryptshareApiRequests):
             json=self._settings.data(),
             verify=self._cryptshare_client.ssl_verify,
             headers=self._cryptshare_client.header.request_header,
+            idempotent=True,
         )
         return r
 
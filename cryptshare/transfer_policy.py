@@ -1,9 +1,51 @@
+import copy
 import logging
+import threading
+import time
+from collections import OrderedDict
 
 from cryptshare.transfer_security_mode import OneTimePaswordSecurityModes
 
 logger = logging.getLogger(__name__)
 
+POLICY_RESOLVE_DOMAINS = "domains"
+# Query the policy for one recipient per domain, for servers with domain based policy rules only
+POLICY_RESOLVE_CHUNKS = "chunks"
+# Query the policy for chunks of the recipient list
+DEFAULT_POLICY_CHUNK_SIZE = 100
+# Number of recipients per policy request when resolving in chunks
+
+
+def normalize_recipients(recipients: list[str]) -> list[str]:
+    """Returns the sorted, lower case recipient addresses without duplicates"""
+    return sorted({recipient.strip().lower() for recipient in recipients if recipient and recipient.strip()})
+
+
+def group_recipients(
+    recipients: list[str], resolve: str = None, chunk_size: int = DEFAULT_POLICY_CHUNK_SIZE
+) -> list[tuple[list[str], list[str]]]:
+    """Splits the recipients into the policy requests needed to resolve them
+
+    :param recipients: The recipient addresses
+    :param resolve: None to request the policy for all recipients at once, POLICY_RESOLVE_DOMAINS or
+        POLICY_RESOLVE_CHUNKS
+    :param chunk_size: Number of recipients per request for POLICY_RESOLVE_CHUNKS
+    :return: List of (queried recipients, recipients the answer applies to) tuples
+    """
+    # The addresses are sent as given, the server answers with them, only the policy cache key is normalized
+    recipients = list(recipients)
+    if resolve == POLICY_RESOLVE_DOMAINS:
+        domains = {}
+        for recipient in recipients:
+            domains.setdefault(recipient.strip().rpartition("@")[2].lower(), []).append(recipient)
+        return [([members[0]], members) for members in domains.values()]
+    if resolve == POLICY_RESOLVE_CHUNKS:
+        chunks = [recipients[i : i + chunk_size] for i in range(0, len(recipients), max(1, chunk_size))]
+        return [(chunk, chunk) for chunk in chunks] if chunks else [([], [])]
+    if resolve is not None:
+        raise ValueError(f"Unknown policy resolution: {resolve}")
+    return [(recipients, recipients)]
+
 
 class CryptshareTransferPolicy:
     _policy: dict
@@ -90,3 +132,135 @@ class CryptshareTransferPolicy:
     @property
     def confidential_message_required(self) -> bool:
         return self.get_settings().get("confidentialMessageRequired", False)
+
+    @classmethod
+    def merge(cls, policies: list["CryptshareTransferPolicy"], groups: list = None) -> "CryptshareTransferPolicy":
+        """Merges the policies of several requests into the most restrictive policy for all recipients
+
+        The transfer is only allowed if all policies allow it. Limits are minimised, permissions combined with
+        and, requirements with or, and only the security modes allowed by all policies are kept. Listed addresses
+        of a request answered for a whole domain are expanded to all recipients of that domain.
+
+        :param policies: The policies to merge
+        :param groups: The (queried recipients, recipients the answer applies to) tuple of every policy
+        """
+        merged = {"allowed": all(policy.is_allowed for policy in policies)}
+        settings = None
+        for index, policy in enumerate(policies):
+            query, members = groups[index] if groups else ([], [])
+            for name, value in policy.policy.items():
+                if isinstance(value, list):
+                    if len(query) == 1 and query[0] in value and members != query:
+                        value = [address for address in value if address != query[0]] + members
+                    merged[name] = merged.get(name, []) + value
+                elif name not in ("allowed", "settings"):
+                    merged.setdefault(name, value)
+            if policy.is_allowed:
+                settings = (
+                    policy.get_settings() if settings is None else cls.merge_settings(settings, policy.get_settings())
+                )
+        merged["settings"] = copy.deepcopy(settings) if settings else {}
+        return cls(merged)
+
+    @staticmethod
+    def merge_settings(settings: dict, other: dict) -> dict:
+        merged = dict(settings)
+        for name, value in other.items():
+            if name not in merged:
+                merged[name] = value
+            elif name == "securityModes":
+                merged[name] = CryptshareTransferPolicy.merge_security_modes(merged[name], value)
+            elif isinstance(value, bool) and name.endswith("Required"):
+                merged[name] = merged[name] or value
+            elif isinstance(value, bool) and not name.endswith("Default"):
+                merged[name] = merged[name] and value
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[name] = min(merged[name], value)
+        return merged
+
+    @staticmethod
+    def merge_security_modes(security_modes: list, other: list) -> list:
+        """Keeps the security modes, and their password modes, that are allowed by both lists"""
+        other_modes = {security_mode["name"]: security_mode for security_mode in other}
+        merged = []
+        for security_mode in security_modes:
+            if security_mode["name"] not in other_modes:
+                continue
+            security_mode = copy.deepcopy(security_mode)
+            config = security_mode.get("config", {})
+            other_config = other_modes[security_mode["name"]].get("config", {})
+            if "allowedPasswordModes" in config:
+                config["allowedPasswordModes"] = [
+                    mode
+                    for mode in config["allowedPasswordModes"]
+                    if mode in other_config.get("allowedPasswordModes", config["allowedPasswordModes"])
+                ]
+            merged.append(security_mode)
+        return merged
+
+
+class CryptshareTransferPolicyCache:
+    """Bounded LRU cache of transfer policy responses, keyed by server, sender and normalized recipients.
+
+    Entries expire `ttl` seconds after they were requested. Caches obtained with `shared` are used by all clients
+    of a process.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0) -> None:
+        """Initialises the policy cache
+
+        :param max_entries: Maximum number of cached policies
+        :param ttl: Seconds a policy is cached
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "CryptshareTransferPolicyCache":
+        """Returns the policy cache shared by all clients of this process"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def key(server: str, sender: str, recipients: list[str]) -> tuple:
+        return server, sender.strip().lower(), tuple(normalize_recipients(recipients))
+
+    def get(self, key: tuple) -> [dict, None]:
+        """Returns a copy of the cached policy response, None if it is not cached or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, policy = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        logger.debug(f"Using cached policy for {len(key[2])} recipients")
+        return copy.deepcopy(policy)
+
+    def set(self, key: tuple, policy: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(policy))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, server: str = None, sender: str = None) -> None:
+        """Removes the cached policies of a server and sender, all cached policies if neither is given"""
+        sender = sender.strip().lower() if sender else None
+        with self._lock:
+            for key in list(self._entries):
+                if (server is None or key[0] == server) and (sender is None or key[1] == sender):
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
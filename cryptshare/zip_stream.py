@@ -0,0 +1,202 @@
+import logging
+import os
+import struct
+import zlib
+
+logger = logging.getLogger(__name__)
+
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+CENTRAL_DIRECTORY_SIGNATURE = b"PK\x01\x02"
+END_OF_CENTRAL_DIRECTORY_SIGNATURE = b"PK\x05\x06"
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE = b"PK\x06\x06"
+RECORD_SIGNATURES = (
+    LOCAL_FILE_HEADER_SIGNATURE,
+    CENTRAL_DIRECTORY_SIGNATURE,
+    END_OF_CENTRAL_DIRECTORY_SIGNATURE,
+    ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE,
+)
+# Signatures of the records that can follow the data descriptor of an entry
+ZIP64_EXTRA_FIELD = 0x0001
+STORED = 0
+DEFLATED = 8
+FLAG_ENCRYPTED = 0x0001
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+ZIP_CHUNK_SIZE = 1024 * 1024
+# Maximum size of the chunks entries are decompressed in
+
+
+class CryptshareZipError(Exception):
+    """Raised when a ZIP stream is invalid, unsupported or contains unsafe paths"""
+
+
+def safe_entry_path(directory: str, name: str) -> str:
+    """Returns the path an archive entry is extracted to, rejecting names that would escape the directory
+
+    :param directory: The directory the archive is extracted into
+    :param name: The name of the entry in the archive
+    :return: The path of the entry inside the directory
+    """
+    parts = name.replace("\\", "/").split("/")
+    if name.startswith(("/", "\\")) or any(part == ".." or ":" in part for part in parts):
+        raise CryptshareZipError(f"Unsafe path in ZIP archive: {name}")
+    base = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(base, *[part for part in parts if part not in ("", ".")]))
+    if os.path.commonpath([base, path]) != base:
+        raise CryptshareZipError(f"Unsafe path in ZIP archive: {name}")
+    return path
+
+
+class CryptshareZipStream:
+    """Reads the entries of a ZIP archive from a stream of chunks, without seeking and without staging it on disk.
+
+    The entries are parsed from their local file headers as the archive arrives; the central directory at its end
+    is skipped. Iterating yields a (name, chunk iterator) tuple per entry. The chunk iterator yields the
+    decompressed content in chunks of at most `chunk_size` bytes and verifies its CRC-32 at the end; it has to be
+    consumed before the next entry is read. Only the unconsumed part of the last received chunk is buffered.
+    """
+
+    def __init__(self, chunks, chunk_size: int = ZIP_CHUNK_SIZE) -> None:
+        """
+        :param chunks: Iterator of the bytes of the archive, e.g. the iter_content of a streamed response
+        :param chunk_size: Maximum size of the decompressed chunks
+        """
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+        self.chunk_size = chunk_size
+
+    def _fill(self, size: int) -> bool:
+        """Receives chunks until the buffer holds at least `size` bytes, returns False at the end of the stream"""
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._buffer += chunk
+        return True
+
+    def _read(self, size: int) -> bytes:
+        if not self._fill(size):
+            raise CryptshareZipError("Unexpected end of ZIP stream")
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _read_available(self, size: int) -> bytes:
+        """Reads up to `size` bytes, receiving a chunk only if the buffer is empty"""
+        if not self._buffer and not self._fill(1):
+            raise CryptshareZipError("Unexpected end of ZIP stream")
+        data = bytes(self._buffer[:size])
+        del self._buffer[: len(data)]
+        return data
+
+    def __iter__(self):
+        while True:
+            if not self._fill(4):
+                return
+            signature = self._read(4)
+            if signature in (
+                CENTRAL_DIRECTORY_SIGNATURE,
+                END_OF_CENTRAL_DIRECTORY_SIGNATURE,
+                ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE,
+            ):
+                logger.debug("Reached the central directory of the ZIP stream")
+                for _ in self._chunks:
+                    pass
+                return
+            if signature != LOCAL_FILE_HEADER_SIGNATURE:
+                raise CryptshareZipError(f"Invalid ZIP entry signature: {signature!r}")
+            entry = self._read_entry()
+            yield entry
+            # Skip what the consumer did not read of the entry
+            for _ in entry[1]:
+                pass
+
+    def _read_entry(self) -> tuple:
+        _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length = struct.unpack(
+            "<HHHHHIIIHH", self._read(26)
+        )
+        raw_name = self._read(name_length)
+        extra = self._read(extra_length)
+        name = raw_name.decode("utf-8" if flags & FLAG_UTF8 else "cp437")
+        zip64_extra = self._find_zip64_extra(extra)
+        if compressed_size == 0xFFFFFFFF or size == 0xFFFFFFFF:
+            if zip64_extra is None or len(zip64_extra) < 16:
+                raise CryptshareZipError(f"Missing ZIP64 sizes of ZIP entry {name}")
+            size, compressed_size = struct.unpack("<QQ", zip64_extra[:16])
+        if flags & FLAG_ENCRYPTED:
+            raise CryptshareZipError(f"Encrypted ZIP entries are not supported: {name}")
+        if method == DEFLATED:
+            content = self._inflate()
+        elif method == STORED:
+            if flags & FLAG_DATA_DESCRIPTOR and compressed_size == 0 and not name.endswith("/"):
+                raise CryptshareZipError(f"Stored ZIP entry without size can't be streamed: {name}")
+            content = self._read_stored(compressed_size)
+        else:
+            raise CryptshareZipError(f"Unsupported compression method {method} of ZIP entry {name}")
+        logger.debug(f"Reading ZIP entry {name}")
+        return name, self._verified(content, name, crc, flags, zip64_extra is not None)
+
+    @staticmethod
+    def _find_zip64_extra(extra: bytes) -> [bytes, None]:
+        """Returns the data of the ZIP64 extra field of a local file header, None if it has none"""
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, length = struct.unpack("<HH", extra[position : position + 4])
+            if header_id == ZIP64_EXTRA_FIELD:
+                return extra[position + 4 : position + 4 + length]
+            position += 4 + length
+        return None
+
+    def _read_stored(self, size: int):
+        remaining = size
+        while remaining:
+            data = self._read_available(min(remaining, self.chunk_size))
+            remaining -= len(data)
+            yield data
+
+    def _inflate(self):
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        while not decompressor.eof:
+            data = decompressor.unconsumed_tail or self._read_available(self.chunk_size)
+            output = decompressor.decompress(data, self.chunk_size)
+            if output:
+                yield output
+        # Bytes received beyond the end of the deflate stream belong to the next record
+        self._buffer[:0] = decompressor.unused_data
+
+    def _read_data_descriptor(self, name: str, size: int, zip64: bool) -> int:
+        """Reads the data descriptor following the content of an entry, returns the CRC-32 it records
+
+        The sizes in the descriptor take 8 bytes each if the local file header has a ZIP64 extra field, 4 bytes
+        otherwise. A layout is only accepted if its uncompressed size matches the content and it is followed by
+        the next record of the archive or the end of the stream. Writers not following the spec are covered by
+        trying the other layout as well; if neither matches, the stream can't be parsed reliably.
+        """
+        self._fill(4)
+        if self._buffer[:4] == DATA_DESCRIPTOR_SIGNATURE:
+            self._read(4)
+        layouts = [(20, "<IQQ"), (12, "<III")]
+        for length, layout in layouts if zip64 else reversed(layouts):
+            complete = self._fill(length + 4)
+            if len(self._buffer) < length:
+                continue
+            crc, _, recorded_size = struct.unpack(layout, self._buffer[:length])
+            following = bytes(self._buffer[length : length + 4])
+            if recorded_size == size and (following in RECORD_SIGNATURES or (not complete and not following)):
+                del self._buffer[:length]
+                return crc
+        raise CryptshareZipError(f"Invalid data descriptor of ZIP entry {name}")
+
+    def _verified(self, content, name: str, crc: int, flags: int, zip64: bool):
+        """Passes the content of an entry through, verifying its CRC-32 and skipping its data descriptor"""
+        actual = 0
+        size = 0
+        for data in content:
+            actual = zlib.crc32(data, actual)
+            size += len(data)
+            yield data
+        if flags & FLAG_DATA_DESCRIPTOR:
+            crc = self._read_data_descriptor(name, size, zip64)
+        if actual != crc:
+            raise CryptshareZipError(f"CRC-32 mismatch of ZIP entry {name}")
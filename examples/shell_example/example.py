@@ -53,6 +53,13 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--zip", action="store_true", default=False, help="RECEIVE the Transfer as a .zip-File.", required=False
     )
+    parser.add_argument(
+        "--unzip",
+        action="store_true",
+        default=False,
+        help="RECEIVE the Transfer as a .zip-File and extract it while it is downloaded.",
+        required=False,
+    )
     parser.add_argument(
         "--eml", action="store_true", default=False, help="RECEIVE the Transfer as a .eml-File.", required=False
     )
@@ -155,6 +162,7 @@ def main() -> None:
                 inputs.download_url,
                 download_zip=inputs.zip,
                 download_eml=inputs.eml,
+                extract_zip=inputs.unzip,
             )
             return
 
@@ -168,6 +176,7 @@ def main() -> None:
             save_path,
             download_zip=inputs.zip,
             download_eml=inputs.eml,
+            extract_zip=inputs.unzip,
         )
         return
     elif inputs.mode == "status":
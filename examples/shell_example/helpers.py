@@ -131,25 +131,6 @@ class ShellCryptshareValidators(CryptshareValidators):
         return True
 
 
-class ShellCryptshareTransfer(CryptshareTransfer):
-    def upload_file(self, path: str, cryptshare_client: CryptshareClient = None):
-        self._cryptshare_client = cryptshare_client if cryptshare_client else self._cryptshare_client
-        # Update transfer's cryptshare client, if provided
-
-        if not self._session_is_open:
-            logger.error("Cryptshare Transfer Session is not open, can't upload file")
-            return None
-
-        url = f"{self.get_transfer_session_url()}/files"
-        logger.debug(f"Uploading file {path} to {url}")
-
-        file = ShellTransferFile(path, self.tracking_id, self._cryptshare_client)
-        file.announce_upload()
-        file.upload_file_content()
-        self.files.append(file)
-        return file
-
-
 def questionary_ask_for_sender(default_sender_email: str, default_sender_name: str, default_sender_phone: str) -> tuple:
     if default_sender_email is None or not ShellCryptshareValidators.is_valid_email_or_blank(default_sender_email):
         default_sender_email = ""
@@ -206,62 +187,34 @@ class ShellTransferFile(TransferFile):
         print(f"Checksum for {self.name}: {self.checksum}")
 
     def upload_file_content(self):
-        upload_url = f"{self.transfer_session_url}/files/{self._file_id}/content"
-        logger.info(f"Uploading file {self.name} content to {upload_url}")
-
-        with open(self.path, "rb") as f:
-            with tqdm(total=self.size, unit="B", unit_scale=True, unit_divisor=1024) as t:
-                wrapped_file = CallbackIOWrapper(t.update, f, "read")
-                self._request(
-                    "PUT",
-                    upload_url,
-                    data=wrapped_file,
-                    verify=self._cryptshare_client.ssl_verify,
-                    headers=self._cryptshare_client.header.request_header,
-                    handle_response=False,
-                )
-        return True
+        with tqdm(total=self.size, unit="B", unit_scale=True, unit_divisor=1024) as self._progress_bar:
+            return super(ShellTransferFile, self).upload_file_content()
+
+    def content_reader(self, handle):
+        return CallbackIOWrapper(self._progress_bar.update, handle, "read")
+
+
+class ShellCryptshareTransfer(CryptshareTransfer):
+    """Transfer uploading its files with a tqdm progress bar"""
+
+    transfer_file_class = ShellTransferFile
 
 
 class ShellCryptshareDownload(CryptshareDownload):
     """A class to download files from a Cryptshare server with a progress bar."""
 
-    def download_file(self, url: str, filename: str, directory: str, size: int = None) -> None:
+    def download_file(self, url: str, filename: str, directory: str, size: int = None, callback=None, **kwargs):
         """Download a file from an URL to the given directory"""
-        response = self._request(
-            "GET",
-            url,
-            stream=True,
-            verify=self._cryptshare_client.ssl_verify,
-            headers=self._cryptshare_client.header.request_header,
-        )
-        full_path = os.path.join(directory, filename)
-        os.makedirs(directory, exist_ok=True)
-        with open(full_path, "wb") as handle:
-            for data in tqdm(
-                response.iter_content(),
-                desc=filename,
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-                total=size,
-            ):
-                handle.write(data)
-
-    def download_transfer_file(self, file, directory) -> None:
-        response = self._request("GET", self.server + file["href"], stream=True)
-        full_path = os.path.join(directory, file["fileName"])
-        os.makedirs(directory, exist_ok=True)
-        with open(full_path, "wb") as handle:
-            for data in tqdm(
-                response.iter_content(),
-                desc=file["fileName"],
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-                total=int(file["size"]),
-            ):
-                handle.write(data)
+        with tqdm(
+            desc=filename, unit="B", unit_scale=True, unit_divisor=1024, total=int(size) if size else None
+        ) as progress:
+
+            def update(offset: int) -> None:
+                progress.update(offset - progress.n)
+                if callback is not None:
+                    callback(offset)
+
+            return super().download_file(url, filename, directory, size=size, callback=update, **kwargs)
 
 
 def send_password_with_twilio(tracking_id: str, password: str, recipient_sms: str, recipient_email: str = None) -> None:
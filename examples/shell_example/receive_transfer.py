@@ -6,7 +6,13 @@ from cryptshare import CryptshareClient
 
 
 def receive_transfer(
-    dl_server, recipient_transfer_id, password, save_path, download_zip: bool = False, download_eml: bool = False
+    dl_server,
+    recipient_transfer_id,
+    password,
+    save_path,
+    download_zip: bool = False,
+    download_eml: bool = False,
+    extract_zip: bool = False,
 ) -> None:
     """
     Downloads a transfer from a Cryptshare server.
@@ -18,6 +24,7 @@ def receive_transfer(
     save_path (str): The path where the downloaded files should be saved.
     zip (bool): Download the transfer as a zip file.
     eml (bool): Download the transfer as an eml file (if it contains a confidential message).
+    extract_zip (bool): Download the transfer as a zip file and extract it while it is received.
 
     Returns:
     None
@@ -45,4 +52,18 @@ def receive_transfer(
         print(f"Downloaded Transfer {recipient_transfer_id} as zip file  to {directory} complete.")
         return
 
-    download.download_all_files(directory)
+    if extract_zip:
+        results = list(download.extract_zip_file(directory))
+        print(f"Extracted {len(results)} files of Transfer {recipient_transfer_id} to {directory}.")
+        return
+
+    # Files downloaded by an earlier run are only downloaded again if they changed
+    results = download.sync(directory, max_workers=4)
+    failed = [result for result in results if not result.success]
+    skipped = [result for result in results if result.skipped]
+    for result in failed:
+        print(f"Failed to download {result.file_name}: {result.error}")
+    print(
+        f"Downloaded {len(results) - len(failed) - len(skipped)} of {len(results)} files of Transfer "
+        f"{recipient_transfer_id} to {directory}, {len(skipped)} files were up to date."
+    )
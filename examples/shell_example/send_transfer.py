@@ -89,7 +89,7 @@ def send_transfer(
     if transfer_password == "NO_PASSWORD_MODE":
         transfer_security_mode = CryptshareTransferSecurityMode(mode=OneTimePaswordSecurityModes.NONE)
     elif transfer_password == "" or transfer_password is None:
-        transfer_password = cryptshare_client.get_password()
+        transfer_password = cryptshare_client.generate_password()
         if not show_generated_pasword:
             print("Generated Password to receive Files will be sent via SMS.")
         else:
@@ -100,7 +100,7 @@ def send_transfer(
                 )
         transfer_security_mode = CryptshareTransferSecurityMode(password=transfer_password)
     else:
-        passwort_validated_response = cryptshare_client.validate_password(transfer_password)
+        passwort_validated_response = cryptshare_client.check_password(transfer_password)
         valid_password = passwort_validated_response.get("valid")
         if not valid_password:
             print("Passwort is not valid.")
@@ -222,7 +222,7 @@ def send_transfer_interactive(
             )
 
             if transfer_password == "" or transfer_password is None and allow_generated_password:
-                transfer_password = cryptshare_client.get_password()
+                transfer_password = cryptshare_client.generate_password()
                 if not show_generated_pasword:
                     print("Generated Password to receive Files will be sent via SMS.")
                 else:
@@ -234,7 +234,7 @@ def send_transfer_interactive(
                 transfer_security_mode = CryptshareTransferSecurityMode(password=transfer_password)
                 is_valid_password = True
             else:
-                passwort_validated_response = cryptshare_client.validate_password(transfer_password)
+                passwort_validated_response = cryptshare_client.check_password(transfer_password)
                 is_valid_password = passwort_validated_response.get("valid", False)
                 if not is_valid_password:
                     print("Passwort is not valid.")
@@ -244,7 +244,7 @@ def send_transfer_interactive(
                     print("Password to receive Files will be sent via SMS.")
 
     if seleced_security_mode == "Generated" and allow_generated_password:
-        transfer_password = cryptshare_client.get_password()
+        transfer_password = cryptshare_client.generate_password()
         if not show_generated_pasword:
             print("Generated Password to receive Files will be sent via SMS.")
         else:
@@ -209,6 +209,1367 @@ class TestCryptshareTransferSettings(unittest.TestCase):
         )
 
 
+class TestCryptshareSession(unittest.TestCase):
+    def test_shared_session(self):
+        from cryptshare.download import CryptshareDownload
+
+        with CryptshareClient("https://example.com", pool_maxsize=4, keep_alive=False) as client:
+            session = client.session
+            self.assertIs(client.session, session)
+            self.assertEqual(session.get_adapter("https://example.com")._pool_maxsize, 4)
+            self.assertEqual(session.headers.get("Connection"), "close")
+            download = CryptshareDownload(client, "1234567890", "password")
+            self.assertIs(download.session, session)
+        self.assertIsNone(client._session)
+
+    def test_shared_async_session(self):
+        import asyncio
+
+        from cryptshare.async_client import AsyncCryptshareClient
+
+        async def run():
+            async with AsyncCryptshareClient("https://example.com") as client:
+                download = client.download_transfer("1234567890", "password")
+                self.assertIs(download.async_session, client.async_session)
+            self.assertIsNone(client._async_session)
+
+        asyncio.run(run())
+
+    def test_async_download_file(self):
+        import asyncio
+        import hashlib
+        import tempfile
+
+        import httpx
+
+        from cryptshare.async_client import AsyncCryptshareClient
+        from cryptshare.download import CryptshareChecksumError, write_part_state
+
+        content = os.urandom(10000)
+        ranges = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            ranges.append(request.headers.get("Range"))
+            if request.headers.get("Range"):
+                start = int(request.headers["Range"][6:-1])
+                headers = {"Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}"}
+                return httpx.Response(206, content=content[start:], headers=headers)
+            return httpx.Response(200, content=content)
+
+        async def run(directory: str):
+            async with AsyncCryptshareClient("https://example.com") as client:
+                client._async_session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+                download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+                file = {"fileName": "a.bin", "size": len(content), "href": "/files/a", "checksum": checksum}
+                result = await download.download_transfer_file(file, directory)
+                self.assertTrue(result.verified)
+                self.assertEqual((result.file_name, result.size), ("a.bin", len(content)))
+
+                # An interrupted download is continued with a Range request
+                with open(os.path.join(directory, "b.bin.part"), "wb") as handle:
+                    handle.write(content[:4000])
+                write_part_state(os.path.join(directory, "b.bin.part"), 4000, len(content))
+                result = await download.download_transfer_file(file | {"fileName": "b.bin"}, directory)
+                self.assertTrue(result.verified)
+                self.assertEqual(ranges, [None, "bytes=4000-"])
+
+                with self.assertRaises(CryptshareChecksumError):
+                    await download.download_transfer_file(file | {"fileName": "c.bin", "checksum": "00"}, directory)
+
+                result = await download.download_zip_file(directory)
+                self.assertEqual(result.path, os.path.join(directory, "20240522-065711-H8UoUSI6.zip"))
+
+        checksum = hashlib.sha256(content).hexdigest()
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(directory))
+            for name in ("a.bin", "b.bin", "20240522-065711-H8UoUSI6.zip"):
+                with open(os.path.join(directory, name), "rb") as handle:
+                    self.assertEqual(handle.read(), content)
+            self.assertFalse(os.path.exists(os.path.join(directory, "c.bin.part")))
+            self.assertFalse(os.path.exists(os.path.join(directory, "c.bin")))
+
+    def test_async_status_workers_share_pool(self):
+        import asyncio
+        from unittest import mock
+
+        from cryptshare.async_client import AsyncCryptshareClient
+
+        client = AsyncCryptshareClient("https://example.com", pool_maxsize=2)
+        running = []
+        peak = []
+
+        async def get_transfer_status(tracking_id: str) -> dict:
+            running.append(tracking_id)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(tracking_id)
+            return {"status": {}}
+
+        async def run():
+            transfers = [{"trackingId": f"20240522-065711-H8UoUSI{index}"} for index in range(6)]
+            with mock.patch.object(client, "get_transfer_status", side_effect=get_transfer_status):
+                return [status async for status in client.iter_transfer_status(8, transfers)]
+
+        self.assertEqual(len(asyncio.run(run())), 6)
+        self.assertEqual(max(peak), 2)
+        client.close()
+
+    def test_async_download_methods(self):
+        import inspect
+
+        from cryptshare.async_client import AsyncCryptshareClient
+
+        client = AsyncCryptshareClient("https://example.com")
+        download = client.download_transfer("1234567890", "password")
+        # Methods sending no request themselves
+        helpers = {"check_stream_response", "close", "create_async_session", "create_session", "download_zip_info"}
+        for name, method in inspect.getmembers(download, inspect.ismethod):
+            if name.startswith("_") or name in helpers or inspect.iscoroutinefunction(method):
+                continue
+            with self.assertRaises(TypeError, msg=name):
+                method("transfers")
+        client.close()
+
+
+class TestCryptshareTransfer(unittest.TestCase):
+    def test_upload_workers_share_pool(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+
+        from cryptshare.transfer import CryptshareTransfer
+
+        client = CryptshareClient("http://example.com", pool_maxsize=4)
+        transfer = CryptshareTransfer(mock.Mock(), cryptshare_client=client)
+        transfer._session_is_open = True
+        paths = [f"{index}.txt" for index in range(8)]
+        with mock.patch.object(transfer, "_upload_transfer_file", side_effect=lambda path: path), mock.patch(
+            "cryptshare.transfer.ThreadPoolExecutor", wraps=ThreadPoolExecutor
+        ) as executor:
+            self.assertEqual(transfer.upload_files(paths, max_workers=8), paths)
+        self.assertEqual(executor.call_args.kwargs["max_workers"], 4)
+        client.close()
+
+
+class TestCryptshareRetryPolicy(unittest.TestCase):
+    def test_parse_retry_after(self):
+        from datetime import timezone
+
+        from cryptshare.retry import parse_retry_after
+
+        now = datetime(2024, 5, 22, 12, 0, 0, tzinfo=timezone.utc)
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertEqual(parse_retry_after("Wed, 22 May 2024 12:00:30 GMT", now=now), 30.0)
+        self.assertEqual(parse_retry_after("Wed, 22 May 2024 11:00:00 GMT", now=now), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_retry_decisions(self):
+        from cryptshare.retry import CryptshareRetryPolicy
+
+        policy = CryptshareRetryPolicy(max_retries=2, retry_budget=10)
+        self.assertTrue(policy.is_retryable_status("GET", 503))
+        self.assertTrue(policy.is_retryable_status("POST", 429))
+        self.assertFalse(policy.is_retryable_status("POST", 500))
+        self.assertTrue(policy.is_retryable_status("POST", 500, idempotent=True))
+        self.assertFalse(policy.is_retryable_status("GET", 404))
+        self.assertEqual(policy.get_delay(0, 0, retry_after="3"), 3.0)
+        self.assertIsNone(policy.get_delay(0, 8, retry_after="3"))
+        self.assertIsNone(policy.get_delay(2, 0))
+        self.assertLessEqual(policy.get_delay(1, 0), 1.0)
+
+    def test_request_retries(self):
+        import io
+        from unittest import mock
+
+        import requests
+
+        from cryptshare.retry import NO_RETRY, CryptshareRetryPolicy
+
+        def response(status_code: int, content: bytes = b"", retry_after: str = None) -> requests.Response:
+            resp = requests.Response()
+            resp.status_code = status_code
+            resp._content = content
+            resp.raw = io.BytesIO(content)
+            if retry_after is not None:
+                resp.headers["Retry-After"] = retry_after
+            return resp
+
+        client = CryptshareClient("https://example.com")
+        client.retry_policy = CryptshareRetryPolicy(max_retries=2, retry_budget=10)
+        url = "https://example.com/api/clients"
+        with mock.patch.object(client.session, "request") as request, mock.patch("time.sleep") as sleep:
+            request.side_effect = [
+                response(429, retry_after="2"),
+                response(503, retry_after="1"),
+                response(200, b'{"data": {"clientId": "abc"}}'),
+            ]
+            self.assertEqual(client._request("GET", url), {"clientId": "abc"})
+            self.assertEqual(request.call_count, 3)
+            self.assertEqual([call.args[0] for call in sleep.call_args_list], [2.0, 1.0])
+
+            # A POST is only repeated on 429, the server may have processed it before answering 503
+            request.reset_mock()
+            request.side_effect = [response(503, retry_after="1")]
+            client._request("POST", url, handle_response=False)
+            self.assertEqual(request.call_count, 1)
+
+            # File-like bodies are rewound for every attempt
+            bodies = []
+            request.reset_mock()
+            request.side_effect = lambda method, url, data, **kwargs: (
+                bodies.append(data.read()) or response(429 if len(bodies) == 1 else 204)
+            )
+            client._request("PUT", url, data=io.BytesIO(b"content"))
+            self.assertEqual(bodies, [b"content", b"content"])
+
+            # The retry budget is not exceeded to follow a long Retry-After
+            request.reset_mock()
+            request.side_effect = [response(503, retry_after="60")]
+            self.assertEqual(client._request("GET", url, handle_response=False).status_code, 503)
+            self.assertEqual(request.call_count, 1)
+
+            # Assigning a policy changes the retries of the following calls
+            client.retry_policy = NO_RETRY
+            request.reset_mock()
+            request.side_effect = [response(503, retry_after="1")]
+            self.assertEqual(client._request("GET", url, handle_response=False).status_code, 503)
+            self.assertEqual(request.call_count, 1)
+        client.close()
+
+
+class TestCryptshareRateLimiter(unittest.TestCase):
+    def test_token_bucket(self):
+        from cryptshare.rate_limiter import CryptshareTokenBucket
+
+        bucket = CryptshareTokenBucket(rate=2, capacity=2)
+        bucket.timestamp = 0
+        self.assertEqual(bucket.reserve(0), 0)
+        self.assertEqual(bucket.reserve(0), 0)
+        self.assertEqual(bucket.reserve(0), 0.5)
+        self.assertEqual(bucket.reserve(0), 1.0)
+        self.assertEqual(bucket.reserve(10), 0)
+
+    def test_rate_limiter(self):
+        import tempfile
+
+        from cryptshare.rate_limiter import BULK_BUCKET, CryptshareRateLimiter
+
+        first = CryptshareClient("https://example.com", rate_limiter=True)
+        second = CryptshareClient("https://example.com", rate_limiter=True)
+        self.assertIs(first.rate_limiter, second.rate_limiter)
+        self.assertIsNone(CryptshareClient("https://example.com").rate_limiter)
+        self.assertEqual(CryptshareRateLimiter.get_bucket("PUT"), BULK_BUCKET)
+        self.assertEqual(CryptshareRateLimiter.get_bucket("GET", stream=True), BULK_BUCKET)
+
+        with tempfile.TemporaryDirectory() as directory:
+            lock_file = os.path.join(directory, "rate_limit.lock")
+            limiter = CryptshareRateLimiter(bulk_rate=1, bulk_burst=1, lock_file=lock_file)
+            other_process_limiter = CryptshareRateLimiter(bulk_rate=1, bulk_burst=1, lock_file=lock_file)
+            self.assertEqual(limiter.reserve(BULK_BUCKET), 0)
+            self.assertGreater(other_process_limiter.reserve(BULK_BUCKET), 0.9)
+            statistics = other_process_limiter.statistics()[BULK_BUCKET]
+            self.assertEqual(statistics["requests"], 1)
+            self.assertEqual(statistics["waited_requests"], 1)
+            self.assertEqual(statistics["max_wait"], statistics["mean_wait"])
+
+    def test_rate_limiter_processes(self):
+        import subprocess
+        import sys
+        import tempfile
+
+        from cryptshare.rate_limiter import BULK_BUCKET, CryptshareRateLimiter, fcntl
+
+        if fcntl is None:
+            self.skipTest("File locking is not supported on this platform")
+        code = (
+            "import sys\n"
+            "from cryptshare.rate_limiter import CryptshareRateLimiter\n"
+            "limiter = CryptshareRateLimiter(bulk_rate=0.01, bulk_burst=2, lock_file=sys.argv[1])\n"
+            "print(limiter.reserve('bulk'))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as directory:
+            lock_file = os.path.join(directory, "rate_limit.lock")
+            processes = [
+                subprocess.Popen([sys.executable, "-c", code, lock_file], cwd=root, stdout=subprocess.PIPE, text=True)
+                for _ in range(5)
+            ]
+            waits = sorted(float(process.communicate(timeout=60)[0]) for process in processes)
+            # The burst is shared: only two of the concurrent processes may send at once, each further one waits
+            self.assertEqual(waits[:2], [0.0, 0.0])
+            for previous, wait in zip(waits[1:], waits[2:]):
+                self.assertAlmostEqual(wait - previous, 100, delta=1)
+            limiter = CryptshareRateLimiter(bulk_rate=0.01, bulk_burst=2, lock_file=lock_file)
+            self.assertGreater(limiter.reserve(BULK_BUCKET), waits[-1])
+
+
+class TestCryptshareJsonCodec(unittest.TestCase):
+    def test_json_codecs(self):
+        import requests
+
+        from cryptshare.json_codec import CryptshareJsonCodec, get_default_json_codec
+
+        for codec in [CryptshareJsonCodec(), get_default_json_codec()]:
+            client = CryptshareClient("https://example.com", json_codec=codec)
+            self.assertEqual(codec.loads(codec.dumps({"name": "Ä", "size": 1})), {"name": "Ä", "size": 1})
+
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"data": [{"fileName": "test_file.txt"}]}'
+            self.assertEqual(client._handle_response(response), [{"fileName": "test_file.txt"}])
+            response._content = b""
+            self.assertIsNone(client._handle_response(response))
+            response.status_code = 404
+            response._content = b'{"errorCode": 1, "errorMessage": "Not found"}'
+            with self.assertRaises(requests.HTTPError):
+                client._handle_response(response)
+
+
+class TestCryptshareChecksum(unittest.TestCase):
+    def test_calculate_file_checksum(self):
+        import hashlib
+        import tempfile
+        import tracemalloc
+
+        from cryptshare.checksum import (
+            calculate_file_checksum,
+            get_hashlib_algorithm,
+            update_file_digest,
+        )
+
+        self.assertEqual(get_hashlib_algorithm(), "sha256")
+        self.assertEqual(get_hashlib_algorithm("SHA-512"), "sha512")
+        self.assertEqual(get_hashlib_algorithm("SHA3-256"), "sha3_256")
+        self.assertEqual(get_hashlib_algorithm("sha3_512"), "sha3_512")
+        self.assertEqual(get_hashlib_algorithm("MD5"), "md5")
+        with self.assertRaises(ValueError):
+            get_hashlib_algorithm("CRC-0")
+
+        with tempfile.NamedTemporaryFile(delete=False) as handle:
+            content = os.urandom(1024 * 1024) * 16
+            handle.write(content)
+        try:
+            tracemalloc.start()
+            checksum = calculate_file_checksum(handle.name)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertEqual(checksum, hashlib.sha256(content).hexdigest())
+            self.assertLess(peak, 4 * 1024 * 1024)
+            self.assertEqual(calculate_file_checksum(handle.name, "SHA-512"), hashlib.sha512(content).hexdigest())
+            prefix_digest = update_file_digest(hashlib.sha256(), handle.name, 1234567, chunk_size=1000)
+            self.assertEqual(prefix_digest.hexdigest(), hashlib.sha256(content[:1234567]).hexdigest())
+        finally:
+            os.remove(handle.name)
+
+    def test_iter_file_checksums(self):
+        import hashlib
+        import tempfile
+
+        from cryptshare.checksum import iter_file_checksums
+
+        with tempfile.TemporaryDirectory() as directory:
+            expected = {}
+            for i in range(4):
+                path = os.path.join(directory, f"file_{i}.bin")
+                content = os.urandom(1024 * i)
+                with open(path, "wb") as handle:
+                    handle.write(content)
+                expected[path] = hashlib.sha256(content).hexdigest()
+            self.assertEqual(dict(iter_file_checksums(list(expected), max_workers=2)), expected)
+
+            missing = os.path.join(directory, "missing.bin")
+            results = dict(iter_file_checksums([missing], max_workers=1, return_exceptions=True))
+            self.assertIsInstance(results[missing], FileNotFoundError)
+            with self.assertRaises(FileNotFoundError):
+                list(iter_file_checksums([missing], max_workers=1))
+
+    def test_checksum_cache(self):
+        import hashlib
+        import tempfile
+
+        from cryptshare.checksum import CryptshareChecksumCache, iter_file_checksums
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CryptshareChecksumCache(os.path.join(directory, "checksums.sqlite"), max_entries=2)
+            paths = []
+            for i in range(3):
+                path = os.path.join(directory, f"file_{i}.bin")
+                with open(path, "wb") as handle:
+                    handle.write(os.urandom(1024))
+                paths.append(path)
+
+            self.assertIsNone(cache.get(paths[0]))
+            checksum = cache.calculate_file_checksum(paths[0])
+            self.assertEqual(cache.get(paths[0]), checksum)
+            self.assertIsNone(cache.get(paths[0], "SHA-512"))
+
+            with open(paths[0], "ab") as handle:
+                handle.write(b"changed")
+            self.assertIsNone(cache.get(paths[0]))
+
+            results = dict(iter_file_checksums(paths, max_workers=1, cache=cache))
+            with open(paths[2], "rb") as handle:
+                self.assertEqual(results[paths[2]], hashlib.sha256(handle.read()).hexdigest())
+            self.assertEqual(len(cache), 2)
+            cache.close()
+
+    def test_checksum_cache_batch(self):
+        import sqlite3
+        import tempfile
+
+        from cryptshare.checksum import CryptshareChecksumCache
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "checksums.sqlite")
+            cache = CryptshareChecksumCache(database, max_entries=3)
+            other_process = sqlite3.connect(database)
+            with cache.batch():
+                for i in range(5):
+                    path = os.path.join(directory, f"file_{i}.bin")
+                    with open(path, "wb") as handle:
+                        handle.write(os.urandom(1024))
+                    cache.calculate_file_checksum(path)
+                    cache.calculate_file_checksum(path)
+                # Not committed yet, other connections don't see the entries
+                self.assertEqual(other_process.execute("SELECT COUNT(*) FROM checksums").fetchone()[0], 0)
+            self.assertEqual(other_process.execute("SELECT COUNT(*) FROM checksums").fetchone()[0], 3)
+            self.assertEqual(cache._count, 3)
+            other_process.close()
+
+            # A cache passed to a client is not closed with the client
+            client = CryptshareClient("https://example.com", checksum_cache=cache)
+            client.close()
+            self.assertEqual(len(cache), 3)
+            cache.close()
+
+
+class TestCryptshareDownload(unittest.TestCase):
+    def test_parse_content_range(self):
+        from cryptshare.download import parse_content_range
+
+        self.assertEqual(parse_content_range("bytes 0-99/1000"), (0, 99, 1000))
+        self.assertEqual(parse_content_range("bytes 100-199/*"), (100, 199, None))
+        self.assertIsNone(parse_content_range("bytes */1000"))
+        self.assertIsNone(parse_content_range("items 0-1/2"))
+        self.assertIsNone(parse_content_range(None))
+
+    def test_part_state(self):
+        import tempfile
+
+        from cryptshare.download import (
+            read_part_offset,
+            remove_part_state,
+            write_part_state,
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            part_path = os.path.join(directory, "file.bin.part")
+            self.assertEqual(read_part_offset(part_path, 100), 0)
+            with open(part_path, "wb") as handle:
+                handle.write(b"x" * 60)
+            write_part_state(part_path, 50, 100)
+            self.assertEqual(read_part_offset(part_path, 100), 50)
+            self.assertEqual(read_part_offset(part_path, 200), 0)
+            write_part_state(part_path, 80, 100)
+            self.assertEqual(read_part_offset(part_path, 100), 60)
+            remove_part_state(part_path)
+            self.assertEqual(read_part_offset(part_path, 100), 0)
+
+    def test_manifest(self):
+        import tempfile
+
+        from cryptshare.download import read_manifest, write_manifest
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(read_manifest(directory), {"files": {}})
+            manifest = {"transferId": "abc", "files": {"a.txt": {"size": 1, "mtime_ns": 2, "checksum": "ff"}}}
+            write_manifest(directory, manifest)
+            self.assertEqual(read_manifest(directory), manifest)
+
+    def test_download_empty_file(self):
+        import hashlib
+        import tempfile
+        from unittest import mock
+
+        client = CryptshareClient("http://example.com")
+        download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+        file = {"fileName": "empty.txt", "size": 0, "href": "/api/transfers/20240522-065711-H8UoUSI6/files/empty"}
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(download, "_request") as request:
+            for checksum in (None, hashlib.sha256(b"").hexdigest()):
+                result = download.download_transfer_file(file | {"checksum": checksum}, directory)
+                self.assertEqual(result.size, 0)
+                self.assertEqual(result.verified, checksum is not None)
+                with open(os.path.join(directory, "empty.txt"), "rb") as handle:
+                    self.assertEqual(handle.read(), b"")
+                self.assertEqual(os.listdir(directory), ["empty.txt"])
+            request.assert_not_called()
+        client.close()
+
+    def test_safe_file_path(self):
+        from cryptshare.download import MANIFEST_FILE_NAME, safe_file_path
+
+        directory = os.path.realpath("transfers")
+        self.assertEqual(safe_file_path(directory, "a.txt"), os.path.join(directory, "a.txt"))
+        for name in ("../a.txt", "/etc/passwd", "", ".", "a/", MANIFEST_FILE_NAME):
+            with self.assertRaises(ValueError):
+                safe_file_path(directory, name)
+
+    def test_sync(self):
+        import hashlib
+        import tempfile
+        from unittest import mock
+
+        from cryptshare.download import read_manifest, write_manifest
+
+        server_files = {"a.txt": b"a" * 1000, "b.txt": b"b" * 2000}
+        requested = []
+
+        def files_info():
+            return [
+                {
+                    "fileName": name,
+                    "size": len(content),
+                    "checksum": hashlib.sha256(content).hexdigest(),
+                    "href": f"/api/transfers/20240522-065711-H8UoUSI6/files/{name}",
+                }
+                for name, content in server_files.items()
+            ]
+
+        def request(method, url, **kwargs):
+            name = url.rsplit("/", 1)[1]
+            requested.append(name)
+            response = mock.MagicMock(status_code=200, headers={})
+            response.iter_content.return_value = [server_files[name]]
+            return response
+
+        client = CryptshareClient("http://example.com")
+        download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+        with tempfile.TemporaryDirectory() as root, mock.patch.object(
+            download, "download_files_info", side_effect=files_info
+        ), mock.patch.object(download, "_request", side_effect=request):
+            directory = os.path.join(root, "transfer")
+            results = download.sync(directory)
+            self.assertEqual(sorted(requested), ["a.txt", "b.txt"])
+            self.assertTrue(all(result.success and not result.skipped for result in results))
+
+            # Unchanged files are skipped without a request
+            requested.clear()
+            results = download.sync(directory)
+            self.assertEqual(requested, [])
+            self.assertTrue(all(result.skipped for result in results))
+
+            # A changed file is downloaded again
+            server_files["b.txt"] = b"c" * 2000
+            results = download.sync(directory)
+            self.assertEqual(requested, ["b.txt"])
+            with open(os.path.join(directory, "b.txt"), "rb") as handle:
+                self.assertEqual(handle.read(), server_files["b.txt"])
+
+            # Files removed from the Transfer are only deleted with delete=True
+            del server_files["a.txt"]
+            download.sync(directory)
+            self.assertTrue(os.path.exists(os.path.join(directory, "a.txt")))
+            download.sync(directory, delete=True)
+            self.assertFalse(os.path.exists(os.path.join(directory, "a.txt")))
+            self.assertEqual(list(read_manifest(directory)["files"]), ["b.txt"])
+
+            # Names escaping the directory are neither deleted nor downloaded
+            outside = os.path.join(root, "outside.txt")
+            with open(outside, "wb") as handle:
+                handle.write(b"outside")
+            manifest = read_manifest(directory)
+            manifest["files"]["../outside.txt"] = {"size": 7}
+            write_manifest(directory, manifest)
+            server_files["../escaped.txt"] = b"escaped"
+            requested.clear()
+            results = download.sync(directory, delete=True)
+            self.assertTrue(os.path.exists(outside))
+            self.assertFalse(os.path.exists(os.path.join(root, "escaped.txt")))
+            self.assertEqual(requested, [])
+            self.assertEqual([result.file_name for result in results if not result.success], ["../escaped.txt"])
+        client.close()
+
+    def test_extract_zip_file(self):
+        import struct
+        import tempfile
+        import zlib
+        from unittest import mock
+
+        from cryptshare.zip_stream import CryptshareZipError
+
+        def local_entry(name: str, content: bytes, deflate: bool) -> bytes:
+            # Stored entries with sizes in the header, deflated entries with a data descriptor, like Java writes them
+            name = name.encode()
+            crc = zlib.crc32(content)
+            if not deflate:
+                header = struct.pack(
+                    "<4sHHHHHIIIHH", b"PK\x03\x04", 20, 0, 0, 0, 0, crc, *[len(content)] * 2, len(name), 0
+                )
+                return header + name + content
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            data = compressor.compress(content) + compressor.flush()
+            header = struct.pack("<4sHHHHHIIIHH", b"PK\x03\x04", 20, 0x08, 8, 0, 0, 0, 0, 0, len(name), 0)
+            return header + name + data + struct.pack("<4sIII", b"PK\x07\x08", crc, len(data), len(content))
+
+        def response(entries: list) -> mock.MagicMock:
+            data = b"".join(local_entry(*entry) for entry in entries) + b"PK\x05\x06" + bytes(18)
+            streamed = mock.MagicMock(status_code=200)
+            streamed.iter_content.side_effect = lambda chunk_size: (
+                data[i : i + 1000] for i in range(0, len(data), 1000)
+            )
+            return streamed
+
+        files = {"a.txt": b"hello" * 1000, "directory/b.bin": os.urandom(5000), "c.txt": b"stored"}
+        client = CryptshareClient("http://example.com")
+        download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+        with tempfile.TemporaryDirectory() as root:
+            directory = os.path.join(root, "transfer")
+            entries = [(name, content, name != "c.txt") for name, content in files.items()]
+            with mock.patch.object(download, "_request", return_value=response(entries)) as request:
+                results = list(download.extract_zip_file(directory))
+            self.assertTrue(request.call_args.args[1].startswith("http://example.com/api/transfers/"))
+            self.assertEqual([result.file_name for result in results], list(files))
+            for name, content in files.items():
+                with open(os.path.join(directory, name), "rb") as handle:
+                    self.assertEqual(handle.read(), content)
+
+            entries = [("d.txt", b"first", True), ("../escaped.txt", b"outside", True)]
+            with mock.patch.object(download, "_request", return_value=response(entries)):
+                with self.assertRaises(CryptshareZipError):
+                    list(download.extract_zip_file(directory))
+            self.assertTrue(os.path.exists(os.path.join(directory, "d.txt")))
+            self.assertFalse(os.path.exists(os.path.join(root, "escaped.txt")))
+
+            with mock.patch.object(download, "_request", return_value=response(entries)):
+                result = download.download_zip_file(directory)
+            self.assertEqual(result.path, os.path.join(directory, "20240522-065711-H8UoUSI6.zip"))
+        client.close()
+
+    def test_download_workers_share_pool(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+
+        from cryptshare.download import CryptshareDownloadResult
+
+        client = CryptshareClient("http://example.com", pool_maxsize=10)
+        download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+        files_info = [{"fileName": f"{index}.txt"} for index in range(8)]
+        for segments, max_workers in ((1, 8), (4, 2), (16, 1)):
+            with mock.patch.object(download, "download_files_info", return_value=files_info), mock.patch.object(
+                download,
+                "download_transfer_file",
+                side_effect=lambda file, *args: CryptshareDownloadResult(file["fileName"]),
+            ), mock.patch("cryptshare.download.ThreadPoolExecutor", wraps=ThreadPoolExecutor) as executor:
+                results = download.download_all_files("transfers", max_workers=8, segments=segments)
+            self.assertEqual(len(results), len(files_info))
+            self.assertEqual(executor.call_args.kwargs["max_workers"], max_workers)
+        client.close()
+
+    def test_download_file_segmented(self):
+        import hashlib
+        import tempfile
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from unittest import mock
+
+        content = os.urandom(100000)
+        requests_received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            ranges = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                requests_received.append(self.headers.get("Range"))
+                status, body, headers = 200, content, {}
+                if self.ranges and self.headers.get("Range"):
+                    start, end = (int(value) for value in self.headers["Range"][6:].split("-"))
+                    status, body = 206, content[start : end + 1]
+                    headers = {"Content-Range": f"bytes {start}-{end}/{len(content)}"}
+                self.send_response(status)
+                for name, value in (headers | {"Content-Length": str(len(body))}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/file.bin"
+        client = CryptshareClient("http://example.com")
+        checksum = hashlib.sha256(content).hexdigest()
+        try:
+            with mock.patch("cryptshare.download.SEGMENT_MIN_SIZE", 1000), tempfile.TemporaryDirectory() as directory:
+                download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+                for ranges, expected_requests in ((True, 4), (False, 1)):
+                    Handler.ranges = ranges
+                    requests_received.clear()
+                    result = download.download_file_segmented(
+                        url, "file.bin", directory, len(content), segments=4, checksum=checksum
+                    )
+                    self.assertTrue(result.verified)
+                    self.assertEqual(result.size, len(content))
+                    self.assertEqual(len(requests_received), expected_requests)
+                    self.assertTrue(all(requests_received))
+                    with open(os.path.join(directory, "file.bin"), "rb") as handle:
+                        self.assertEqual(handle.read(), content)
+                    self.assertEqual(os.listdir(directory), ["file.bin"])
+        finally:
+            server.shutdown()
+            server.server_close()
+            client.close()
+
+
+class TestCryptshareZipStream(unittest.TestCase):
+    def test_zip_stream(self):
+        import io
+        import zipfile
+
+        from cryptshare.zip_stream import CryptshareZipError, CryptshareZipStream
+
+        files = {"a.txt": b"hello" * 1000, "directory/b.bin": os.urandom(100000), "empty.txt": b""}
+        for method in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", method) as archive:
+                for name, content in files.items():
+                    archive.writestr(name, content)
+            data = buffer.getvalue()
+            for chunk_size in (1, 1000, len(data)):
+                chunks = (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+                entries = {name: b"".join(content) for name, content in CryptshareZipStream(chunks, chunk_size=4096)}
+                self.assertEqual(entries, files)
+            self.assertEqual([name for name, _ in CryptshareZipStream([data])], list(files))
+
+        corrupted = bytearray(data)
+        corrupted[corrupted.index(b"hello")] = ord("j")
+        with self.assertRaises(CryptshareZipError):
+            for _, content in CryptshareZipStream([bytes(corrupted)]):
+                b"".join(content)
+
+    def test_data_descriptor(self):
+        import io
+        import zipfile
+
+        from cryptshare.zip_stream import (
+            DATA_DESCRIPTOR_SIGNATURE,
+            CryptshareZipError,
+            CryptshareZipStream,
+        )
+
+        class UnseekableBuffer(io.RawIOBase):
+            # Makes zipfile write data descriptors, like archives generated on the fly
+            def __init__(self):
+                self.data = bytearray()
+
+            def writable(self):
+                return True
+
+            def write(self, data):
+                self.data += data
+                return len(data)
+
+        files = {"a.txt": b"hello" * 1000, "b.bin": os.urandom(10000)}
+        for force_zip64 in (False, True):
+            buffer = UnseekableBuffer()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name, content in files.items():
+                    with archive.open(name, "w", force_zip64=force_zip64) as handle:
+                        handle.write(content)
+            data = bytes(buffer.data)
+            self.assertEqual(data.count(DATA_DESCRIPTOR_SIGNATURE), len(files))
+            entries = {name: b"".join(content) for name, content in CryptshareZipStream([data])}
+            self.assertEqual(entries, files)
+
+            # A descriptor whose size does not match the content is not skipped blindly
+            end = data.index(DATA_DESCRIPTOR_SIGNATURE) + (24 if force_zip64 else 16)
+            corrupted = data[: end - 1] + bytes([data[end - 1] ^ 1]) + data[end:]
+            with self.assertRaises(CryptshareZipError):
+                for _, content in CryptshareZipStream([corrupted]):
+                    b"".join(content)
+
+    def test_safe_entry_path(self):
+        from cryptshare.zip_stream import CryptshareZipError, safe_entry_path
+
+        directory = os.path.realpath("transfers")
+        self.assertEqual(safe_entry_path(directory, "a/./b.txt"), os.path.join(directory, "a", "b.txt"))
+        for name in ("../a.txt", "/etc/passwd", "a/../../b.txt", "C:\\a.txt", "a\\..\\..\\b.txt"):
+            with self.assertRaises(CryptshareZipError):
+                safe_entry_path(directory, name)
+
+
+class TestCryptshareLocalObjectStore(unittest.TestCase):
+    def test_object_store(self):
+        import tempfile
+
+        from cryptshare.object_store import CryptshareLocalObjectStore
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = CryptshareLocalObjectStore(directory)
+            open_sink = store.sink_factory("transfer/")
+            with open_sink({"fileName": "../a.txt", "size": 10, "checksum": "abc"}) as writer:
+                writer.write(b"hello")
+                self.assertFalse(store.exists("transfer/../a.txt"))
+                writer.write(b"world")
+            self.assertEqual(store.keys(), ["transfer/../a.txt"])
+            self.assertEqual(store.get("transfer/../a.txt"), b"helloworld")
+            self.assertEqual(
+                store.metadata("transfer/../a.txt"), {"fileName": "../a.txt", "checksum": "abc", "size": 10}
+            )
+            self.assertFalse(os.path.exists(os.path.join(directory, "a.txt")))
+
+            writer = store.open_writer("b.txt")
+            writer.write(b"incomplete")
+            writer.abort()
+            self.assertFalse(store.exists("b.txt"))
+            self.assertEqual(os.listdir(store.temporary_directory), [])
+
+            store.delete("transfer/../a.txt")
+            self.assertEqual(store.keys(), [])
+
+    def test_download_to_sinks(self):
+        import hashlib
+        import tempfile
+        from unittest import mock
+
+        from cryptshare.download import CryptshareChecksumError
+        from cryptshare.object_store import CryptshareLocalObjectStore
+
+        contents = {"a.txt": b"a" * 5000, "b.bin": os.urandom(3000), "corrupted.txt": b"c" * 100}
+        files_info = [
+            {
+                "fileName": name,
+                "size": len(content),
+                "checksum": hashlib.sha256(content if name != "corrupted.txt" else b"other").hexdigest(),
+                "href": f"/api/transfers/20240522-065711-H8UoUSI6/files/{name}",
+            }
+            for name, content in contents.items()
+        ]
+
+        def request(method, url, **kwargs):
+            content = contents[url.rsplit("/", 1)[1]]
+            response = mock.MagicMock(status_code=200, headers={})
+            response.iter_content.side_effect = lambda chunk_size: (
+                content[i : i + 1024] for i in range(0, len(content), 1024)
+            )
+            return response
+
+        client = CryptshareClient("http://example.com")
+        download = client.download_transfer("20240522-065711-H8UoUSI6", "password")
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(
+            download, "download_files_info", return_value=files_info
+        ), mock.patch.object(download, "_request", side_effect=request):
+            chunks = []
+            result = download.download_to_sink(files_info[0], chunks.append)
+            self.assertTrue(result.verified)
+            self.assertEqual(len(chunks), 5)
+            self.assertEqual(b"".join(chunks), contents["a.txt"])
+
+            store = CryptshareLocalObjectStore(directory)
+            results = {
+                result.file_name: result for result in download.download_all_to_sinks(store.sink_factory("t/"), 2)
+            }
+            self.assertTrue(results["a.txt"].success and results["b.bin"].success)
+            self.assertIsInstance(results["corrupted.txt"].error, CryptshareChecksumError)
+            # The object of the corrupted file was aborted, so it never became visible
+            self.assertEqual(store.keys(), ["t/a.txt", "t/b.bin"])
+            self.assertEqual(os.listdir(store.temporary_directory), [])
+            for name in ("a.txt", "b.bin"):
+                self.assertEqual(store.get(f"t/{name}"), contents[name])
+                self.assertEqual(store.metadata(f"t/{name}")["size"], len(contents[name]))
+        client.close()
+
+
+class TestCryptshareBatch(unittest.TestCase):
+    def test_parse_download_url(self):
+        from cryptshare.batch import parse_download_url
+
+        self.assertEqual(
+            parse_download_url("https://cryptshare.example.com/download?id=abc123&password=p%40ss"),
+            ("https://cryptshare.example.com", "abc123", "p@ss"),
+        )
+        self.assertEqual(
+            parse_download_url("http://cryptshare.example.com/#/download?id=abc123&password=secret"),
+            ("http://cryptshare.example.com", "abc123", "secret"),
+        )
+        with self.assertRaises(ValueError):
+            parse_download_url("https://cryptshare.example.com/download?id=abc123")
+
+    def test_transfer_result(self):
+        from cryptshare.batch import CryptshareTransferResult
+        from cryptshare.download import CryptshareDownloadResult
+
+        files = [CryptshareDownloadResult("a.txt", "a.txt", 10), CryptshareDownloadResult("b.txt", "b.txt", 20)]
+        result = CryptshareTransferResult("https://cryptshare.example.com", "abc123", "abc123", files)
+        self.assertTrue(result.success)
+        self.assertEqual(result.size, 30)
+        files.append(CryptshareDownloadResult("c.txt", "c.txt", error=OSError("disk full")))
+        self.assertFalse(result.success)
+        self.assertEqual(result.size, 30)
+
+    def test_batch_receiver(self):
+        import threading
+        import time
+        from unittest import mock
+
+        import requests
+
+        from cryptshare.batch import CryptshareBatchReceiver
+        from cryptshare.download import CryptshareDownload, CryptshareDownloadResult
+
+        transfers = {
+            "t1": [{"fileName": f"{index}.txt", "size": 10} for index in range(6)],
+            "t2": [{"fileName": "a.txt", "size": 10}, {"fileName": "failing.txt", "size": 10}],
+        }
+        running = {}
+        peak = {}
+        lock = threading.Lock()
+
+        def files_info(download):
+            if download.transfer_id not in transfers:
+                raise requests.HTTPError("403 Error")
+            return transfers[download.transfer_id]
+
+        def download_transfer_file(download, file, directory, segments=1):
+            with lock:
+                running[download.transfer_id] = running.get(download.transfer_id, 0) + 1
+                peak[download.transfer_id] = max(peak.get(download.transfer_id, 0), running[download.transfer_id])
+            time.sleep(0.01)
+            with lock:
+                running[download.transfer_id] -= 1
+            if file["fileName"] == "failing.txt":
+                raise OSError("disk full")
+            return CryptshareDownloadResult(file["fileName"], os.path.join(directory, file["fileName"]), file["size"])
+
+        items = [
+            "https://a.example.com/download?id=t1&password=secret",
+            ("t2", "secret"),
+            ("t3", "wrong"),
+            "https://a.example.com/download?id=t3",
+        ]
+        receiver = CryptshareBatchReceiver("transfers", server="https://b.example.com", max_workers=4)
+        with mock.patch.object(
+            receiver, "create_client", side_effect=lambda server: CryptshareClient(server)
+        ) as create_client, mock.patch.object(
+            CryptshareDownload, "download_files_info", autospec=True, side_effect=files_info
+        ), mock.patch.object(
+            CryptshareDownload, "download_transfer_file", autospec=True, side_effect=download_transfer_file
+        ), receiver:
+            results = {result.transfer_id: result for result in receiver.receive(iter(items))}
+
+        self.assertEqual(
+            sorted(call.args[0] for call in create_client.call_args_list),
+            ["https://a.example.com", "https://b.example.com"],
+        )
+        self.assertTrue(results["t1"].success)
+        self.assertEqual(results["t1"].size, 60)
+        self.assertEqual(results["t1"].directory, os.path.join("transfers", "t1"))
+        self.assertEqual(peak["t1"], receiver.max_workers_per_transfer)
+        self.assertFalse(results["t2"].success)
+        self.assertIsNone(results["t2"].error)
+        self.assertEqual([file.file_name for file in results["t2"].files if not file.success], ["failing.txt"])
+        self.assertIsInstance(results["t3"].error, requests.HTTPError)
+        self.assertIsInstance(results[None].error, ValueError)
+
+
+class TestCryptshareStatusWatcher(unittest.TestCase):
+    def test_status_watcher(self):
+        from cryptshare.status_watcher import (
+            EVENT_DOWNLOAD,
+            EVENT_EXPIRED,
+            EVENT_STATUS_CHANGED,
+            CryptshareStatusWatcher,
+        )
+
+        class Client:
+            def __init__(self):
+                self.statuses = {"a": {"expired": False, "recipients": [{"downloads": []}]}, "b": {"expired": False}}
+                self.requested = []
+
+            def iter_transfer_status(self, max_workers, transfers):
+                for transfer in transfers:
+                    self.requested.append(transfer["trackingId"])
+                    yield {"trackingID": transfer["trackingId"], "status": self.statuses[transfer["trackingId"]]}
+
+        client = Client()
+        watcher = CryptshareStatusWatcher(client, ["a", "b"], min_interval=0, max_interval=0)
+        self.assertEqual(watcher.poll(), [])
+
+        client.statuses["a"] = {"expired": False, "recipients": [{"downloads": [{"date": "2024-05-22"}]}]}
+        client.statuses["b"] = {"expired": False, "comment": "changed"}
+        events = sorted(watcher.poll(), key=lambda event: event.tracking_id)
+        self.assertEqual(
+            [(event.tracking_id, event.kind) for event in events], [("a", EVENT_DOWNLOAD), ("b", EVENT_STATUS_CHANGED)]
+        )
+        self.assertEqual(events[0].downloads, 1)
+
+        client.statuses["b"] = {"expired": True, "comment": "changed"}
+        client.statuses["a"] = {"expirationDate": "2000-01-01T00:00:00Z"}
+        self.assertEqual({event.kind for event in watcher.poll()}, {EVENT_EXPIRED})
+        self.assertTrue(watcher.finished)
+        client.requested.clear()
+        self.assertEqual(list(watcher.watch()), [])
+        self.assertEqual(client.requested, [])
+
+    def test_adaptive_interval(self):
+        from cryptshare.status_watcher import (
+            CryptshareStatusWatcher,
+            CryptshareTransferState,
+        )
+
+        watcher = CryptshareStatusWatcher(None, ["a"], min_interval=1, max_interval=5, backoff_factor=2)
+        watcher.states["a"] = CryptshareTransferState("a", 1)
+        intervals = []
+        for _ in range(4):
+            watcher.update("a", {"expired": False}, now=0)
+            intervals.append(watcher.states["a"].interval)
+        self.assertEqual(intervals, [2, 4, 5, 5])
+        self.assertEqual(watcher.states["a"].next_poll, 5)
+        watcher.update("a", {"expired": False, "downloads": 1}, now=0)
+        self.assertEqual(watcher.states["a"].interval, 1)
+
+    def test_transfer_status_tracking_id(self):
+        import asyncio
+        from unittest import mock
+
+        from cryptshare.async_client import AsyncCryptshareClient
+
+        client = CryptshareClient("https://example.com")
+        async_client = AsyncCryptshareClient("https://example.com")
+        with mock.patch.object(client, "_request") as request, mock.patch.object(
+            async_client, "_request"
+        ) as async_request:
+            for tracking_id in ("../clients", "20240522-065711-H8UoUSI6/files", "20240522-065711-H8UoUSI6?x=1"):
+                with self.assertRaises(ValueError):
+                    client.get_transfer_status(tracking_id)
+                with self.assertRaises(ValueError):
+                    asyncio.run(async_client.get_transfer_status(tracking_id))
+            request.assert_not_called()
+            async_request.assert_not_called()
+        client.close()
+        async_client.close()
+
+    def test_download_events(self):
+        from cryptshare.status_watcher import (
+            EVENT_DOWNLOAD,
+            EVENT_STATUS_CHANGED,
+            CryptshareStatusWatcher,
+            CryptshareTransferState,
+        )
+
+        def recipient(email: str, *dates: str) -> dict:
+            return {"email": email, "downloads": [{"date": date} for date in dates]}
+
+        watcher = CryptshareStatusWatcher(None, ["a"], min_interval=0, max_interval=0)
+        watcher.states["a"] = CryptshareTransferState("a", 0)
+        steps = [
+            ({"recipients": [recipient("a@example.com"), recipient("b@example.com")]}, []),
+            ({"recipients": [recipient("a@example.com", "1"), recipient("b@example.com")]}, [(EVENT_DOWNLOAD, 1)]),
+            # Reordered recipients are no download
+            (
+                {"recipients": [recipient("b@example.com"), recipient("a@example.com", "1")]},
+                [(EVENT_STATUS_CHANGED, 0)],
+            ),
+            # A shortened history does not hide the download of another recipient
+            ({"recipients": [recipient("b@example.com", "2"), recipient("a@example.com")]}, [(EVENT_DOWNLOAD, 1)]),
+        ]
+        for status, expected in steps:
+            events = watcher.update("a", status, now=0)
+            self.assertEqual([(event.kind, event.downloads) for event in events], expected, status)
+
+        # Decreasing counts and earlier dates are never negative downloads
+        watcher.states["a"] = CryptshareTransferState("a", 0)
+        steps = [
+            ({"downloadCount": 3, "lastDownload": "2024-05-22T10:00:00Z"}, []),
+            ({"downloadCount": 1, "lastDownload": "2024-05-22T09:00:00Z"}, [(EVENT_STATUS_CHANGED, 0)]),
+            ({"downloadCount": 2, "lastDownload": "2024-05-22T09:00:00Z"}, [(EVENT_DOWNLOAD, 1)]),
+            ({"downloadCount": 2, "lastDownload": "2024-05-22T11:00:00Z"}, [(EVENT_DOWNLOAD, 1)]),
+        ]
+        for status, expected in steps:
+            events = watcher.update("a", status, now=0)
+            self.assertEqual([(event.kind, event.downloads) for event in events], expected, status)
+
+
+class TestCryptshareMetadataCache(unittest.TestCase):
+    def test_metadata_cache(self):
+        import tempfile
+        from unittest.mock import Mock
+
+        from cryptshare.metadata_cache import CryptshareMetadataCache
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metadata.json")
+            cache = CryptshareMetadataCache(ttls={"imprint": 0}, path=path)
+            fetch = Mock(return_value=[{"name": "minimumLengthRequired"}])
+            self.assertEqual(cache.get_or_fetch("password_rules", fetch), [{"name": "minimumLengthRequired"}])
+            cache.get_or_fetch("password_rules", fetch)[0]["name"] = "changed"
+            self.assertEqual(cache.get("password_rules"), [{"name": "minimumLengthRequired"}])
+            self.assertEqual(fetch.call_count, 1)
+            cache.set("imprint", {"text": "imprint"})
+            self.assertIsNone(cache.get("imprint"))
+            cache.set("language_packs", [{"locale": "en"}], "api.rest")
+            self.assertIsNone(cache.get("language_packs"))
+
+            fresh_process_cache = CryptshareMetadataCache(path=path)
+            self.assertEqual(len(fresh_process_cache), 2)
+            self.assertEqual(fresh_process_cache.get("language_packs", "api.rest"), [{"locale": "en"}])
+            fresh_process_cache.invalidate("language_packs")
+            self.assertIsNone(fresh_process_cache.get("language_packs", "api.rest"))
+            self.assertEqual(len(CryptshareMetadataCache(path=path)), 1)
+
+            cache._entries["password_rules"] = (0, [])
+            self.assertIsNone(cache.get("password_rules"))
+
+    def test_client_metadata_cache(self):
+        from unittest.mock import Mock
+
+        from cryptshare.metadata_cache import CryptshareMetadataCache
+
+        first = CryptshareClient("https://metadata.example.com")
+        second = CryptshareClient("https://metadata.example.com")
+        self.assertIs(first.metadata_cache, second.metadata_cache)
+        self.assertIsNone(CryptshareClient("https://metadata.example.com", metadata_cache=False).metadata_cache)
+
+        first.metadata_cache.set("password_rules", [{"name": "whitespacesDeclined"}])
+        first.metadata_cache.set("language_packs", [{"locale": "de"}, {"locale": "de"}], "api.rest")
+        self.assertEqual(second.get_human_readable_password_rules(), ["No whitespaces allowed"])
+        self.assertEqual(second.get_available_languages(), ["de"])
+
+        # Client IDs are registered per client, never shared through the cache
+        for client_id, client in (("abc", first), ("def", second)):
+            client._request = Mock(return_value={"clientId": client_id})
+            client.request_client_id()
+            self.assertEqual(client.header.client_id, client_id)
+            client._request.assert_called_once()
+        second.invalidate_metadata()
+        self.assertEqual(len(first.metadata_cache), 0)
+        self.assertIsInstance(first.metadata_cache, CryptshareMetadataCache)
+
+
+class TestCryptshareTransferPolicy(unittest.TestCase):
+    def test_group_recipients(self):
+        from cryptshare.transfer_policy import (
+            POLICY_RESOLVE_CHUNKS,
+            POLICY_RESOLVE_DOMAINS,
+            group_recipients,
+        )
+
+        recipients = ["B@Example.com", "a@example.com", "c@example.org"]
+        self.assertEqual(group_recipients(recipients), [(recipients, recipients)])
+        self.assertEqual(
+            group_recipients(recipients, POLICY_RESOLVE_DOMAINS),
+            [(["B@Example.com"], ["B@Example.com", "a@example.com"]), (["c@example.org"], ["c@example.org"])],
+        )
+        self.assertEqual(len(group_recipients(recipients, POLICY_RESOLVE_CHUNKS, chunk_size=2)), 2)
+        with self.assertRaises(ValueError):
+            group_recipients(recipients, "unknown")
+
+    def test_merge_policies(self):
+        from cryptshare.transfer_policy import CryptshareTransferPolicy
+        from cryptshare.transfer_security_mode import OneTimePaswordSecurityModes
+
+        def security_modes(*password_modes):
+            return [{"name": "ONE_TIME_PASSWORD", "config": {"allowedPasswordModes": list(password_modes)}}]
+
+        first = CryptshareTransferPolicy(
+            {
+                "allowed": True,
+                "failedEmailAddresses": [],
+                "settings": {
+                    "maxTotalSize": 100,
+                    "securityModes": security_modes("MANUAL", "GENERATED"),
+                    "showFileNamesChangeable": True,
+                    "confidentialMessageRequired": False,
+                },
+            }
+        )
+        second = CryptshareTransferPolicy(
+            {
+                "allowed": True,
+                "failedEmailAddresses": [],
+                "settings": {
+                    "maxTotalSize": 50,
+                    "securityModes": security_modes("GENERATED", "NONE"),
+                    "showFileNamesChangeable": False,
+                    "confidentialMessageRequired": True,
+                },
+            }
+        )
+        merged = CryptshareTransferPolicy.merge([first, second])
+        self.assertTrue(merged.is_allowed)
+        self.assertEqual(merged.maximum_total_size, 50)
+        self.assertEqual(merged.get_allowed_security_modes(), [OneTimePaswordSecurityModes.GENERATED])
+        self.assertFalse(merged.show_file_names_changeable)
+        self.assertTrue(merged.confidential_message_required)
+
+        denied = CryptshareTransferPolicy({"allowed": False, "failedEmailAddresses": ["a@example.com"]})
+        groups = [(["x@example.org"], ["x@example.org"]), (["a@example.com"], ["a@example.com", "b@example.com"])]
+        merged = CryptshareTransferPolicy.merge([first, denied], groups)
+        self.assertFalse(merged.is_allowed)
+        self.assertEqual(merged.policy["failedEmailAddresses"], ["a@example.com", "b@example.com"])
+
+    def test_policy_cache(self):
+        from cryptshare.transfer_policy import CryptshareTransferPolicyCache
+
+        cache = CryptshareTransferPolicyCache(max_entries=2, ttl=60)
+        key = cache.key("https://example.com", "Sender@example.com", ["b@example.com", "A@example.com"])
+        self.assertEqual(
+            key, cache.key("https://example.com", "sender@example.com", ["a@example.com", "b@example.com"])
+        )
+        cache.set(key, {"allowed": True})
+        cache.set(cache.key("https://example.com", "sender@example.com", ["c@example.com"]), {"allowed": True})
+        self.assertEqual(cache.get(key), {"allowed": True})
+        cache.set(cache.key("https://example.com", "sender@example.com", ["d@example.com"]), {"allowed": False})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(cache.key("https://example.com", "sender@example.com", ["c@example.com"])))
+        cache.invalidate(sender="SENDER@example.com")
+        self.assertEqual(len(cache), 0)
+        self.assertIs(CryptshareClient("https://example.com").policy_cache, CryptshareTransferPolicyCache.shared())
+
+    def test_get_policy_recipients(self):
+        from unittest import mock
+
+        from cryptshare.transfer_policy import CryptshareTransferPolicyCache
+
+        client = CryptshareClient("http://example.com")
+        client.set_sender("sender@example.com")
+        client.policy_cache = CryptshareTransferPolicyCache()
+        response = {"allowed": False, "failedEmailAddresses": ["B@Example.com"], "settings": {}}
+        with mock.patch.object(client, "_request", return_value=response) as request:
+            policy = client.get_policy(["B@Example.com", "a@example.com"])
+            self.assertEqual(request.call_args.kwargs["json"], {"recipients": ["B@Example.com", "a@example.com"]})
+            self.assertEqual(policy.policy["failedEmailAddresses"], ["B@Example.com"])
+            client.get_policy(["a@example.com", "b@example.com"])
+            self.assertEqual(request.call_count, 1)
+        client.close()
+
+
+class TestCryptsharePasswordPolicy(unittest.TestCase):
+    password_rules = [
+        {"name": "whitespacesDeclined"},
+        {"name": "minimumLengthRequired", "details": {"length": 8}},
+        {"name": "maximumLengthRequired", "details": {"length": 16}},
+        {"name": "upperCaseRequired"},
+        {"name": "lowerCaseRequired"},
+        {"name": "digitsRequired"},
+        {"name": "specialCharactersRequired"},
+        {"name": "alphabeticalSequenceDeclined"},
+        {"name": "numericSequenceDeclined"},
+        {"name": "keyboardSequenceDeclined"},
+        {"name": "repeatedCharactersDeclined"},
+        {"name": "blacklistedCharactersDeclined", "details": {"characters": "<>"}},
+    ]
+
+    def test_password_policy(self):
+        from cryptshare.password_policy import CryptsharePasswordPolicy
+
+        policy = CryptsharePasswordPolicy(self.password_rules)
+        self.assertFalse(policy.requires_server)
+        self.assertEqual(policy.validate("Hb7!kP2$mW"), {"valid": True, "violations": [], "complete": True})
+        self.assertEqual(policy.violations("Hb7 !kP2$mW"), ["whitespacesDeclined"])
+        self.assertEqual(policy.violations("Hb7!kP"), ["minimumLengthRequired"])
+        self.assertEqual(policy.violations("Hb7!kP2$mW" * 2), ["maximumLengthRequired"])
+        self.assertEqual(policy.violations("hb7!kp2$mw"), ["upperCaseRequired"])
+        self.assertEqual(policy.violations("Hb7!kP2$mWxyz"), ["alphabeticalSequenceDeclined"])
+        self.assertEqual(policy.violations("Hb7!kP2$mW012"), ["numericSequenceDeclined"])
+        self.assertEqual(policy.violations("Hb7!kP2$mWasd"), ["keyboardSequenceDeclined"])
+        self.assertEqual(policy.violations("Hb7!kP2$mWfff"), ["repeatedCharactersDeclined"])
+        self.assertEqual(policy.violations("Hb7!kP2$mW<"), ["blacklistedCharactersDeclined"])
+        self.assertEqual(
+            policy.violations(""),
+            [
+                "minimumLengthRequired",
+                "upperCaseRequired",
+                "lowerCaseRequired",
+                "digitsRequired",
+                "specialCharactersRequired",
+            ],
+        )
+
+        policy = CryptsharePasswordPolicy(
+            [{"name": "dictionaryWordsDeclined"}, {"name": "blacklistedCharactersDeclined"}, {"name": "digitsRequired"}]
+        )
+        self.assertEqual(policy.server_rules, ["dictionaryWordsDeclined", "blacklistedCharactersDeclined"])
+        self.assertFalse(policy.validate("password1")["complete"])
+
+    def test_generate_password(self):
+        from cryptshare.password_policy import MAX_LETTER_RUN, CryptsharePasswordPolicy
+
+        policy = CryptsharePasswordPolicy(self.password_rules + [{"name": "dictionaryWordsDeclined"}])
+        self.assertTrue(policy.can_generate)
+        passwords = {policy.generate() for _ in range(1000)}
+        self.assertEqual(len(passwords), 1000)
+        for password in passwords:
+            self.assertEqual(len(password), 16)
+            self.assertEqual(policy.violations(password), [])
+            self.assertNotRegex(password, f"[a-zA-Z]{{{MAX_LETTER_RUN + 1}}}")
+        self.assertEqual(len(policy.generate(8)), 8)
+        self.assertEqual(len(policy.generate(40)), 16)
+
+        self.assertFalse(CryptsharePasswordPolicy([{"name": "blacklistedCharactersDeclined"}]).can_generate)
+        with self.assertRaises(ValueError):
+            CryptsharePasswordPolicy([{"name": "unknownRule"}]).generate()
+
+    def test_check_password(self):
+        client = CryptshareClient("https://password.example.com")
+        client.metadata_cache.set("password_rules", self.password_rules)
+        self.assertEqual(client.check_password("abc")["valid"], False)
+        self.assertTrue(client.is_valid_password("Hb7!kP2$mW"))
+        self.assertTrue(client.is_valid_password(client.generate_password()))
+
+    def test_check_password_on_server(self):
+        from unittest import mock
+
+        client = CryptshareClient("https://password.example.com")
+        client.metadata_cache.set("password_rules", [{"name": "dictionaryWordsDeclined"}, {"name": "digitsRequired"}])
+        self.assertFalse(client.get_password_policy().validate("password1")["complete"])
+        with mock.patch.object(client, "_request", return_value={"valid": False}) as request:
+            self.assertEqual(
+                client.check_password("password"), {"valid": False, "violations": ["digitsRequired"], "complete": False}
+            )
+            request.assert_not_called()
+            self.assertFalse(client.is_valid_password("password1"))
+            request.assert_called_once()
+            self.assertEqual(request.call_args.args[:2], ("POST", client.api_path("password")))
+            self.assertEqual(request.call_args.kwargs["json"], {"password": "password1"})
+
+    def test_generate_password_on_server(self):
+        import asyncio
+        from unittest import mock
+
+        from cryptshare.async_client import AsyncCryptshareClient
+        from cryptshare.password_policy import MAX_SERVER_CHECKS
+
+        rules = [{"name": "dictionaryWordsDeclined"}, {"name": "digitsRequired"}]
+        client = CryptshareClient("https://password.example.com")
+        client.metadata_cache.set("password_rules", rules)
+        with mock.patch.object(
+            client, "validate_password", side_effect=[{"valid": False}, {"valid": True}]
+        ) as validate:
+            password = client.generate_password()
+            self.assertEqual(validate.call_count, 2)
+            self.assertEqual(validate.call_args.args[0], password)
+        with mock.patch.object(
+            client, "validate_password", return_value={"valid": False}
+        ) as validate, mock.patch.object(client, "get_password", return_value="Server-Password-1"):
+            self.assertEqual(client.generate_password(), "Server-Password-1")
+            self.assertEqual(validate.call_count, MAX_SERVER_CHECKS)
+
+        async def run():
+            async_client = AsyncCryptshareClient("https://password.example.com")
+            with mock.patch.object(async_client, "validate_password", side_effect=[{"valid": False}, {"valid": True}]):
+                password = await async_client.generate_password()
+                self.assertEqual(async_client.validate_password.await_args.args[0], password)
+                self.assertEqual(async_client.validate_password.await_count, 2)
+            await async_client.aclose()
+            async_client.close()
+
+        asyncio.run(run())
+        client.close()
+
+
 class TestCryptshareServerSide(unittest.TestCase):
     def test_server_side(self):
         load_dotenv()